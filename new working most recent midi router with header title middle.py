@@ -1,27 +1,227 @@
-from flask import Flask, render_template_string, request, redirect, url_for, jsonify
+from flask import Flask, Response, request, redirect, url_for, jsonify
 import mido
 import threading
 import time
 import sys
 import os
+import errno
 import importlib
 import subprocess
+import signal
 import platform
+import re
+import bisect
+import json
+import collections
+import functools
+import gzip
+import hashlib
+import math
+import queue
+import logging
+import logging.handlers
 
 app = Flask(__name__)
 
+# Logging: records are pushed onto a queue and written by a background
+# listener thread, so the MIDI threads never block on stdout/journald
+LOG_LEVEL = os.environ.get('MIDI_ROUTER_LOG_LEVEL', 'INFO').upper()
+# Per-event MIDI debug logs are off by default and rate-limited when enabled
+LOG_MIDI_EVENTS = os.environ.get('MIDI_ROUTER_LOG_MIDI_EVENTS', '0') == '1'
+MIDI_EVENT_LOG_RATE = float(os.environ.get('MIDI_ROUTER_MIDI_EVENT_LOG_RATE', '10'))  # per second
+log = logging.getLogger('midi_router')
+log_queue = queue.SimpleQueue()
+log_listener = None
+
 manual_mode = False
 
 connection_log = set()
 manual_connection_log = set()
 port_names = []
 last_ports = set()
+# Filtered ports from the monitor's last scan, served by /status
+known_inputs = []
+known_outputs = []
+# Enumerating ALSA ports is the monitor's most expensive step, so count it
+port_enumeration_stats = {'total': 0, 'last_tick': 0, 'max_per_tick': 0}
+mode_switch_stats = {'count': 0, 'last_ms': None, 'max_ms': None}
+
+# Serializes changes to the routing state between the monitor, the control
+# worker and the connect/disconnect requests
+routing_lock = threading.RLock()
+
+# Slow control operations (mode switches, MIDI resets) run as jobs on a single
+# control worker so HTTP requests return immediately.  A request that matches
+# a job still queued or running is merged into that job.
+CONTROL_JOB_HISTORY = 100
+control_jobs = collections.OrderedDict()  # job id -> job dict, oldest first
+control_jobs_lock = threading.Lock()
+control_queue = queue.Queue()
+control_worker_thread = None
+next_job_id = 1
+
+# One enumeration of the ports, shared by every helper during a monitor tick.
+# all_* hold every port name, inputs/outputs the ones shown in the GUI (in
+# enumeration order) and input_set/output_set the same for membership checks.
+PortSnapshot = collections.namedtuple(
+    'PortSnapshot', ['all_inputs', 'all_outputs', 'inputs', 'outputs', 'input_set', 'output_set']
+)
+
+# /status is served from a cached snapshot that is rebuilt only after the
+# state version changes, and its ETag lets unchanged polls get a 304
+status_version = 0
+status_cache = None  # (version, etag, body)
+status_lock = threading.Lock()
+STATUS_ETAG_PREFIX = f"{os.getpid()}-{int(time.time())}"
+
+# Deltas pushed to the web GUI over Server-Sent Events.  Each event gets a
+# sequence number and the most recent ones are kept so a reconnecting client
+# can resume from the last one it saw.  Event ids carry the process epoch, so
+# a client reconnecting after a restart gets a snapshot instead of resuming.
+EVENT_EPOCH = STATUS_ETAG_PREFIX
+EVENT_HISTORY_SIZE = 512
+EVENT_KEEPALIVE_INTERVAL = 15.0
+event_sequence = 0
+event_history = collections.deque(maxlen=EVENT_HISTORY_SIZE)  # (sequence, event type, data)
+event_condition = threading.Condition()
+event_streams_closed = threading.Event()  # Set when the web server shuts down
+published_state = {'ports': {}, 'routes': {}, 'manual_mode': False}
 
 # MIDI Connection Management
 active_midi_connections = {}  # Store active MIDI port objects
-midi_threads = {}  # Store MIDI forwarding threads
+midi_threads = {}  # Input port name -> forwarding thread of its InputHub
+input_hubs = {}  # Input port name -> InputHub, each physical input is opened once
+input_hubs_lock = threading.Lock()
+output_pool = {}  # Output port name -> PooledOutput shared by all routes to it
+output_pool_lock = threading.Lock()
+# Output scheduling: an output can be paced as a wire carrying so many bytes
+# per second, so a slow DIN port is not sent more than it can carry.
+# OUTPUT_RATES is a JSON object mapping a case-insensitive substring of the
+# port name to its bytes per second, or to 'din' for a 31.25 kbaud DIN port
+# (3125, ten bits per byte).  Outputs that match no pattern, like native
+# USB-MIDI devices and virtual ports, get OUTPUT_BYTES_PER_SECOND, where 0
+# means unpaced.  The writer may run ahead of the wire by the burst
+# allowance, which the interface's own buffer absorbs.  While messages wait,
+# newer controller and pitch bend values replace older ones still queued.
+DIN_BYTES_PER_SECOND = 3125
+OUTPUT_RATES = os.environ.get('MIDI_ROUTER_OUTPUT_RATES', '{}')
+OUTPUT_BYTES_PER_SECOND = float(os.environ.get('MIDI_ROUTER_OUTPUT_BYTES_PER_SECOND', '0'))
+output_rates = None  # [(pattern, bytes per second)], longest pattern first
+OUTPUT_BURST_BYTES = int(os.environ.get('MIDI_ROUTER_OUTPUT_BURST_BYTES', '64'))
+OUTPUT_CLOSE_TIMEOUT = 1.0  # Seconds a closing output may spend sending what is still queued
+# Controllers whose values may be merged.  Bank select, data entry, the
+# pedal switches, RPN/NRPN selection and channel mode messages are never merged
+# because every value matters, not just the last one.
+COALESCE_CONTROLLERS = frozenset(range(120)) - {0, 6, 32, 38, 64, 65, 66, 67, 68, 69, 96, 97, 98, 99, 100, 101}
+# Each output holds at most OUTPUT_QUEUE_SIZE waiting messages.  They are
+# sent in priority order: realtime (clock, start/stop), then notes, then
+# controllers and other channel and system common messages, then SysEx.
+# When the queue is full the overflow policy decides what is lost:
+# 'drop-oldest' drops the oldest waiting message, 'drop-lowest-priority'
+# drops the oldest message of the lowest priority class waiting (or the new
+# message if its class is lower still) and 'block' makes the sender wait up
+# to OUTPUT_BLOCK_TIMEOUT seconds for room before dropping the new message.
+OUTPUT_QUEUE_SIZE = max(1, int(os.environ.get('MIDI_ROUTER_OUTPUT_QUEUE_SIZE', '1024')))  # The policies need a queue
+OUTPUT_OVERFLOW_POLICIES = ('drop-oldest', 'drop-lowest-priority', 'block')
+OUTPUT_OVERFLOW_POLICY = os.environ.get('MIDI_ROUTER_OUTPUT_OVERFLOW', 'drop-lowest-priority')
+OUTPUT_BLOCK_TIMEOUT = float(os.environ.get('MIDI_ROUTER_OUTPUT_BLOCK_TIMEOUT', '0.05'))
+PRIORITY_CLASSES = ('realtime', 'note', 'control', 'sysex')
+# SysEx dumps are streamed one SysEx message at a time.  Once an output has
+# OUTPUT_SYSEX_BUFFER bytes of SysEx waiting (0 means no limit), the input
+# sending more waits up to OUTPUT_SYSEX_TIMEOUT seconds for the writer to
+# catch up, so a dump is never buffered whole.  An output that does not catch
+# up in time is marked stalled and SysEx for it is dropped without waiting
+# until its writer sends SysEx again.  SysEx messages longer than
+# SYSEX_COMPACT_SIZE are held as bytes, one byte per byte instead of a list
+# of ints, and shared by every route.
+OUTPUT_SYSEX_BUFFER = int(os.environ.get('MIDI_ROUTER_OUTPUT_SYSEX_BUFFER', '65536'))
+OUTPUT_SYSEX_TIMEOUT = float(os.environ.get('MIDI_ROUTER_OUTPUT_SYSEX_TIMEOUT', '2'))
+SYSEX_COMPACT_SIZE = 64
+# System realtime messages (clock, start, stop, ...) take a fast lane: the
+# input thread sends them straight to each output, skipping transforms and
+# the queue.  Clock timing is measured per route; intervals longer than
+# CLOCK_GAP_NS are a stopped clock rather than jitter.
+REALTIME_FAST_LANE = os.environ.get('MIDI_ROUTER_REALTIME_FAST_LANE', '1') == '1'
+REALTIME_TYPES = frozenset(['clock', 'start', 'continue', 'stop', 'active_sensing', 'reset'])
+CLOCK_JITTER_WINDOW = 960  # Clock intervals kept for percentiles, 10 bars of 4/4
+CLOCK_TEMPO_WINDOW = 96  # Clock intervals the tempo is averaged over, one bar
+CLOCK_GAP_NS = 1000000000
+STATUS_PRIORITY = tuple(
+    0 if status >= 0xF8 else
+    3 if status == 0xF0 else
+    1 if 0x80 <= status < 0xA0 else
+    2
+    for status in range(256)
+)
+
+# Forwarding engine: 'callback' dispatches from the MIDI backend's own input
+# callbacks, 'poll' uses one dispatcher thread for every input and 'thread'
+# keeps the old blocking reader thread per input
+FORWARDING_ENGINE = os.environ.get('MIDI_ROUTER_ENGINE', 'callback')
+ENGINE_POLL_INTERVAL = 0.001
+poll_dispatcher_thread = None
+# 'raw' rewrites the channel nibble directly in the bytes delivered by
+# rtmidi and sends them straight out; 'message' builds mido Messages.
+# Raw forwarding needs the callback engine and the rtmidi backend.
+FORWARD_MODE = os.environ.get('MIDI_ROUTER_FORWARD_MODE', 'raw')
+
+# Thread tuning.  Forwarding threads (output writers, the poll dispatcher,
+# per-input readers and the MIDI backend's callback threads) can be pinned to
+# MIDI_ROUTER_RT_CPUS and given a real-time policy ('fifo' or 'rr').  Web,
+# monitor and control threads can be pinned to MIDI_ROUTER_BACKGROUND_CPUS
+# and niced by MIDI_ROUTER_BACKGROUND_NICE more than the process.  CPU lists
+# look like '2,3' or '2-3'.  Real-time policies need CAP_SYS_NICE or an
+# rtprio limit (LimitRTPRIO= in systemd).
+RT_CPUS = os.environ.get('MIDI_ROUTER_RT_CPUS', '')
+RT_POLICY = os.environ.get('MIDI_ROUTER_RT_POLICY', 'none')
+RT_PRIORITY = int(os.environ.get('MIDI_ROUTER_RT_PRIORITY', '50'))
+BACKGROUND_CPUS = os.environ.get('MIDI_ROUTER_BACKGROUND_CPUS', '')
+BACKGROUND_NICE = int(os.environ.get('MIDI_ROUTER_BACKGROUND_NICE', '0'))
+PROCESS_NICE = os.getpriority(os.PRIO_PROCESS, 0) if hasattr(os, 'getpriority') else 0
+PROCESS_CPUS = os.sched_getaffinity(0) if hasattr(os, 'sched_getaffinity') else None
+thread_tuning = {}  # 'forwarding'/'background' -> settings in effect on the last thread tuned
+thread_tuning_lock = threading.Lock()
+
+# Route transforms.  A transform is the name of a preset or a dict with any of
+# 'channel_map' (one channel for everything, or {source: target}, channels
+# 1-16), 'transpose' (semitones), 'split' ([lowest, highest] note passed on)
+# and 'velocity_curve' (a name from VELOCITY_CURVES or an exponent).  Each is
+# compiled into lookup tables when the route is created.
+TRANSFORM_PRESETS = {
+    'channel10': {'channel_map': 10},  # Force every channel message onto channel 10
+    'none': {},  # Pass messages through untouched
+}
+TRANSFORM_FIELDS = ('channel_map', 'transpose', 'split', 'velocity_curve')
+VELOCITY_CURVES = {'linear': 1.0, 'soft': 0.5, 'hard': 2.0}
+DEFAULT_TRANSFORM = os.environ.get('MIDI_ROUTER_DEFAULT_TRANSFORM', 'channel10')
+# Pass-through routes are patched inside the ALSA sequencer (like aconnect)
+# so their events never cross into Python
+KERNEL_ROUTING = os.environ.get('MIDI_ROUTER_KERNEL_ROUTING', '1') == '1'
+alsa_seq_client = None
+
+# Per-route instrumentation exposed on /metrics
+route_metrics = {}  # connection_key -> RouteMetrics
+LATENCY_BUCKETS_NS = (
+    50000, 100000, 250000, 500000, 1000000, 2500000,
+    5000000, 10000000, 25000000, 50000000, 100000000,
+)
+engine_stats = {'messages': 0, 'dispatch_ns': 0, 'max_dispatch_ns': 0}
 auto_connections = set()  # Store automatically created connections
-usb_device_patterns = ['USB', 'MIDI', 'Controller', 'Keyboard', 'Piano', 'Synth', 'Drum', 'Arturia', 'Roland', 'Yamaha', 'Korg', 'Novation', 'Native Instruments']
+
+# Device classification rules.  A JSON file named by MIDI_ROUTER_CLASSIFIER_RULES
+# can replace any of these lists; matching is a case-insensitive substring test.
+DEFAULT_CLASSIFIER_RULES = {
+    'usb_patterns': ['USB', 'MIDI', 'Controller', 'Keyboard', 'Piano', 'Synth', 'Drum', 'Arturia', 'Roland', 'Yamaha', 'Korg', 'Novation', 'Native Instruments'],
+    'manufacturers': [
+        'arturia', 'roland', 'yamaha', 'korg', 'novation',
+        'native instruments', 'akai', 'm-audio', 'behringer',
+        'focusrite', 'presonus', 'steinberg'
+    ],
+    'through_patterns': ['through', 'thru', 'midi through', 'midi thru'],
+    'hidden_patterns': ['rtmidi'],
+}
+CLASSIFIER_RULES_FILE = os.environ.get('MIDI_ROUTER_CLASSIFIER_RULES')
+device_classifier = None
 
 # Device order tracking
 connected_usb_devices = []  # List to maintain the order of connected USB devices
@@ -29,6 +229,71 @@ connected_usb_devices = []  # List to maintain the order of connected USB device
 # Monitor thread control
 monitor_thread = None
 monitor_running = True
+engine_started = False
+engine_start_lock = threading.Lock()
+
+# Web server: 'production' serves requests from a fixed pool of worker threads
+# and each /events stream on its own thread; 'development' is Flask's debug
+# server with the reloader
+SERVER_MODE = os.environ.get('MIDI_ROUTER_SERVER', 'production')
+HTTP_HOST = os.environ.get('MIDI_ROUTER_HOST', '0.0.0.0')
+HTTP_PORT = int(os.environ.get('MIDI_ROUTER_PORT', '5050'))
+HTTP_THREADS = int(os.environ.get('MIDI_ROUTER_HTTP_THREADS', '16'))
+# Seconds a connection may stay open without sending a request before it is closed
+HTTP_IDLE_TIMEOUT = float(os.environ.get('MIDI_ROUTER_HTTP_IDLE_TIMEOUT', '15'))
+
+# Routing state (routes, their transforms and the mode) is saved to this JSON
+# file whenever it changes and restored on boot before the web server starts.
+# An empty value turns persistence off.
+STATE_FILE = os.environ.get(
+    'MIDI_ROUTER_STATE_FILE',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'midi_router_state.json'))
+STATE_SAVE_DELAY = float(os.environ.get('MIDI_ROUTER_STATE_SAVE_DELAY', '0.2'))  # Seconds to batch changes
+STATE_VERSION = 1
+state_dirty = threading.Event()
+state_saver_thread = None
+state_saver_running = False
+saved_state_text = None  # Last JSON written, so unchanged state is not rewritten
+boot_stats = {
+    'state_file': STATE_FILE or None,
+    'restore_ms': None,
+    'saved_routes': 0,
+    'restored_routes': 0,
+    'first_routed_ms': None,  # Since process start
+}
+first_route_pending = True
+
+# The web GUI is built once from HTML_TEMPLATE into precompressed assets.  The
+# stylesheet and script are named after their content hash and may be cached
+# forever; only the small page itself is revalidated with its ETag.
+WEB_ASSET_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+WebAsset = collections.namedtuple('WebAsset', ['mimetype', 'cache_control', 'etag', 'bodies'])
+web_assets = None  # path -> WebAsset, bodies maps a content coding to bytes
+web_assets_lock = threading.Lock()
+# Paint timings the GUI reports from the browser showing it
+PAINT_TIMINGS = ('first-paint', 'first-contentful-paint')
+web_stats = {'build_ms': None, 'paint_reports': 0, 'first_paint_ms': None, 'first_contentful_paint_ms': None}
+
+# MIDI backend: 'mido' uses the real devices through mido and rtmidi,
+# 'loopback' is an in-process fake with virtual devices for running and
+# benchmarking the router without MIDI hardware
+MIDI_BACKEND = os.environ.get('MIDI_ROUTER_BACKEND', 'mido')
+LOOPBACK_CAPTURE_SIZE = 100000  # Sent messages each loopback device keeps
+midi_backend = None
+
+# Hotplug detection: 'auto' tries ALSA sequencer announce events, then udev,
+# and falls back to polling if neither is available
+HOTPLUG_BACKEND = os.environ.get('MIDI_ROUTER_HOTPLUG', 'auto')
+HOTPLUG_POLL_INTERVAL = 0.5
+HOTPLUG_RESCAN_INTERVAL = 30.0  # Safety rescan in case an event is missed
+hotplug_backend = None
+hotplug_stats = {
+    'backend': None,
+    'changes': 0,
+    'last_reason': None,
+    'last_latency_ms': None,
+    'max_latency_ms': None,
+}
 
 HTML_TEMPLATE = """
 <!DOCTYPE html>
@@ -37,10 +302,167 @@ HTML_TEMPLATE = """
     <meta charset="UTF-8" />
     <meta name="viewport" content="width=device-width, initial-scale=1" />
     <title>MIDI Router Web GUI</title>
-    <script src="https://cdn.tailwindcss.com"></script>
     <style>
-        @import url('https://fonts.googleapis.com/css2?family=Inter:wght@300;400;500;600;700&display=swap');
-        body { font-family: 'Inter', sans-serif; }
+        /* Only the utility classes this page uses, with Tailwind's values, so
+           the page renders without the Tailwind CDN or web fonts */
+        *, ::before, ::after { box-sizing: border-box; border: 0 solid #e5e7eb; }
+        html { line-height: 1.5; -webkit-text-size-adjust: 100%; tab-size: 4; }
+        body {
+            margin: 0;
+            line-height: inherit;
+            font-family: ui-sans-serif, system-ui, -apple-system, "Segoe UI", Roboto, "Helvetica Neue", Arial, sans-serif;
+        }
+        h1, h2, p { margin: 0; font-size: inherit; font-weight: inherit; }
+        button, input, select { font-family: inherit; font-size: 100%; line-height: inherit; color: inherit; margin: 0; padding: 0; }
+        button { background-color: transparent; background-image: none; cursor: pointer; }
+        svg { display: block; vertical-align: middle; }
+        .container { width: 100%; }
+        @media (min-width: 640px) { .container { max-width: 640px; } }
+        @media (min-width: 768px) { .container { max-width: 768px; } }
+        @media (min-width: 1024px) { .container { max-width: 1024px; } }
+        @media (min-width: 1280px) { .container { max-width: 1280px; } }
+        @media (min-width: 1536px) { .container { max-width: 1536px; } }
+        .mx-auto { margin-left: auto; margin-right: auto; }
+        .mb-2 { margin-bottom: 0.5rem; }
+        .mb-3 { margin-bottom: 0.75rem; }
+        .mb-4 { margin-bottom: 1rem; }
+        .mb-6 { margin-bottom: 1.5rem; }
+        .mb-8 { margin-bottom: 2rem; }
+        .flex { display: flex; }
+        .grid { display: grid; }
+        .h-2 { height: 0.5rem; }
+        .h-3 { height: 0.75rem; }
+        .h-4 { height: 1rem; }
+        .h-5 { height: 1.25rem; }
+        .h-6 { height: 1.5rem; }
+        .h-12 { height: 3rem; }
+        .h-fit { height: fit-content; }
+        .min-h-screen { min-height: 100vh; }
+        .w-1\\/2 { width: 50%; }
+        .w-1\\/4 { width: 25%; }
+        .w-2 { width: 0.5rem; }
+        .w-3 { width: 0.75rem; }
+        .w-4 { width: 1rem; }
+        .w-5 { width: 1.25rem; }
+        .w-6 { width: 1.5rem; }
+        .w-8 { width: 2rem; }
+        .w-12 { width: 3rem; }
+        .w-full { width: 100%; }
+        .max-w-xs { max-width: 20rem; }
+        .flex-1 { flex: 1 1 0%; }
+        .flex-col { flex-direction: column; }
+        .grid-cols-1 { grid-template-columns: repeat(1, minmax(0, 1fr)); }
+        .items-center { align-items: center; }
+        .justify-end { justify-content: flex-end; }
+        .justify-center { justify-content: center; }
+        .justify-between { justify-content: space-between; }
+        .gap-4 { gap: 1rem; }
+        .gap-8 { gap: 2rem; }
+        .space-x-2 > :not([hidden]) ~ :not([hidden]) { margin-left: 0.5rem; }
+        .space-x-3 > :not([hidden]) ~ :not([hidden]) { margin-left: 0.75rem; }
+        .space-x-4 > :not([hidden]) ~ :not([hidden]) { margin-left: 1rem; }
+        .space-x-5 > :not([hidden]) ~ :not([hidden]) { margin-left: 1.25rem; }
+        .space-y-2 > :not([hidden]) ~ :not([hidden]) { margin-top: 0.5rem; }
+        .space-y-3 > :not([hidden]) ~ :not([hidden]) { margin-top: 0.75rem; }
+        .space-y-4 > :not([hidden]) ~ :not([hidden]) { margin-top: 1rem; }
+        .space-y-6 > :not([hidden]) ~ :not([hidden]) { margin-top: 1.5rem; }
+        .truncate { overflow: hidden; text-overflow: ellipsis; white-space: nowrap; }
+        .rounded { border-radius: 0.25rem; }
+        .rounded-lg { border-radius: 0.5rem; }
+        .rounded-xl { border-radius: 0.75rem; }
+        .rounded-full { border-radius: 9999px; }
+        .border { border-width: 1px; }
+        .border-2 { border-width: 2px; }
+        .border-gray-600 { border-color: #4b5563; }
+        .border-blue-500 { border-color: #3b82f6; }
+        .border-green-600 { border-color: #16a34a; }
+        .border-red-600 { border-color: #dc2626; }
+        .border-t-transparent { border-top-color: transparent; }
+        .bg-gray-600 { background-color: #4b5563; }
+        .bg-gray-700 { background-color: #374151; }
+        .bg-gray-800 { background-color: #1f2937; }
+        .bg-gray-900 { background-color: #111827; }
+        .bg-blue-400 { background-color: #60a5fa; }
+        .bg-blue-500 { background-color: #3b82f6; }
+        .bg-blue-600 { background-color: #2563eb; }
+        .bg-green-400 { background-color: #4ade80; }
+        .bg-green-500 { background-color: #22c55e; }
+        .bg-green-600 { background-color: #16a34a; }
+        .bg-green-800 { background-color: #166534; }
+        .bg-purple-400 { background-color: #c084fc; }
+        .bg-purple-500 { background-color: #a855f7; }
+        .bg-red-500 { background-color: #ef4444; }
+        .bg-red-800 { background-color: #991b1b; }
+        .bg-gradient-to-r { background-image: linear-gradient(to right, var(--tw-gradient-stops)); }
+        .from-blue-400 { --tw-gradient-from: #60a5fa; --tw-gradient-stops: var(--tw-gradient-from), var(--tw-gradient-to, rgb(96 165 250 / 0)); }
+        .from-blue-500 { --tw-gradient-from: #3b82f6; --tw-gradient-stops: var(--tw-gradient-from), var(--tw-gradient-to, rgb(59 130 246 / 0)); }
+        .from-red-500 { --tw-gradient-from: #ef4444; --tw-gradient-stops: var(--tw-gradient-from), var(--tw-gradient-to, rgb(239 68 68 / 0)); }
+        .to-purple-500 { --tw-gradient-to: #a855f7; }
+        .to-purple-600 { --tw-gradient-to: #9333ea; }
+        .bg-clip-text { -webkit-background-clip: text; background-clip: text; }
+        .p-1 { padding: 0.25rem; }
+        .p-3 { padding: 0.75rem; }
+        .p-4 { padding: 1rem; }
+        .p-6 { padding: 1.5rem; }
+        .px-1 { padding-left: 0.25rem; padding-right: 0.25rem; }
+        .px-2 { padding-left: 0.5rem; padding-right: 0.5rem; }
+        .px-3 { padding-left: 0.75rem; padding-right: 0.75rem; }
+        .px-4 { padding-left: 1rem; padding-right: 1rem; }
+        .px-6 { padding-left: 1.5rem; padding-right: 1.5rem; }
+        .py-0\\.5 { padding-top: 0.125rem; padding-bottom: 0.125rem; }
+        .py-1 { padding-top: 0.25rem; padding-bottom: 0.25rem; }
+        .py-2 { padding-top: 0.5rem; padding-bottom: 0.5rem; }
+        .py-4 { padding-top: 1rem; padding-bottom: 1rem; }
+        .py-8 { padding-top: 2rem; padding-bottom: 2rem; }
+        .text-center { text-align: center; }
+        .text-xs { font-size: 0.75rem; line-height: 1rem; }
+        .text-sm { font-size: 0.875rem; line-height: 1.25rem; }
+        .text-xl { font-size: 1.25rem; line-height: 1.75rem; }
+        .text-3xl { font-size: 1.875rem; line-height: 2.25rem; }
+        .font-medium { font-weight: 500; }
+        .font-semibold { font-weight: 600; }
+        .font-bold { font-weight: 700; }
+        .text-transparent { color: transparent; }
+        .text-white { color: #fff; }
+        .text-gray-300 { color: #d1d5db; }
+        .text-gray-400 { color: #9ca3af; }
+        .text-gray-500 { color: #6b7280; }
+        .text-blue-300 { color: #93c5fd; }
+        .text-blue-400 { color: #60a5fa; }
+        .text-green-400 { color: #4ade80; }
+        .text-purple-300 { color: #d8b4fe; }
+        .text-purple-400 { color: #c084fc; }
+        .text-red-400 { color: #f87171; }
+        .opacity-50 { opacity: 0.5; }
+        .z-50 { z-index: 50; }
+        .cursor-pointer { cursor: pointer; }
+        .select-none { -webkit-user-select: none; user-select: none; }
+        .transition-all { transition-property: all; transition-timing-function: cubic-bezier(0.4, 0, 0.2, 1); transition-duration: 150ms; }
+        .transition-colors {
+            transition-property: color, background-color, border-color, fill, stroke;
+            transition-timing-function: cubic-bezier(0.4, 0, 0.2, 1);
+            transition-duration: 150ms;
+        }
+        .duration-200 { transition-duration: 200ms; }
+        .duration-300 { transition-duration: 300ms; }
+        @keyframes spin { to { transform: rotate(360deg); } }
+        .animate-spin { animation: spin 1s linear infinite; }
+        .animate-pulse { animation: pulse 2s cubic-bezier(0.4, 0, 0.6, 1) infinite; }
+        .hover\\:bg-gray-700:hover { background-color: #374151; }
+        .hover\\:from-blue-600:hover { --tw-gradient-from: #2563eb; --tw-gradient-stops: var(--tw-gradient-from), var(--tw-gradient-to, rgb(37 99 235 / 0)); }
+        .hover\\:from-red-600:hover { --tw-gradient-from: #dc2626; --tw-gradient-stops: var(--tw-gradient-from), var(--tw-gradient-to, rgb(220 38 38 / 0)); }
+        .hover\\:to-purple-700:hover { --tw-gradient-to: #7e22ce; }
+        .hover\\:text-red-300:hover { color: #fca5a5; }
+        .focus\\:border-transparent:focus { border-color: transparent; }
+        .focus\\:ring-2:focus { outline: 2px solid transparent; box-shadow: 0 0 0 2px var(--tw-ring-color); }
+        .focus\\:ring-blue-500:focus { --tw-ring-color: #3b82f6; }
+        .focus\\:ring-red-500:focus { --tw-ring-color: #ef4444; }
+        @media (min-width: 768px) { .md\\:grid-cols-2 { grid-template-columns: repeat(2, minmax(0, 1fr)); } }
+        @media (min-width: 1024px) {
+            .lg\\:col-span-1 { grid-column: span 1 / span 1; }
+            .lg\\:col-span-2 { grid-column: span 2 / span 2; }
+            .lg\\:grid-cols-3 { grid-template-columns: repeat(3, minmax(0, 1fr)); }
+        }
         .connection-line {
             background: linear-gradient(90deg, #3b82f6, #8b5cf6);
             height: 2px;
@@ -268,21 +690,12 @@ HTML_TEMPLATE = """
                 if (!response.ok) throw new Error(`HTTP error! status: ${response.status}`);
                 const data = await response.json();
                 updateConnectionStatus(true);
-                updatePortList(data.input_ports, data.output_ports);
-                updateConnectionList(data.connections, data.auto_connections, data.manual_connections);
-                updateDisconnectDropdowns(data.connections);
-
-                const manualModeToggle = document.getElementById('manual-mode-toggle');
-                if (manualModeToggle && manualModeToggle.checked !== data.manual_mode) {
-                    manualModeToggle.checked = data.manual_mode;
-                }
+                applySnapshot(data);
             } catch (error) {
                 console.error('Error fetching data:', error);
                 retryCount++;
                 updateConnectionStatus(false);
-                updatePortList([], []);
-                updateConnectionList([], [], []);
-                updateDisconnectDropdowns([]);
+                applySnapshot({ input_ports: [], output_ports: [], connections: [], auto_connections: [], manual_mode: routerState.manualMode });
 
                 if (showNotificationOnError && retryCount <= maxRetries) {
                     showNotification(`Server connection failed, retrying... (${retryCount}/${maxRetries})`, 'error');
@@ -312,176 +725,244 @@ HTML_TEMPLATE = """
             }
         }
 
-        function updatePortList(inputPorts, outputPorts) {
-            const portList = document.getElementById('port-list');
-            const portCount = document.getElementById('port-count');
-            const fromSelect = document.getElementById('from-port');
-            const toSelect = document.getElementById('to-port');
-            const disconnectFromSelect = document.getElementById('disconnect-from-port');
-            const disconnectToSelect = document.getElementById('disconnect-to-port');
+        // Client-side copy of the router state, kept up to date by /events deltas
+        const routerState = { ports: new Map(), connections: new Map(), manualMode: false };
+        const portCards = new Map();
+        const connectionCards = new Map();
+
+        function applySnapshot(data) {
+            routerState.ports = new Map();
+            const inputs = new Set(data.input_ports);
+            const outputs = new Set(data.output_ports);
+            [...new Set([...data.input_ports, ...data.output_ports])].forEach(port => {
+                routerState.ports.set(port, { input: inputs.has(port), output: outputs.has(port) });
+            });
+            routerState.connections = new Map();
+            data.connections.forEach(connection => {
+                const auto = data.auto_connections.some(other => other[0] === connection[0] && other[1] === connection[1]);
+                routerState.connections.set(connectionKey(connection[0], connection[1]), { from: connection[0], to: connection[1], auto: auto });
+            });
+            routerState.manualMode = data.manual_mode;
+            renderPortList();
+            renderPortSelects();
+            renderConnectionList();
+            updateDisconnectDropdowns();
+            updateManualModeToggle();
+        }
+
+        function applyEvent(type, data) {
+            if (type === 'port_added') {
+                routerState.ports.set(data.port, { input: data.input, output: data.output });
+                upsertPortCard(data.port);
+                renderPortSelects();
+            } else if (type === 'port_removed') {
+                routerState.ports.delete(data.port);
+                removePortCard(data.port);
+                renderPortSelects();
+            } else if (type === 'route_created') {
+                routerState.connections.set(connectionKey(data.from, data.to), data);
+                upsertConnectionCard(data);
+                updateDisconnectDropdowns();
+            } else if (type === 'route_closed') {
+                routerState.connections.delete(connectionKey(data.from, data.to));
+                removeConnectionCard(data);
+                updateDisconnectDropdowns();
+            } else if (type === 'mode_changed') {
+                routerState.manualMode = data.manual_mode;
+                updateManualModeToggle();
+            }
+        }
 
-            const currentFrom = fromSelect.value;
-            const currentTo = toSelect.value;
-            const currentDisconnectFrom = disconnectFromSelect.value;
-            const currentDisconnectTo = disconnectToSelect.value;
+        function connectionKey(fromPort, toPort) {
+            return JSON.stringify([fromPort, toPort]);
+        }
+
+        function updateManualModeToggle() {
+            const manualModeToggle = document.getElementById('manual-mode-toggle');
+            if (manualModeToggle && manualModeToggle.checked !== routerState.manualMode) {
+                manualModeToggle.checked = routerState.manualMode;
+            }
+        }
 
-            const totalPorts = [...new Set([...inputPorts, ...outputPorts])].length;
-            portCount.textContent = totalPorts;
+        function createPortCard(port, isInput, isOutput) {
+            const portType = isInput && isOutput ? 'Input/Output' : isInput ? 'Input' : 'Output';
+            const portColor = isInput && isOutput ? 'bg-green-400' : isInput ? 'bg-blue-400' : 'bg-purple-400';
+
+            const isThrough = port.toLowerCase().includes('through') || port.toLowerCase().includes('thru');
+            const isUSB = !isThrough && (
+                port.toLowerCase().includes('usb') ||
+                ['arturia', 'roland', 'yamaha', 'korg', 'novation', 'native instruments', 'controller', 'keyboard'].some(brand =>
+                    port.toLowerCase().includes(brand.toLowerCase())
+                )
+            );
+            const deviceType = isThrough ? 'Through' : isUSB ? 'USB' : 'MIDI';
+            const deviceColor = isThrough ? 'bg-blue-600' : isUSB ? 'bg-green-600' : 'bg-gray-600';
+
+            const portCard = document.createElement('div');
+            portCard.className = 'port-card bg-gray-700 p-3 rounded-lg flex items-center justify-between';
+            portCard.innerHTML = `
+                <div class="flex items-center space-x-3">
+                    <div class="w-2 h-2 ${portColor} rounded-full"></div>
+                    <div>
+                        <div class="text-sm font-medium flex items-center space-x-2">
+                            <span>${port}</span>
+                            <span class="text-xs ${deviceColor} px-1 py-0.5 rounded">${deviceType}</span>
+                        </div>
+                        <div class="text-xs text-gray-400">${portType}</div>
+                    </div>
+                </div>
+            `;
+            return portCard;
+        }
 
+        function renderPortList() {
+            const portList = document.getElementById('port-list');
             portList.innerHTML = '';
-            fromSelect.innerHTML = '<option value="">-- Select Input Source --</option>';
-            toSelect.innerHTML = '<option value="">-- Select Output Destination --</option>';
+            portCards.clear();
+            routerState.ports.forEach((directions, port) => upsertPortCard(port));
+            updatePortCount();
+        }
+
+        function upsertPortCard(port) {
+            const portList = document.getElementById('port-list');
+            const directions = routerState.ports.get(port);
+            const portCard = createPortCard(port, directions.input, directions.output);
+            const existing = portCards.get(port);
+            if (existing) {
+                existing.replaceWith(portCard);
+            } else {
+                if (portCards.size === 0) portList.innerHTML = '';
+                portList.appendChild(portCard);
+            }
+            portCards.set(port, portCard);
+            updatePortCount();
+        }
 
-            const allPorts = [...new Set([...inputPorts, ...outputPorts])];
+        function removePortCard(port) {
+            const existing = portCards.get(port);
+            if (existing) {
+                existing.remove();
+                portCards.delete(port);
+            }
+            updatePortCount();
+        }
 
-            if (allPorts.length === 0) {
-                portList.innerHTML = `
+        function updatePortCount() {
+            document.getElementById('port-count').textContent = routerState.ports.size;
+            if (routerState.ports.size === 0) {
+                document.getElementById('port-list').innerHTML = `
                     <div class="text-center py-4 text-gray-500">
                         <p class="text-sm">No available MIDI devices detected</p>
                     </div>
                 `;
-                return;
             }
+        }
 
-            allPorts.forEach(port => {
-                const isInput = inputPorts.includes(port);
-                const isOutput = outputPorts.includes(port);
-                const portType = isInput && isOutput ? 'Input/Output' : isInput ? 'Input' : 'Output';
-                const portColor = isInput && isOutput ? 'bg-green-400' : isInput ? 'bg-blue-400' : 'bg-purple-400';
-
-                const isThrough = port.toLowerCase().includes('through') || port.toLowerCase().includes('thru');
-                const isUSB = !isThrough && (
-                    port.toLowerCase().includes('usb') ||
-                    ['arturia', 'roland', 'yamaha', 'korg', 'novation', 'native instruments', 'controller', 'keyboard'].some(brand =>
-                        port.toLowerCase().includes(brand.toLowerCase())
-                    )
-                );
-                const deviceType = isThrough ? 'Through' : isUSB ? 'USB' : 'MIDI';
-                const deviceColor = isThrough ? 'bg-blue-600' : isUSB ? 'bg-green-600' : 'bg-gray-600';
-
-                const portCard = document.createElement('div');
-                portCard.className = 'port-card bg-gray-700 p-3 rounded-lg flex items-center justify-between';
-                portCard.innerHTML = `
-                    <div class="flex items-center space-x-3">
-                        <div class="w-2 h-2 ${portColor} rounded-full"></div>
-                        <div>
-                            <div class="text-sm font-medium flex items-center space-x-2">
-                                <span>${port}</span>
-                                <span class="text-xs ${deviceColor} px-1 py-0.5 rounded">${deviceType}</span>
-                            </div>
-                            <div class="text-xs text-gray-400">${portType}</div>
-                        </div>
-                    </div>
-                `;
-                portList.appendChild(portCard);
-            });
-
-            inputPorts.forEach(port => {
-                const fromOption = document.createElement('option');
-                fromOption.value = port;
-                fromOption.textContent = port;
-                if (port === currentFrom) fromOption.selected = true;
-                fromSelect.appendChild(fromOption);
-            });
-
-            outputPorts.forEach(port => {
-                const toOption = document.createElement('option');
-                toOption.value = port;
-                toOption.textContent = port;
-                if (port === currentTo) toOption.selected = true;
-                toSelect.appendChild(toOption);
+        function fillSelect(select, placeholder, ports, suffix, classes) {
+            const current = select.value;
+            select.innerHTML = `<option value="">${placeholder}</option>`;
+            ports.forEach(port => {
+                const option = document.createElement('option');
+                option.value = port;
+                option.textContent = port + suffix;
+                if (classes) option.classList.add(...classes);
+                if (port === current) option.selected = true;
+                select.appendChild(option);
             });
         }
 
-        function updateDisconnectDropdowns(connections) {
-            const disconnectFromSelect = document.getElementById('disconnect-from-port');
-            const disconnectToSelect = document.getElementById('disconnect-to-port');
-
-            const currentDisconnectFrom = disconnectFromSelect.value;
-            const currentDisconnectTo = disconnectToSelect.value;
-
-            disconnectFromSelect.innerHTML = '<option value="">-- Select Input Source --</option>';
-            disconnectToSelect.innerHTML = '<option value="">-- Select Output Destination --</option>';
+        function renderPortSelects() {
+            const inputs = [...routerState.ports].filter(([port, directions]) => directions.input).map(([port]) => port);
+            const outputs = [...routerState.ports].filter(([port, directions]) => directions.output).map(([port]) => port);
+            fillSelect(document.getElementById('from-port'), '-- Select Input Source --', inputs, '');
+            fillSelect(document.getElementById('to-port'), '-- Select Output Destination --', outputs, '');
+        }
 
+        function updateDisconnectDropdowns() {
             const inputsSet = new Set();
             const outputsSet = new Set();
-
-            connections.forEach(connection => {
-                inputsSet.add(connection[0]);
-                outputsSet.add(connection[1]);
+            routerState.connections.forEach(connection => {
+                inputsSet.add(connection.from);
+                outputsSet.add(connection.to);
             });
+            fillSelect(document.getElementById('disconnect-from-port'), '-- Select Input Source --',
+                inputsSet, ' (connected)', ['font-semibold', 'text-blue-300']);
+            fillSelect(document.getElementById('disconnect-to-port'), '-- Select Output Destination --',
+                outputsSet, ' (connected)', ['font-semibold', 'text-purple-300']);
+        }
 
-            inputsSet.forEach(port => {
-                const option = document.createElement('option');
-                option.value = port;
-                option.textContent = port + ' (connected)';
-                option.classList.add('font-semibold', 'text-blue-300');
-                if (port === currentDisconnectFrom) option.selected = true;
-                disconnectFromSelect.appendChild(option);
-            });
+        function createConnectionCard(connection) {
+            const isAutoConnection = connection.auto;
 
-            outputsSet.forEach(port => {
-                const option = document.createElement('option');
-                option.value = port;
-                option.textContent = port + ' (connected)';
-                option.classList.add('font-semibold', 'text-purple-300');
-                if (port === currentDisconnectTo) option.selected = true;
-                disconnectToSelect.appendChild(option);
-            });
-        }
+            const shortenName = (name) => {
+                return name.replace(/^USB MIDI:USB MIDI /, '').replace(/^MIDI Through:/, '');
+            };
 
-        function updateConnectionList(connections, autoConnections, manualConnections) {
-            const connectionList = document.getElementById('connection-list');
-            const connectionCount = document.getElementById('connection-count');
-            const noConnections = document.getElementById('no-connections');
+            const connectionCard = document.createElement('div');
+            connectionCard.className = 'bg-gray-700 p-4 rounded-lg';
+            connectionCard.innerHTML = `
+                <div class="flex items-center justify-between">
+                    <div class="flex items-center space-x-4 flex-1">
+                        <div class="bg-blue-500 px-3 py-1 rounded-full text-xs font-medium max-w-xs truncate">
+                            ${shortenName(connection.from)}
+                        </div>
+                        <div class="flex items-center space-x-2">
+                            <div class="${isAutoConnection ? 'auto-connection-line' : 'connection-line'} w-8"></div>
+                            <svg class="w-4 h-4 text-purple-400" fill="none" stroke="currentColor" viewBox="0 0 24 24">
+                                <path stroke-linecap="round" stroke-linejoin="round" stroke-width="2" d="M9 5l7 7-7 7"/>
+                            </svg>
+                            <div class="${isAutoConnection ? 'auto-connection-line' : 'connection-line'} w-8"></div>
+                        </div>
+                        <div class="bg-purple-500 px-3 py-1 rounded-full text-xs font-medium max-w-xs truncate">
+                            ${shortenName(connection.to)}
+                        </div>
+                    </div>
+                    <div class="flex items-center space-x-2">
+                        <button class="text-red-400 hover:text-red-300 p-1" title="Disconnect">
+                            <svg class="w-4 h-4" fill="none" stroke="currentColor" viewBox="0 0 24 24">
+                                <path stroke-linecap="round" stroke-linejoin="round" stroke-width="2" d="M6 18L18 6M6 6l12 12"/>
+                            </svg>
+                        </button>
+                    </div>
+                </div>
+            `;
+            connectionCard.querySelector('button').addEventListener('click', () => disconnectConnection(connection.from, connection.to));
+            return connectionCard;
+        }
 
-            connectionCount.textContent = connections.length;
-            connectionList.innerHTML = '';
+        function renderConnectionList() {
+            document.getElementById('connection-list').innerHTML = '';
+            connectionCards.clear();
+            routerState.connections.forEach(connection => upsertConnectionCard(connection));
+            updateConnectionCount();
+        }
 
-            if (connections.length === 0) {
-                noConnections.style.display = 'block';
+        function upsertConnectionCard(connection) {
+            const key = connectionKey(connection.from, connection.to);
+            const connectionCard = createConnectionCard(connection);
+            const existing = connectionCards.get(key);
+            if (existing) {
+                existing.replaceWith(connectionCard);
             } else {
-                noConnections.style.display = 'none';
-                connections.forEach(connection => {
-                    const isAutoConnection = autoConnections.some(auto =>
-                        auto[0] === connection[0] && auto[1] === connection[1]
-                    );
-
-                    const shortenName = (name) => {
-                        return name.replace(/^USB MIDI:USB MIDI /, '').replace(/^MIDI Through:/, '');
-                    };
-
-                    const connectionCard = document.createElement('div');
-                    connectionCard.className = 'bg-gray-700 p-4 rounded-lg';
-                    connectionCard.innerHTML = `
-                        <div class="flex items-center justify-between">
-                            <div class="flex items-center space-x-4 flex-1">
-                                <div class="bg-blue-500 px-3 py-1 rounded-full text-xs font-medium max-w-xs truncate">
-                                    ${shortenName(connection[0])}
-                                </div>
-                                <div class="flex items-center space-x-2">
-                                    <div class="${isAutoConnection ? 'auto-connection-line' : 'connection-line'} w-8"></div>
-                                    <svg class="w-4 h-4 text-purple-400" fill="none" stroke="currentColor" viewBox="0 0 24 24">
-                                        <path stroke-linecap="round" stroke-linejoin="round" stroke-width="2" d="M9 5l7 7-7 7"/>
-                                    </svg>
-                                    <div class="${isAutoConnection ? 'auto-connection-line' : 'connection-line'} w-8"></div>
-                                </div>
-                                <div class="bg-purple-500 px-3 py-1 rounded-full text-xs font-medium max-w-xs truncate">
-                                    ${shortenName(connection[1])}
-                                </div>
-                            </div>
-                            <div class="flex items-center space-x-2">
-                                <button onclick="disconnectConnection('${connection[0]}', '${connection[1]}')" class="text-red-400 hover:text-red-300 p-1" title="Disconnect">
-                                    <svg class="w-4 h-4" fill="none" stroke="currentColor" viewBox="0 0 24 24">
-                                        <path stroke-linecap="round" stroke-linejoin="round" stroke-width="2" d="M6 18L18 6M6 6l12 12"/>
-                                    </svg>
-                                </button>
-                            </div>
-                        </div>
-                    `;
-                    connectionList.appendChild(connectionCard);
-                });
+                document.getElementById('connection-list').appendChild(connectionCard);
+            }
+            connectionCards.set(key, connectionCard);
+            updateConnectionCount();
+        }
+
+        function removeConnectionCard(connection) {
+            const key = connectionKey(connection.from, connection.to);
+            const existing = connectionCards.get(key);
+            if (existing) {
+                existing.remove();
+                connectionCards.delete(key);
             }
+            updateConnectionCount();
+        }
+
+        function updateConnectionCount() {
+            document.getElementById('connection-count').textContent = routerState.connections.size;
+            document.getElementById('no-connections').style.display = routerState.connections.size === 0 ? 'block' : 'none';
         }
 
         async function handleConnect(event) {
@@ -513,7 +994,7 @@ HTML_TEMPLATE = """
                 });
                 if (response.ok) {
                     showNotification('MIDI connection created successfully!', 'success');
-                    fetchData();
+                    refreshAfterAction();
                 } else {
                     showNotification('Failed to create connection', 'error');
                 }
@@ -547,7 +1028,7 @@ HTML_TEMPLATE = """
                 });
                 if (response.ok) {
                     showNotification('MIDI connection disconnected', 'info');
-                    fetchData();
+                    refreshAfterAction();
                 } else {
                     showNotification('Failed to disconnect', 'error');
                 }
@@ -571,7 +1052,7 @@ HTML_TEMPLATE = """
                 });
                 if (response.ok) {
                     showNotification('MIDI connection disconnected', 'info');
-                    fetchData();
+                    refreshAfterAction();
                 } else {
                     showNotification('Failed to disconnect', 'error');
                 }
@@ -598,6 +1079,17 @@ HTML_TEMPLATE = """
             setTimeout(() => { notification.remove(); }, 3000);
         }
 
+        async function waitForJob(jobId) {
+            // Control operations run in the background; poll until the job finishes
+            while (true) {
+                const response = await fetch(`/jobs/${encodeURIComponent(jobId)}`);
+                if (!response.ok) throw new Error(`HTTP error! status: ${response.status}`);
+                const job = await response.json();
+                if (job.state === 'done' || job.state === 'failed') return job;
+                await new Promise(resolve => setTimeout(resolve, 200));
+            }
+        }
+
         document.getElementById('manual-mode-toggle').addEventListener('change', async function() {
             try {
                 const newValue = this.checked;
@@ -607,9 +1099,14 @@ HTML_TEMPLATE = """
                     body: JSON.stringify({ manual_mode: newValue })
                 });
                 if (response.ok) {
-                    const data = await response.json();
-                    showNotification(`Manual mode ${data.manual_mode ? 'enabled' : 'disabled'}`, 'info');
-                    fetchData(false);
+                    const job = await waitForJob((await response.json()).id);
+                    if (job.state === 'done') {
+                        showNotification(`Manual mode ${job.result.manual_mode ? 'enabled' : 'disabled'}`, 'info');
+                    } else {
+                        showNotification('Failed to toggle manual mode', 'error');
+                        this.checked = !newValue;
+                    }
+                    refreshAfterAction();
                 } else {
                     showNotification('Failed to toggle manual mode', 'error');
                     this.checked = !newValue; // revert toggle on failure
@@ -620,55 +1117,235 @@ HTML_TEMPLATE = """
             }
         });
 
-        // Initial connection status and fetch
-        updateConnectionStatus(false);
-        fetchData();
+        let eventSource = null;
+
+        function startEventStream() {
+            // The browser reconnects on its own and sends Last-Event-ID, so the
+            // server can resume with the deltas we missed
+            eventSource = new EventSource('/events');
+            ['snapshot', 'port_added', 'port_removed', 'route_created', 'route_closed', 'mode_changed'].forEach(type => {
+                eventSource.addEventListener(type, event => {
+                    const data = JSON.parse(event.data);
+                    if (type === 'snapshot') {
+                        applySnapshot(data);
+                    } else {
+                        applyEvent(type, data);
+                    }
+                });
+            });
+            eventSource.onopen = () => updateConnectionStatus(true);
+            eventSource.onerror = () => updateConnectionStatus(false);
+        }
+
+        function refreshAfterAction() {
+            // With the event stream open, the change arrives as a delta
+            if (!eventSource || eventSource.readyState !== EventSource.OPEN) fetchData(false);
+        }
+
+        // Report first paint so it can be read from /status on the kiosk
+        if (window.PerformanceObserver && navigator.sendBeacon) {
+            try {
+                new PerformanceObserver(list => {
+                    list.getEntries().forEach(entry => {
+                        navigator.sendBeacon('/paint_timing', JSON.stringify({ name: entry.name, ms: entry.startTime }));
+                    });
+                }).observe({ type: 'paint', buffered: true });
+            } catch (error) {
+                console.error('Paint timing not supported:', error);
+            }
+        }
 
-        setInterval(() => {
-            if (retryCount <= maxRetries) fetchData(false);
-        }, 2000);
+        // Initial connection status, then live updates
+        updateConnectionStatus(false);
+        if (window.EventSource) {
+            startEventStream();
+        } else {
+            fetchData();
+            setInterval(() => {
+                if (retryCount <= maxRetries) fetchData(false);
+            }, 2000);
+        }
     </script>
 </body>
 </html>
 """
 
-def is_usb_midi_device(port_name):
-    if is_through_midi_device(port_name):
-        return False
-    port_lower = port_name.lower()
-    for pattern in usb_device_patterns:
-        if pattern.lower() in port_lower:
-            return True
-    manufacturers = [
-        'arturia', 'roland', 'yamaha', 'korg', 'novation',
-        'native instruments', 'akai', 'm-audio', 'behringer',
-        'focusrite', 'presonus', 'steinberg'
-    ]
-    for manufacturer in manufacturers:
-        if manufacturer in port_lower:
+class RateLimiter:
+    """Token bucket that allows `rate` events per second with bursts up to `burst`"""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst if burst is not None else max(rate, 1)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.suppressed = 0
+
+    def allow(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
             return True
-    return False
+        self.suppressed += 1
+        return False
+
+midi_event_limiter = RateLimiter(MIDI_EVENT_LOG_RATE)
+
+def setup_logging():
+    """Route all log records through the queue to a background writer"""
+    global log_listener
+    if log_listener is not None:
+        return
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter('%(levelname)s [%(threadName)s] %(message)s'))
+    log_listener = logging.handlers.QueueListener(log_queue, handler, respect_handler_level=True)
+    log_listener.start()
+    log.addHandler(logging.handlers.QueueHandler(log_queue))
+    log.setLevel(logging.DEBUG if LOG_MIDI_EVENTS else LOG_LEVEL)
+    log.propagate = False
+
+def parse_cpu_list(text):
+    """Parse a CPU list such as '2,3' or '0-1,3' into a set of CPU numbers"""
+    cpus = set()
+    for part in text.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        if '-' in part:
+            first, last = part.split('-', 1)
+            cpus.update(range(int(first), int(last) + 1))
+        else:
+            cpus.add(int(part))
+    return cpus
+
+def describe_current_thread():
+    """Return the CPU affinity and scheduling of the calling thread"""
+    info = {'cpus': None, 'policy': None, 'priority': None, 'nice': None}
+    if hasattr(os, 'sched_getaffinity'):
+        info['cpus'] = sorted(os.sched_getaffinity(0))
+    if hasattr(os, 'sched_getscheduler'):
+        policy = os.sched_getscheduler(0)
+        info['policy'] = {os.SCHED_FIFO: 'fifo', os.SCHED_RR: 'rr', os.SCHED_OTHER: 'other'}.get(policy, str(policy))
+        info['priority'] = os.sched_getparam(0).sched_priority
+    if hasattr(os, 'getpriority'):
+        info['nice'] = os.getpriority(os.PRIO_PROCESS, threading.get_native_id())
+    return info
+
+def tune_current_thread(role):
+    """Apply the pinning and scheduling configured for `role` to the calling thread.
+
+    `role` is 'forwarding' or 'background'.  Affinity and scheduling are
+    per thread on Linux, so every thread calls this itself when it starts.
+    Anything the system refuses is logged and reported with the settings
+    that did take effect under 'threads' in /status.
+    """
+    errors = []
+    tid = threading.get_native_id()
+    if role == 'forwarding':
+        cpus, policy, nice = RT_CPUS, RT_POLICY, PROCESS_NICE
+    else:
+        cpus, policy, nice = BACKGROUND_CPUS, 'none', min(PROCESS_NICE + BACKGROUND_NICE, 19)
+    # Threads also inherit their creator's CPU mask, so a role without CPUs
+    # of its own goes back to the mask the process started with
+    if PROCESS_CPUS is not None:
+        try:
+            mask = parse_cpu_list(cpus) if cpus else PROCESS_CPUS
+            if os.sched_getaffinity(0) != mask:
+                os.sched_setaffinity(0, mask)
+        except (OSError, ValueError) as e:
+            errors.append(f"CPU affinity {cpus or 'of the process'}: {e}")
+    if policy in ('fifo', 'rr') and hasattr(os, 'sched_setscheduler'):
+        try:
+            scheduler = os.SCHED_FIFO if policy == 'fifo' else os.SCHED_RR
+            os.sched_setscheduler(0, scheduler, os.sched_param(RT_PRIORITY))
+        except OSError as e:
+            errors.append(f"{policy.upper()} priority {RT_PRIORITY}: {e}")
+    elif policy != 'none':
+        errors.append(f"Unknown scheduling policy '{policy}'")
+    # Threads inherit their creator's nice value, so a forwarding thread
+    # started from a demoted web thread has to raise it back
+    if hasattr(os, 'setpriority') and os.getpriority(os.PRIO_PROCESS, tid) != nice:
+        try:
+            os.setpriority(os.PRIO_PROCESS, tid, nice)
+        except OSError as e:
+            errors.append(f"nice {nice}: {e}")
+    effective = describe_current_thread()
+    effective['errors'] = errors
+    with thread_tuning_lock:
+        changed = thread_tuning.get(role) != effective
+        thread_tuning[role] = effective
+    if changed:
+        for error in errors:
+            log.warning(f"Could not tune {role} thread: {error}")
+        mark_status_changed()
+
+DeviceClass = collections.namedtuple('DeviceClass', ['usb', 'through', 'visible'])
+
+class DeviceClassifier:
+    """Classifies port names with one precompiled regex per rule group.
+
+    Results are memoized per port name, so the monitor and /status only pay
+    for the regex search the first time a port is seen.
+    """
+
+    def __init__(self, rules):
+        self.rules = rules
+        self._through = self._compile(rules['through_patterns'])
+        self._usb = self._compile(rules['usb_patterns'] + rules['manufacturers'])
+        self._hidden = self._compile(rules['hidden_patterns'])
+        self.classify = functools.lru_cache(maxsize=1024)(self._classify)
+
+    @staticmethod
+    def _compile(patterns):
+        if not patterns:
+            return None
+        # Longest first so the alternation stops at the most specific match
+        alternatives = sorted({pattern.lower() for pattern in patterns}, key=len, reverse=True)
+        return re.compile('|'.join(re.escape(pattern) for pattern in alternatives))
+
+    def _classify(self, port_name):
+        port_lower = port_name.lower()
+        through = self._through is not None and self._through.search(port_lower) is not None
+        usb = not through and self._usb is not None and self._usb.search(port_lower) is not None
+        hidden = self._hidden is not None and self._hidden.search(port_lower) is not None
+        return DeviceClass(usb, through, not hidden and (usb or through))
+
+
+def load_classifier_rules(path=CLASSIFIER_RULES_FILE):
+    """Return the default rules updated with the lists from a JSON rules file"""
+    rules = {name: list(patterns) for name, patterns in DEFAULT_CLASSIFIER_RULES.items()}
+    if not path:
+        return rules
+    try:
+        with open(path) as rules_file:
+            custom_rules = json.load(rules_file)
+        for name, patterns in custom_rules.items():
+            if name not in rules:
+                log.warning(f"Ignoring unknown classifier rule '{name}' in {path}")
+                continue
+            rules[name] = [str(pattern) for pattern in patterns]
+        log.info(f"Loaded device classifier rules from {path}")
+    except Exception as e:
+        log.error(f"Error loading classifier rules from {path}, using defaults: {e}")
+    return rules
+
+def get_device_classifier():
+    global device_classifier
+    if device_classifier is None:
+        device_classifier = DeviceClassifier(load_classifier_rules())
+    return device_classifier
+
+def is_usb_midi_device(port_name):
+    return get_device_classifier().classify(port_name).usb
 
 def is_through_midi_device(port_name):
-    port_lower = port_name.lower()
-    through_patterns = ['through', 'thru', 'midi through', 'midi thru']
-    for pattern in through_patterns:
-        if pattern in port_lower:
-            return True
-    return False
+    return get_device_classifier().classify(port_name).through
 
 def should_show_port(port_name):
-    port_lower = port_name.lower()
-    if 'rtmidi' in port_lower:
-        return False
-    if is_usb_midi_device(port_name):
-        return True
-    if is_through_midi_device(port_name):
-        return True
-    return False
+    return get_device_classifier().classify(port_name).visible
 
 def should_auto_connect_port(port_name):
-    global manual_mode
     # Only auto-connect USB devices if manual mode is OFF
     if manual_mode:
         return False
@@ -677,17 +1354,289 @@ def should_auto_connect_port(port_name):
 def filter_ports(ports):
     return [port for port in ports if should_show_port(port)]
 
+class MidiBackend:
+    """Where the router finds ports and opens them.
+
+    Ports returned by open_input() and open_output() behave like mido's
+    rtmidi ports: inputs take a Message callback or can be iterated, and
+    both may expose the underlying rtmidi object as `_rt` for raw bytes.
+    """
+    name = 'none'
+    system_devices = False  # True if ports are ALSA devices the kernel can patch
+
+    def get_input_names(self):
+        raise NotImplementedError
+
+    def get_output_names(self):
+        raise NotImplementedError
+
+    def open_input(self, port_name, callback=None):
+        raise NotImplementedError
+
+    def open_output(self, port_name):
+        raise NotImplementedError
+
+    def reset(self):
+        """Drop any cached state before the ports are opened again"""
+
+    def create_hotplug_backend(self):
+        """Return a HotplugBackend that knows about this backend's devices, or None"""
+        return None
+
+
+class MidoBackend(MidiBackend):
+    """The real MIDI devices, through mido and python-rtmidi"""
+    name = 'mido'
+    system_devices = True
+
+    def get_input_names(self):
+        return mido.get_input_names()
+
+    def get_output_names(self):
+        return mido.get_output_names()
+
+    def open_input(self, port_name, callback=None):
+        return mido.open_input(port_name, callback=callback)
+
+    def open_output(self, port_name):
+        return mido.open_output(port_name)
+
+    def reset(self):
+        # Reload the mido module to reset its internal state
+        importlib.reload(mido)
+
+
+class LoopbackDevice:
+    """A virtual device of the loopback backend"""
+
+    def __init__(self, name, has_input=True, has_output=True, capture_size=LOOPBACK_CAPTURE_SIZE):
+        self.name = name
+        self.has_input = has_input
+        self.has_output = has_output
+        self.plugged = True
+        self.inputs = []  # Open LoopbackInputs reading from this device
+        self.sent = collections.deque(maxlen=capture_size)  # (perf_counter_ns, bytes) sent to it
+        self.last_event = None
+
+    def inject(self, data):
+        """Deliver one message, as a list of bytes, to everything reading this device"""
+        if not self.plugged:
+            raise IOError(f"Device '{self.name}' is unplugged")
+        now = time.perf_counter()
+        delta = now - self.last_event if self.last_event is not None else 0.0
+        self.last_event = now
+        for port in list(self.inputs):
+            port.deliver(list(data), delta)
+
+
+class LoopbackInput:
+    """Input port of a loopback device, mirroring mido's rtmidi input ports"""
+
+    def __init__(self, device, callback=None):
+        self.name = device.name
+        self.device = device
+        self.callback = callback
+        self.closed = False
+        self._rt = self  # Raw forwarding installs its callback through set_callback()
+        self._raw_callback = None
+        self._pending = queue.Queue()
+        device.inputs.append(self)
+
+    def set_callback(self, func, data=None):
+        self._raw_callback = func
+
+    def deliver(self, data, delta):
+        if self.closed:
+            return
+        if self._raw_callback is not None:
+            self._raw_callback((data, delta), None)
+            return
+        message = mido.Message.from_bytes(data)
+        if self.callback is not None:
+            self.callback(message)
+        else:
+            self._pending.put(message)
+
+    def iter_pending(self):
+        while True:
+            try:
+                message = self._pending.get_nowait()
+            except queue.Empty:
+                return
+            if message is not None:
+                yield message
+
+    def __iter__(self):
+        while not self.closed:
+            message = self._pending.get()
+            if message is None:
+                return
+            yield message
+
+    def close(self):
+        self.closed = True
+        self._pending.put(None)  # Wakes a blocked iteration
+        if self in self.device.inputs:
+            self.device.inputs.remove(self)
+
+
+class LoopbackOutput:
+    """Output port of a loopback device; sends are captured on the device"""
+
+    def __init__(self, device):
+        self.name = device.name
+        self.device = device
+        self.closed = False
+        self._rt = self  # Raw forwarding sends through send_message()
+
+    def send_message(self, data):
+        if self.closed:
+            raise IOError(f"Output '{self.name}' is closed")
+        if not self.device.plugged:
+            raise IOError(f"Device '{self.name}' is unplugged")
+        self.device.sent.append((time.perf_counter_ns(), bytes(data)))
+
+    def send(self, message):
+        self.send_message(message.bytes())
+
+    def close(self):
+        self.closed = True
+
+
+class LoopbackMidiBackend(MidiBackend):
+    """In-process fake MIDI system for running the router without hardware.
+
+    plug() and unplug() add and remove named virtual devices and notify the
+    port monitor straight away.  inject() hands bytes to whatever has a
+    device's input open, the way rtmidi does, and play() replays
+    timestamped events in real time.  Everything sent to a device's output
+    is captured in its `sent` deque with the time it was sent.
+    """
+    name = 'loopback'
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.devices = {}  # Name -> LoopbackDevice, in the order they were plugged
+        self.hotplug = HotplugBackend()
+        self.hotplug.name = 'loopback'
+        self.hotplug.settle_time = 0
+
+    def plug(self, name, has_input=True, has_output=True):
+        with self._lock:
+            device = self.devices[name] = LoopbackDevice(name, has_input, has_output)
+        self.hotplug.notify(f"loopback plug {name}")
+        return device
+
+    def unplug(self, name):
+        with self._lock:
+            device = self.devices.pop(name)
+        device.plugged = False
+        self.hotplug.notify(f"loopback unplug {name}")
+        return device
+
+    def device(self, name):
+        return self.devices[name]
+
+    def inject(self, name, data):
+        self.devices[name].inject(data)
+
+    def play(self, name, events):
+        """Replay (seconds, bytes) events into a device from a background thread.
+
+        Times are relative to the call.  Returns the thread, join it to wait
+        for the last event.
+        """
+        started = time.perf_counter()
+
+        def player():
+            for at, data in events:
+                delay = started + at - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                self.inject(name, data)
+
+        thread = threading.Thread(target=player, name=f'loopback-{name}', daemon=True)
+        thread.start()
+        return thread
+
+    def get_input_names(self):
+        with self._lock:
+            return [name for name, device in self.devices.items() if device.has_input]
+
+    def get_output_names(self):
+        with self._lock:
+            return [name for name, device in self.devices.items() if device.has_output]
+
+    def _plugged_device(self, port_name, direction):
+        device = self.devices.get(port_name)
+        if device is None or not getattr(device, f'has_{direction}'):
+            raise IOError(f"Unknown {direction} port '{port_name}'")
+        return device
+
+    def open_input(self, port_name, callback=None):
+        return LoopbackInput(self._plugged_device(port_name, 'input'), callback)
+
+    def open_output(self, port_name):
+        return LoopbackOutput(self._plugged_device(port_name, 'output'))
+
+    def create_hotplug_backend(self):
+        return self.hotplug
+
+
+def get_midi_backend():
+    global midi_backend
+    if midi_backend is None:
+        backends = {'mido': MidoBackend, 'loopback': LoopbackMidiBackend}
+        if MIDI_BACKEND not in backends:
+            raise ValueError(f"Unknown MIDI backend '{MIDI_BACKEND}'")
+        midi_backend = backends[MIDI_BACKEND]()
+    return midi_backend
+
+def take_port_snapshot():
+    """Enumerate the input and output ports once"""
+    port_enumeration_stats['total'] += 1
+    backend = get_midi_backend()
+    input_names = backend.get_input_names()
+    output_names = backend.get_output_names()
+    inputs = tuple(filter_ports(input_names))
+    outputs = tuple(filter_ports(output_names))
+    return PortSnapshot(
+        frozenset(input_names), frozenset(output_names),
+        inputs, outputs, frozenset(inputs), frozenset(outputs),
+    )
+
 def update_port_list():
-    global port_names, last_ports, manual_mode, connected_usb_devices
+    """Rescan the ports and apply any changes, returning True if something changed"""
+    enumerations_before = port_enumeration_stats['total']
     try:
-        current_inputs = filter_ports(mido.get_input_names())
-        current_outputs = filter_ports(mido.get_output_names())
-        current_ports = set(current_inputs + current_outputs)
+        snapshot = take_port_snapshot()
+        with routing_lock:
+            return apply_port_snapshot(snapshot)
+    finally:
+        enumerations = port_enumeration_stats['total'] - enumerations_before
+        port_enumeration_stats['last_tick'] = enumerations
+        if enumerations > port_enumeration_stats['max_per_tick']:
+            port_enumeration_stats['max_per_tick'] = enumerations
+        if enumerations > 1:
+            log.debug(f"Ports were enumerated {enumerations} times in one monitor tick")
+
+def apply_port_snapshot(snapshot):
+    """Apply the changes between the last scan and this snapshot"""
+    global port_names, last_ports, known_inputs, known_outputs
+    try:
+        current_inputs = list(snapshot.inputs)
+        current_outputs = list(snapshot.outputs)
+        current_ports = snapshot.input_set | snapshot.output_set
+        if current_inputs != known_inputs or current_outputs != known_outputs:
+            known_inputs = current_inputs
+            known_outputs = current_outputs
+            mark_status_changed()
         
         if current_ports != last_ports:
             port_names = list(current_ports)
             removed_ports = last_ports - current_ports
             new_ports = current_ports - last_ports
+            leave_manual_mode = False
 
             # Update the connected_usb_devices list
             # First remove any devices that are no longer connected
@@ -695,51 +1644,59 @@ def update_port_list():
                 for port in removed_ports:
                     if port in connected_usb_devices:
                         connected_usb_devices.remove(port)
-                        print(f"Removed {port} from connected devices list")
+                        log.info(f"Removed {port} from connected devices list")
                 
                 # Check if USB devices were unplugged
                 usb_removed_ports = [p for p in removed_ports if is_usb_midi_device(p)]
                 if usb_removed_ports:
-                    cleanup_auto_connections()
+                    cleanup_auto_connections(snapshot)
                     
-                    # If in manual mode and ANY USB device was unplugged, switch back to auto mode
+                    # If in manual mode and ANY USB device was unplugged, switch back
+                    # to auto mode once the new devices are known too
                     if manual_mode:
-                        print("USB device unplugged in manual mode, switching back to auto mode")
-                        switch_to_auto_mode()
+                        log.info("USB device unplugged in manual mode, switching back to auto mode")
+                        leave_manual_mode = True
                 else:
-                    print(f"Non-USB devices unplugged: {removed_ports}")
+                    log.info(f"Non-USB devices unplugged: {removed_ports}")
             
-            # Add any new USB devices to the connected_usb_devices list
+            # Add any new USB devices to the connected_usb_devices list, in the
+            # order the backend lists them when several appear in one scan
             if new_ports:
-                for port in new_ports:
-                    if is_usb_midi_device(port) and port not in connected_usb_devices:
+                for port in dict.fromkeys(snapshot.inputs + snapshot.outputs):
+                    if port in new_ports and is_usb_midi_device(port) and port not in connected_usb_devices:
                         connected_usb_devices.append(port)
-                        print(f"Added {port} to connected devices list. Current order: {connected_usb_devices}")
+                        log.info(f"Added {port} to connected devices list. Current order: {connected_usb_devices}")
                 
                 # Check if new devices were plugged in while in manual mode
-                if manual_mode:
+                if manual_mode and not leave_manual_mode:
                     usb_new_ports = [p for p in new_ports if is_usb_midi_device(p)]
                     if usb_new_ports:
-                        print(f"New USB devices detected in manual mode, NOT auto-connecting: {usb_new_ports}")
+                        log.info(f"New USB devices detected in manual mode, NOT auto-connecting: {usb_new_ports}")
                         # Do NOT perform auto connections in manual mode
 
             last_ports = current_ports
-            cleanup_invalid_connections()
+            cleanup_invalid_connections(snapshot)
 
-            # Only perform auto connections if not in manual mode
-            if not manual_mode:
-                perform_auto_connections()
+            # Only perform auto connections if not in manual mode; switching
+            # to auto mode already makes the auto route
+            if leave_manual_mode:
+                switch_to_auto_mode(snapshot)
+            elif not manual_mode:
+                perform_auto_connections(snapshot)
             else:
-                print("In manual mode - skipping auto connections")
+                log.debug("In manual mode - skipping auto connections")
+            mark_status_changed()
+            return True
 
     except Exception as e:
-        print(f"Error updating port list: {e}")
+        log.error(f"Error updating port list: {e}")
+    return False
 
-def cleanup_auto_connections():
+def cleanup_auto_connections(snapshot):
     """Disconnect all auto-connected devices"""
     try:
-        current_inputs = set(filter_ports(mido.get_input_names()))
-        current_outputs = set(filter_ports(mido.get_output_names()))
+        current_inputs = snapshot.input_set
+        current_outputs = snapshot.output_set
         to_remove = []
         for connection in auto_connections:
             from_port, to_port = connection
@@ -749,13 +1706,13 @@ def cleanup_auto_connections():
             auto_connections.discard(connection)
             connection_log.discard(connection)
             close_midi_connection(connection[0], connection[1])
-            print(f"Auto-disconnected unplugged USB device connection: {connection[0]} -> {connection[1]}")
+            log.info(f"Auto-disconnected unplugged USB device connection: {connection[0]} -> {connection[1]}")
     except Exception as e:
-        print(f"Error cleaning up auto connections: {e}")
+        log.error(f"Error cleaning up auto connections: {e}")
 
 def system_level_midi_reset():
     """Perform a system-level reset of MIDI devices"""
-    print("PERFORMING SYSTEM-LEVEL MIDI RESET")
+    log.info("PERFORMING SYSTEM-LEVEL MIDI RESET")
     
     # First close all our tracked connections
     close_all_midi_connections()
@@ -765,11 +1722,13 @@ def system_level_midi_reset():
     midi_threads.clear()
     
     try:
-        # Reload the mido module to reset its internal state
-        importlib.reload(mido)
-        
+        backend = get_midi_backend()
+        backend.reset()
+
+        if not backend.system_devices:
+            log.info(f"The '{backend.name}' MIDI backend has no system service to restart")
         # On Linux, we can use ALSA commands to reset MIDI
-        if platform.system() == "Linux":
+        elif platform.system() == "Linux":
             try:
                 # Stop ALSA sequencer
                 subprocess.run(["sudo", "service", "alsa-utils", "stop"], check=False)
@@ -778,7 +1737,7 @@ def system_level_midi_reset():
                 subprocess.run(["sudo", "service", "alsa-utils", "start"], check=False)
                 time.sleep(0.5)
             except Exception as e:
-                print(f"Error resetting ALSA: {e}")
+                log.error(f"Error resetting ALSA: {e}")
         
         # On macOS, we can use system_profiler to list MIDI devices
         elif platform.system() == "Darwin":
@@ -786,7 +1745,7 @@ def system_level_midi_reset():
                 subprocess.run(["killall", "CoreMIDI"], check=False)
                 time.sleep(0.5)
             except Exception as e:
-                print(f"Error resetting CoreMIDI: {e}")
+                log.error(f"Error resetting CoreMIDI: {e}")
         
         # On Windows, we can restart the MIDI service
         elif platform.system() == "Windows":
@@ -796,15 +1755,15 @@ def system_level_midi_reset():
                 subprocess.run(["net", "start", "AudioSrv"], check=False)
                 time.sleep(0.5)
             except Exception as e:
-                print(f"Error resetting Windows Audio service: {e}")
+                log.error(f"Error resetting Windows Audio service: {e}")
         
-        print("System-level MIDI reset completed")
+        log.info("System-level MIDI reset completed")
     except Exception as e:
-        print(f"Error during system-level MIDI reset: {e}")
+        log.error(f"Error during system-level MIDI reset: {e}")
 
-def cleanup_invalid_connections():
-    input_ports = set(filter_ports(mido.get_input_names()))
-    output_ports = set(filter_ports(mido.get_output_names()))
+def cleanup_invalid_connections(snapshot):
+    input_ports = snapshot.input_set
+    output_ports = snapshot.output_set
     to_remove = []
     for from_port, to_port in list(connection_log):
         if from_port not in input_ports or to_port not in output_ports:
@@ -814,135 +1773,1093 @@ def cleanup_invalid_connections():
         manual_connection_log.discard(connection)
         auto_connections.discard(connection)
         close_midi_connection(connection[0], connection[1])
-        print(f"Removed invalid connection: {connection[0]} -> {connection[1]}")
+        log.info(f"Removed invalid connection: {connection[0]} -> {connection[1]}")
+    # Inputs stay open between routes, so close the ones that disappeared
+    for port_name in list(input_hubs):
+        if port_name not in input_ports:
+            close_input_hub(port_name)
+
+def midi_channel(value):
+    """Convert a 1-16 channel number to the zero-based channel used on the wire"""
+    channel = int(value)
+    if not 1 <= channel <= 16:
+        raise ValueError(f"MIDI channel {channel} is out of range 1-16")
+    return channel - 1
 
-def create_midi_connection(from_port_name, to_port_name):
+def parse_transform(value):
+    """Validate a transform given as a preset name, a dict or JSON text.
+
+    Returns the preset name if the transform matches a preset and a
+    normalized dict otherwise, so equal transforms compare equal.  Raises
+    ValueError for anything invalid.
+    """
+    if isinstance(value, str):
+        if value in TRANSFORM_PRESETS:
+            return value
+        try:
+            value = json.loads(value)
+        except ValueError:
+            raise ValueError(f"Unknown transform '{value}'")
+    if not isinstance(value, dict):
+        raise ValueError("A transform must be a preset name or an object")
+    unknown = sorted(set(value) - set(TRANSFORM_FIELDS))
+    if unknown:
+        raise ValueError(f"Unknown transform field(s): {', '.join(unknown)}")
+    spec = {}
     try:
-        input_ports = mido.get_input_names()
-        output_ports = mido.get_output_names()
-        if from_port_name not in input_ports:
-            print(f"Input port '{from_port_name}' not found")
-            return False
-        if to_port_name not in output_ports:
-            print(f"Output port '{to_port_name}' not found")
-            return False
-        connection_key = (from_port_name, to_port_name)
-        
-        # If connection already exists, close it first to ensure clean state
-        if connection_key in active_midi_connections:
-            close_midi_connection(from_port_name, to_port_name)
-            print(f"Closed existing connection before recreating: {from_port_name} -> {to_port_name}")
-        
-        input_port = mido.open_input(from_port_name)
-        output_port = mido.open_output(to_port_name)
+        channel_map = value.get('channel_map')
+        if isinstance(channel_map, dict):
+            mapping = {}
+            for source, target in channel_map.items():
+                if midi_channel(source) != midi_channel(target):
+                    mapping[int(source)] = int(target)
+            if mapping:
+                # JSON object keys are strings, keep them that way so a
+                # normalized transform survives a round trip
+                spec['channel_map'] = {str(source): mapping[source] for source in sorted(mapping)}
+        elif channel_map is not None:
+            spec['channel_map'] = midi_channel(channel_map) + 1
+        transpose = int(value.get('transpose') or 0)
+        if not -127 <= transpose <= 127:
+            raise ValueError(f"Transpose {transpose} is out of range -127-127")
+        if transpose:
+            spec['transpose'] = transpose
+        split = value.get('split')
+        if split is not None:
+            if not isinstance(split, (list, tuple)) or len(split) != 2:
+                raise ValueError("A split must be [lowest, highest]")
+            low, high = (int(note) for note in split)
+            if not 0 <= low <= high <= 127:
+                raise ValueError(f"Split {low}-{high} is not a note range within 0-127")
+            if (low, high) != (0, 127):
+                spec['split'] = [low, high]
+        curve = value.get('velocity_curve')
+        if curve is not None:
+            if curve not in VELOCITY_CURVES:
+                curve = float(curve)
+                if not 0 < curve <= 10:
+                    raise ValueError(f"Velocity curve exponent {curve} is out of range 0-10")
+            if VELOCITY_CURVES.get(curve, curve) != 1.0:
+                spec['velocity_curve'] = curve
+    except TypeError as e:
+        raise ValueError(f"Invalid transform: {e}")
+    for name, preset in TRANSFORM_PRESETS.items():
+        if spec == preset:
+            return name
+    return spec
 
-        # Send program change on channel 10 (zero-based channel 9)
-        program_change_msg = mido.Message('program_change', program=0, channel=9)
-        output_port.send(program_change_msg)
+def compile_transform(transform):
+    """Return the RouteTransform for a parsed transform, or None if it changes nothing.
 
-        active_midi_connections[connection_key] = {'input': input_port, 'output': output_port}
-        thread = threading.Thread(target=midi_forwarder, args=(input_port, output_port, connection_key), daemon=True)
-        thread.start()
-        midi_threads[connection_key] = thread
-        print(f"MIDI connection created: {from_port_name} -> {to_port_name}")
-        return True
-    except Exception as e:
-        print(f"Error creating MIDI connection: {e}")
-        return False
+    Compiled transforms are cached, so routes with equal transforms share one
+    object and the input hub only applies it once per message.
+    """
+    spec = TRANSFORM_PRESETS[transform] if isinstance(transform, str) else transform
+    return compile_transform_spec(json.dumps(spec, sort_keys=True))
 
-def midi_forwarder(input_port, output_port, connection_key):
-    try:
-        print(f"Starting MIDI forwarding for {connection_key}")
-        for message in input_port:
-            if connection_key not in active_midi_connections:
-                break
-            if hasattr(message, 'channel'):
-                # Forward all messages forcing channel to 10 (zero-based 9)
-                new_msg = message.copy(channel=9)
-                output_port.send(new_msg)
-                if new_msg.type in ['note_on', 'note_off']:
-                    print(f"MIDI: Forwarded {new_msg.type} on channel 10 from {connection_key[0]} to {connection_key[1]}")
-            else:
-                output_port.send(message)
-    except Exception as e:
-        print(f"Error in MIDI forwarding for {connection_key}: {e}")
-    finally:
-        print(f"MIDI forwarding stopped for {connection_key}")
+@functools.lru_cache(maxsize=256)
+def compile_transform_spec(spec_json):
+    spec = json.loads(spec_json)
+    if not spec:
+        return None
+    return RouteTransform(spec)
 
-def close_midi_connection(from_port_name, to_port_name):
+class RouteTransform:
+    """A route transform compiled into lookup tables.
+
+    `channels` maps each of the 16 channels to its new channel, `notes` maps
+    each of the 128 note numbers to its new number (None drops the note) and
+    `velocities` maps note-on velocities.  A stage that changes nothing has
+    no table and is skipped, so applying a transform costs a few list
+    indexes per message.
+    """
+    __slots__ = ('spec', 'channels', 'notes', 'velocities', 'forced_channel')
+
+    def __init__(self, spec):
+        self.spec = spec
+        self.channels = None
+        self.notes = None
+        self.velocities = None
+        self.forced_channel = None  # Set when every channel maps to the same one
+        channel_map = spec.get('channel_map')
+        if isinstance(channel_map, dict):
+            self.channels = list(range(16))
+            for source, target in channel_map.items():
+                self.channels[midi_channel(source)] = midi_channel(target)
+        elif channel_map is not None:
+            self.forced_channel = midi_channel(channel_map)
+            self.channels = [self.forced_channel] * 16
+        transpose = spec.get('transpose', 0)
+        low, high = spec.get('split', (0, 127))
+        if transpose or (low, high) != (0, 127):
+            self.notes = [
+                note + transpose if low <= note <= high and 0 <= note + transpose <= 127 else None
+                for note in range(128)
+            ]
+        curve = spec.get('velocity_curve')
+        if curve is not None:
+            exponent = VELOCITY_CURVES.get(curve, curve)
+            # Velocity 0 stays 0 so a note-on used as note-off keeps working
+            self.velocities = [0] + [max(1, round(127 * (velocity / 127) ** exponent)) for velocity in range(1, 128)]
+
+    def apply_bytes(self, data):
+        """Return a transformed copy of a raw MIDI message, or None to drop it"""
+        status = data[0]
+        if status >= 0xF0:
+            return data
+        data = data.copy()
+        kind = status & 0xF0
+        if self.channels is not None:
+            data[0] = kind | self.channels[status & 0x0F]
+        if kind <= 0xA0:
+            # Note off, note on and polyphonic aftertouch carry a note number
+            if self.notes is not None:
+                note = self.notes[data[1]]
+                if note is None:
+                    return None
+                data[1] = note
+            if kind == 0x90 and self.velocities is not None:
+                data[2] = self.velocities[data[2]]
+        return data
+
+    def apply_message(self, message):
+        """Return the transformed mido Message, or None to drop it"""
+        channel = getattr(message, 'channel', None)
+        if channel is None:
+            return message
+        changes = {}
+        if self.channels is not None:
+            changes['channel'] = self.channels[channel]
+        if message.type in ('note_on', 'note_off', 'polytouch'):
+            if self.notes is not None:
+                note = self.notes[message.note]
+                if note is None:
+                    return None
+                changes['note'] = note
+            if message.type == 'note_on' and self.velocities is not None:
+                changes['velocity'] = self.velocities[message.velocity]
+        return message.copy(**changes)
+
+DEFAULT_TRANSFORM = parse_transform(DEFAULT_TRANSFORM)
+
+
+class InputHub:
+    """Owns one open input port and fans its messages out to every route.
+
+    The port is opened once no matter how many routes use it, and each
+    message is decoded once.  Routes live in a tuple that is replaced rather
+    than mutated, so dispatch() can read it without locking, a removed route
+    stops receiving immediately and adding or removing a route never touches
+    the port itself.
+    """
+
+    def __init__(self, port_name, port=None):
+        self.port_name = port_name
+        self.routes = ()  # (connection_key, output_port, transform, metrics) tuples
+        self._lock = threading.Lock()
+        self.thread = None
+        self.raw = False
+        self.tuned = False  # Callback threads are tuned on their first message
+        backend = get_midi_backend()
+        if port is not None:
+            # An already open port whose owner calls dispatch itself
+            self.port = port
+        elif FORWARDING_ENGINE == 'callback':
+            self.port = backend.open_input(port_name, callback=self.dispatch)
+            rt = getattr(self.port, '_rt', None)
+            if FORWARD_MODE == 'raw' and rt is not None:
+                # Take the bytes straight from rtmidi instead of parsed Messages
+                rt.set_callback(self.dispatch_bytes)
+                self.raw = True
+        elif FORWARDING_ENGINE == 'poll':
+            self.port = backend.open_input(port_name)
+            start_poll_dispatcher()
+        else:
+            self.port = backend.open_input(port_name)
+            self.thread = threading.Thread(target=midi_forwarder, args=(self,), daemon=True)
+            self.thread.start()
+
+    def dispatch(self, message):
+        started = time.perf_counter_ns()
+        if not self.tuned:
+            self.tuned = True
+            tune_current_thread('forwarding')
+        routes = self.routes
+        if routes and REALTIME_FAST_LANE and message.type in REALTIME_TYPES:
+            for connection_key, output_port, transform, metrics in routes:
+                output_port.send_now(message, started, metrics)
+        elif routes:
+            applied_by = applied = None
+            log_note = message.type in ['note_on', 'note_off']
+            for connection_key, output_port, transform, metrics in routes:
+                if transform is None:
+                    forwarded = message
+                else:
+                    # Routes with the same transform are adjacent, so each
+                    # transform runs once per message
+                    if transform is not applied_by:
+                        applied = transform.apply_message(message)
+                        applied_by = transform
+                    forwarded = applied
+                    if forwarded is None:
+                        continue
+                output_port.send(forwarded, started, metrics)
+                if log_note and LOG_MIDI_EVENTS and midi_event_limiter.allow():
+                    log.debug("MIDI: Forwarded %s from %s to %s", message.type, connection_key[0], connection_key[1])
+        elapsed = time.perf_counter_ns() - started
+        engine_stats['messages'] += 1
+        engine_stats['dispatch_ns'] += elapsed
+        if elapsed > engine_stats['max_dispatch_ns']:
+            engine_stats['max_dispatch_ns'] = elapsed
+
+    def dispatch_bytes(self, event, data=None):
+        """rtmidi callback for raw forwarding, event is (message bytes, delta time)"""
+        started = time.perf_counter_ns()
+        if not self.tuned:
+            self.tuned = True
+            tune_current_thread('forwarding')
+        routes = self.routes
+        message_data = event[0]
+        status = message_data[0]
+        if status == 0xF0 and len(message_data) > SYSEX_COMPACT_SIZE:
+            message_data = bytes(message_data)  # One compact copy for every route
+        if routes and REALTIME_FAST_LANE and status >= 0xF8:
+            for connection_key, output_port, transform, metrics in routes:
+                output_port.send_now(message_data, started, metrics)
+        elif routes:
+            applied_by = applied = None
+            for connection_key, output_port, transform, metrics in routes:
+                if transform is None:
+                    forwarded = message_data
+                else:
+                    if transform is not applied_by:
+                        applied = transform.apply_bytes(message_data)
+                        applied_by = transform
+                    forwarded = applied
+                    if forwarded is None:
+                        continue
+                output_port.send_bytes(forwarded, started, metrics)
+                if status & 0xE0 == 0x80 and LOG_MIDI_EVENTS and midi_event_limiter.allow():
+                    log.debug("MIDI: Forwarded %s from %s to %s", message_data, connection_key[0], connection_key[1])
+        elapsed = time.perf_counter_ns() - started
+        engine_stats['messages'] += 1
+        engine_stats['dispatch_ns'] += elapsed
+        if elapsed > engine_stats['max_dispatch_ns']:
+            engine_stats['max_dispatch_ns'] = elapsed
+
+    def add_route(self, connection_key, output_port, transform=None, metrics=None):
+        """Add a route, or replace the route with the same key in place.
+
+        `transform` is a RouteTransform, or None to forward unchanged.
+        """
+        with self._lock:
+            routes = [route for route in self.routes if route[0] != connection_key]
+            position = len(routes)
+            for index, route in enumerate(routes):
+                if route[2] is transform:
+                    position = index + 1
+            routes.insert(position, (connection_key, output_port, transform, metrics))
+            self.routes = tuple(routes)
+
+    def remove_route(self, connection_key):
+        with self._lock:
+            self.routes = tuple(route for route in self.routes if route[0] != connection_key)
+
+    def close(self):
+        self.routes = ()
+        self.port.close()
+
+
+def get_input_hub(port_name):
+    """Return the hub for an input port, opening the port on first use"""
+    with input_hubs_lock:
+        hub = input_hubs.get(port_name)
+        if hub is None:
+            hub = InputHub(port_name)
+            input_hubs[port_name] = hub
+            if hub.thread is not None:
+                midi_threads[port_name] = hub.thread
+            log.info(f"Opened input port: {port_name}")
+        return hub
+
+def close_input_hub(port_name):
+    with input_hubs_lock:
+        hub = input_hubs.pop(port_name, None)
+        midi_threads.pop(port_name, None)
+    if hub is None:
+        return
+    try:
+        hub.close()
+        log.info(f"Closed input port: {port_name}")
+    except Exception as e:
+        log.error(f"Error closing input port: {e}")
+
+class PooledOutput:
+    """One open output port shared by every route that sends to it.
+
+    Messages wait in a bounded queue per priority class and are sent by a
+    single writer thread, so streams merged from several inputs stay in
+    order within a class and a stalled device never blocks the input that
+    feeds it.  The writer paces sends to the output's wire speed, counting
+    running status.  While messages are waiting, a newer value for the same
+    controller or pitch bend replaces the one still queued; notes, SysEx and
+    everything else are always sent unless the overflow policy drops them.
+    The pool counts users and closes the port when the last one leaves.
+    """
+
+    def __init__(self, port_name, port=None, bytes_per_second=None,
+                 max_queue=OUTPUT_QUEUE_SIZE, overflow=OUTPUT_OVERFLOW_POLICY, sysex_buffer=OUTPUT_SYSEX_BUFFER):
+        if overflow not in OUTPUT_OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown output overflow policy '{overflow}'")
+        if max_queue < 1:
+            raise ValueError(f"An output queue must hold at least one message, not {max_queue}")
+        self.port_name = port_name
+        self.port = port if port is not None else get_midi_backend().open_output(port_name)
+        rt = getattr(self.port, '_rt', None)
+        self._send_bytes = rt.send_message if rt is not None else self._send_bytes_as_message
+        self.users = 0
+        if bytes_per_second is None:
+            bytes_per_second = output_rate(port_name)
+        self.bytes_per_second = bytes_per_second
+        self.byte_ns = 1e9 / bytes_per_second if bytes_per_second > 0 else 0
+        self.burst_ns = OUTPUT_BURST_BYTES * self.byte_ns
+        self.coalesce = True
+        self.max_queue = max_queue
+        self.overflow = overflow
+        self.block_timeout = OUTPUT_BLOCK_TIMEOUT
+        self.sysex_buffer = sysex_buffer
+        self.sysex_bytes = 0  # SysEx bytes waiting to be sent
+        self.sysex_waits = 0  # Times a sender waited for SysEx to drain
+        self.sysex_stalled = False  # A SysEx wait timed out and the writer has not sent SysEx since
+        self.realtime_queued = 0  # Fast lane messages queued behind a send or an earlier realtime message
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._not_full = threading.Condition(self._lock)
+        # [data, message, received, metrics, coalesce key, sequence] entries
+        # per priority class; data is None once an entry is merged or dropped
+        self._classes = [collections.deque() for _ in PRIORITY_CLASSES]
+        self._latest = {}  # Coalesce key -> its waiting entry
+        self._sequence = 0
+        self._dead = 0  # Merged or dropped entries still sitting in the deques
+        self._closing = False
+        self._send_lock = threading.Lock()  # The writer and the realtime fast lane share the port
+        self.wire_free = 0  # perf_counter_ns() when the wire finishes the bytes already sent
+        self.depth = 0  # Messages waiting to be sent
+        self.max_depth = 0
+        self.coalesced = 0
+        self.dropped = [0] * len(PRIORITY_CLASSES)
+        self.wire_bytes = 0  # Bytes on the wire after running status
+        self.thread = threading.Thread(target=self._writer, daemon=True)
+        self.thread.start()
+
+    def send(self, message, received=None, metrics=None):
+        self._put(message.bytes(), message, received, metrics)
+
+    def send_bytes(self, data, received=None, metrics=None):
+        """Queue a complete MIDI message given as a list of bytes (or bytes for SysEx).
+
+        `received` is the perf_counter_ns() timestamp of the incoming event and
+        `metrics` the RouteMetrics to record the send against.
+        """
+        self._put(data, data, received, metrics)
+
+    def queue_depth(self):
+        return self.depth
+
+    def send_now(self, message, received=None, metrics=None):
+        """Send a system realtime message right away from the calling thread.
+
+        Clock and transport messages skip the queue and pacing so they are
+        never held behind other traffic, but still count against the wire.
+        If the writer is in the middle of a send the input thread does not
+        wait for it: the message goes into the realtime class, which the
+        writer sends first and without pacing, or is dropped if the queue is
+        full.  Later realtime messages queue behind it until it has been
+        sent, so a clock never overtakes an earlier Start or Stop.
+        """
+        if self._closing:
+            return
+        data = message if type(message) is list else message.bytes()
+        if not self._send_lock.acquire(blocking=False):
+            self._queue_realtime(data, message, received, metrics)
+            return
+        # The writer takes and sends entries under the send lock, so anything
+        # still in the realtime class has not been sent yet
+        if self._classes[0]:
+            self._send_lock.release()
+            self._queue_realtime(data, message, received, metrics)
+            return
+        try:
+            if type(message) is list:
+                self._send_bytes(message)
+            else:
+                self.port.send(message)
+        except Exception as e:
+            if metrics is not None:
+                with self._lock:
+                    metrics.errors += 1
+            log.error(f"Error sending to {self.port_name}: {e}")
+            return
+        finally:
+            self._send_lock.release()
+        now = time.perf_counter_ns()
+        with self._lock:
+            self.wire_free = max(now, self.wire_free) + len(data) * self.byte_ns
+            self.wire_bytes += len(data)
+            if metrics is not None:
+                metrics.observe_realtime(len(data), received, now, data[0] == 0xF8)
+
+    def _queue_realtime(self, data, message, received, metrics):
+        """Queue a fast lane message that cannot be sent from the input thread"""
+        self.realtime_queued += 1
+        self._put(data, message, received, metrics, wait=False)
+
+    def _send_bytes_as_message(self, data):
+        self.port.send(mido.Message.from_bytes(data))
+
+    def _put(self, data, message, received, metrics, wait=True):
+        status = data[0]
+        kind = status & 0xF0
+        if kind == 0xE0 or (kind == 0xB0 and data[1] in COALESCE_CONTROLLERS):
+            key = (status, data[1]) if kind == 0xB0 else status
+        else:
+            key = None
+        priority = STATUS_PRIORITY[status]
+        if status == 0xF0 and type(data) is list and len(data) > SYSEX_COMPACT_SIZE:
+            data = bytes(data)
+            if type(message) is list:
+                message = data
+        with self._lock:
+            if (status == 0xF0 and self.sysex_buffer and self.sysex_bytes + len(data) > self.sysex_buffer
+                    and not self._wait_for_sysex_room(len(data))):
+                self.dropped[priority] += 1
+                if metrics is not None:
+                    metrics.dropped += 1
+                return
+            previous = self._latest.get(key) if key is not None and self.coalesce else None
+            if previous is not None:
+                # The waiting value is superseded before it was sent; the new
+                # one goes to the back so it stays behind everything before it
+                self._discard(previous)
+                self.coalesced += 1
+            elif self.depth >= self.max_queue and not self._make_room(priority, wait):
+                self.dropped[priority] += 1
+                if metrics is not None:
+                    metrics.dropped += 1
+                return
+            self._sequence += 1
+            entry = [data, message, received, metrics, key, self._sequence]
+            if key is not None:
+                self._latest[key] = entry
+            self._classes[priority].append(entry)
+            if status == 0xF0:
+                self.sysex_bytes += len(data)
+            self.depth += 1
+            if self.depth > self.max_depth:
+                self.max_depth = self.depth
+            self._not_empty.notify()
+
+    def _wait_for_sysex_room(self, size):
+        """Hold the sender until the SysEx already waiting leaves room for `size` more bytes.
+
+        Returns False if the SysEx should be dropped: the output is stalled,
+        or it did not catch up within OUTPUT_SYSEX_TIMEOUT and is now marked
+        stalled, so a whole dump costs the sender at most one timeout.
+        """
+        if self.sysex_stalled:
+            return False
+        self.sysex_waits += 1
+        deadline = time.monotonic() + OUTPUT_SYSEX_TIMEOUT
+        while self.sysex_bytes and self.sysex_bytes + size > self.sysex_buffer and not self._closing:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self.sysex_stalled = True
+                log.warning(f"SysEx to {self.port_name} is not draining, dropping SysEx until it sends again")
+                return False
+            self._not_full.wait(remaining)
+        return True
+
+    def _make_room(self, priority, wait=True):
+        """Apply the overflow policy for a full queue; False drops the new message"""
+        if self.overflow == 'block':
+            if not wait:
+                return False
+            deadline = time.monotonic() + self.block_timeout
+            while self.depth >= self.max_queue and not self._closing:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._not_full.wait(remaining)
+            return not self._closing
+        heads = [(priority_class, self._head(priority_class)) for priority_class in range(len(PRIORITY_CLASSES))]
+        heads = [(priority_class, head) for priority_class, head in heads if head is not None]
+        if self.overflow == 'drop-oldest':
+            victim_class, victim = min(heads, key=lambda item: item[1][5])
+        else:
+            victim_class, victim = heads[-1]
+            if victim_class < priority:
+                return False
+        self._classes[victim_class].popleft()
+        self._discard(victim, removed=True)
+        self.dropped[victim_class] += 1
+        if victim[3] is not None:
+            victim[3].dropped += 1
+        return True
+
+    def _head(self, priority_class):
+        """Return the oldest waiting entry of a class, clearing dead ones off the front"""
+        entries = self._classes[priority_class]
+        while entries and entries[0][0] is None:
+            entries.popleft()
+            self._dead -= 1
+        return entries[0] if entries else None
+
+    def _discard(self, entry, removed=False):
+        """Forget a waiting entry; `removed` says it was already taken off its deque"""
+        if entry[0][0] == 0xF0:
+            self.sysex_bytes -= len(entry[0])
+        entry[0] = None
+        if entry[4] is not None and self._latest.get(entry[4]) is entry:
+            del self._latest[entry[4]]
+        self.depth -= 1
+        self._not_full.notify_all()
+        if removed:
+            return
+        self._dead += 1
+        if self._dead > self.max_queue:
+            # Compact so merged entries cannot pile up behind a stalled writer
+            for priority_class, entries in enumerate(self._classes):
+                self._classes[priority_class] = collections.deque(entry for entry in entries if entry[0] is not None)
+            self._dead = 0
+
+    def _take(self):
+        """Remove and return the highest priority waiting entry"""
+        for priority_class in range(len(PRIORITY_CLASSES)):
+            entry = self._head(priority_class)
+            if entry is not None:
+                self._classes[priority_class].popleft()
+                if entry[4] is not None and self._latest.get(entry[4]) is entry:
+                    del self._latest[entry[4]]
+                if entry[0][0] == 0xF0:
+                    self.sysex_bytes -= len(entry[0])
+                    if self.sysex_stalled:
+                        self.sysex_stalled = False
+                        log.info(f"SysEx to {self.port_name} is draining again")
+                self.depth -= 1
+                self._not_full.notify_all()
+                return entry
+        return None
+
+    def _writer(self):
+        tune_current_thread('forwarding')
+        self._send_queued()
+        # Only the writer closes the port, so it never closes under a send
+        try:
+            self.port.close()
+        except Exception as e:
+            log.error(f"Error closing output port {self.port_name}: {e}")
+
+    def _send_queued(self):
+        """Send waiting messages until the output is closed and nothing is left"""
+        running_status = None
+        while True:
+            with self._lock:
+                while True:
+                    if self.depth:
+                        wait = self.wire_free - self.burst_ns - time.perf_counter_ns()
+                        # Realtime messages are never held back for pacing
+                        if wait <= 0 or self._classes[0]:
+                            break
+                        self._not_empty.wait(wait / 1e9)
+                    elif self._closing:
+                        return
+                    else:
+                        self._not_empty.wait()
+            # Taking and sending under the send lock lets the fast lane see
+            # from the realtime class whether it would overtake a message
+            with self._send_lock:
+                with self._lock:
+                    entry = self._take()
+                if entry is None:
+                    continue  # Dropped by close() in the meantime
+                data, message, received, metrics, key, sequence = entry
+                status = data[0]
+                cost = len(data)
+                if status < 0xF0:
+                    if status == running_status:
+                        cost -= 1
+                    running_status = status
+                elif status < 0xF8:
+                    running_status = None  # System common and SysEx cancel running status
+                try:
+                    if type(message) is list or type(message) is bytes:
+                        self._send_bytes(message)
+                    else:
+                        self.port.send(message)
+                except Exception as e:
+                    if metrics is not None:
+                        with self._lock:
+                            metrics.errors += 1
+                    log.error(f"Error sending to {self.port_name}: {e}")
+                    continue
+            now = time.perf_counter_ns()
+            with self._lock:
+                self.wire_free = max(now, self.wire_free) + cost * self.byte_ns
+                self.wire_bytes += cost
+                if metrics is not None and status >= 0xF8:
+                    # A fast lane message the writer sent for a busy input thread
+                    metrics.observe_realtime(len(data), received, now, status == 0xF8)
+            if metrics is not None and status < 0xF8:
+                metrics.observe(len(data), now - received)
+                if first_route_pending:
+                    record_first_routed_message()
+
+    def _drop_queued(self):
+        """Forget every waiting message and return how many there were"""
+        dropped = self.depth
+        for entries in self._classes:
+            entries.clear()
+        self._latest.clear()
+        self.depth = self.sysex_bytes = self._dead = 0
+        self._not_full.notify_all()
+        return dropped
+
+    def close(self, timeout=OUTPUT_CLOSE_TIMEOUT):
+        """Send what is queued for up to `timeout` seconds, then drop the rest.
+
+        The writer closes the port once it has finished; if it is stuck in a
+        send to a hung device, the port is closed when that send returns.
+        """
+        with self._lock:
+            self._closing = True
+            self._not_empty.notify()
+            self._not_full.notify_all()  # Release senders waiting for room
+        self.thread.join(timeout)
+        if not self.thread.is_alive():
+            return
+        with self._lock:
+            dropped = self._drop_queued()
+            self._not_empty.notify()
+        if dropped:
+            log.warning(f"Dropped {dropped} messages still queued for {self.port_name} when closing it")
+        self.thread.join(timeout)
+        if self.thread.is_alive():
+            log.warning(f"Output {self.port_name} is stuck sending, it will close when the send returns")
+
+
+class RouteMetrics:
+    """Message/byte/error/drop counters and a fixed-bucket latency histogram.
+
+    Only the output writer thread updates a route's send counters.  Errors,
+    drops and realtime messages can also be recorded by the input thread, so
+    they are counted under the output's queue lock.  Plain attribute
+    increments are therefore safe and cost a few hundred nanoseconds.
+    """
+    __slots__ = ('messages', 'bytes', 'errors', 'dropped', 'latency_sum_ns', 'buckets', 'realtime')
+
+    def __init__(self):
+        self.messages = 0
+        self.bytes = 0
+        self.errors = 0
+        self.dropped = 0
+        self.latency_sum_ns = 0
+        self.buckets = [0] * (len(LATENCY_BUCKETS_NS) + 1)  # Last one is +Inf
+        self.realtime = None  # ClockStats, once the route has carried a realtime message
+
+    def observe(self, size, latency_ns):
+        self.messages += 1
+        self.bytes += size
+        self.latency_sum_ns += latency_ns
+        self.buckets[bisect.bisect_left(LATENCY_BUCKETS_NS, latency_ns)] += 1
+
+    def observe_realtime(self, size, received, sent, clock):
+        if self.realtime is None:
+            self.realtime = ClockStats()
+        self.realtime.observe(size, received, sent, clock)
+
+
+class ClockStats:
+    """Realtime message counters and MIDI clock timing for one route.
+
+    Jitter is how much the interval between two sent clocks differs from
+    the interval between the same two clocks when they were received, so it
+    is exactly what the router added.  Tempo is estimated on both sides so
+    drift would show up as a difference between them.
+    """
+    __slots__ = ('messages', 'bytes', 'clocks', 'latency_sum_ns', 'last_received', 'last_sent',
+                 'jitter_ns', 'received_intervals', 'sent_intervals')
+
+    def __init__(self):
+        self.messages = 0
+        self.bytes = 0
+        self.clocks = 0
+        self.latency_sum_ns = 0
+        self.last_received = None
+        self.last_sent = None
+        self.jitter_ns = collections.deque(maxlen=CLOCK_JITTER_WINDOW)
+        self.received_intervals = collections.deque(maxlen=CLOCK_TEMPO_WINDOW)
+        self.sent_intervals = collections.deque(maxlen=CLOCK_TEMPO_WINDOW)
+
+    def observe(self, size, received, sent, clock):
+        self.messages += 1
+        self.bytes += size
+        if not clock:
+            return
+        self.clocks += 1
+        self.latency_sum_ns += sent - received
+        if self.last_received is not None and received - self.last_received < CLOCK_GAP_NS:
+            received_interval = received - self.last_received
+            sent_interval = sent - self.last_sent
+            self.received_intervals.append(received_interval)
+            self.sent_intervals.append(sent_interval)
+            self.jitter_ns.append(abs(sent_interval - received_interval))
+        self.last_received = received
+        self.last_sent = sent
+
+    @staticmethod
+    def tempo(intervals):
+        """Beats per minute for a list of clock intervals, at 24 clocks per beat"""
+        intervals = list(intervals)
+        if not intervals:
+            return None
+        return 60e9 / (24 * sum(intervals) / len(intervals))
+
+    def summary(self):
+        jitter = list(self.jitter_ns)
+        return {
+            'clocks': self.clocks,
+            'input_bpm': self.tempo(self.received_intervals),
+            'output_bpm': self.tempo(self.sent_intervals),
+            'jitter_p50_ns': percentile(jitter, 50),
+            'jitter_p99_ns': percentile(jitter, 99),
+            'jitter_max_ns': max(jitter) if jitter else None,
+            'mean_latency_ns': self.latency_sum_ns / self.clocks if self.clocks else None,
+        }
+
+
+def parse_output_rates(text):
+    """Parse an OUTPUT_RATES JSON object into [(pattern, bytes per second)], longest pattern first"""
+    rates = []
+    for pattern, rate in json.loads(text).items():
+        rate = DIN_BYTES_PER_SECOND if rate == 'din' else float(rate)
+        if rate < 0:
+            raise ValueError(f"Rate for '{pattern}' must not be negative")
+        rates.append((pattern.lower(), rate))
+    return sorted(rates, key=lambda item: len(item[0]), reverse=True)
+
+def output_rate(port_name):
+    """Bytes per second an output is paced to, 0 for unpaced"""
+    global output_rates
+    if output_rates is None:
+        try:
+            output_rates = parse_output_rates(OUTPUT_RATES)
+        except (ValueError, TypeError, AttributeError) as e:
+            log.error(f"Error in MIDI_ROUTER_OUTPUT_RATES, outputs are not paced: {e}")
+            output_rates = []
+    port_lower = port_name.lower()
+    for pattern, rate in output_rates:
+        if pattern in port_lower:
+            return rate
+    return OUTPUT_BYTES_PER_SECOND
+
+def acquire_output(port_name):
+    """Return the pooled output for a port, opening it for the first user"""
+    with output_pool_lock:
+        output = output_pool.get(port_name)
+        if output is None:
+            output = PooledOutput(port_name)
+            output_pool[port_name] = output
+            if output.bytes_per_second:
+                log.info(f"Opened output port: {port_name} (paced to {output.bytes_per_second:g} bytes/s)")
+            else:
+                log.info(f"Opened output port: {port_name}")
+        output.users += 1
+        return output
+
+def release_output(port_name):
+    """Drop one user of a pooled output, closing the port after the last one"""
+    with output_pool_lock:
+        output = output_pool.get(port_name)
+        if output is None:
+            return
+        output.users -= 1
+        if output.users > 0:
+            return
+        del output_pool[port_name]
+    try:
+        output.close()
+        log.info(f"Closed output port: {port_name}")
+    except Exception as e:
+        log.error(f"Error closing output port: {e}")
+
+def alsa_address(port_name):
+    """Return the (client, port) ALSA address at the end of an rtmidi port name"""
+    match = re.search(r'(\d+):(\d+)$', port_name)
+    if match is None:
+        return None
+    return int(match.group(1)), int(match.group(2))
+
+def kernel_subscribe(from_port_name, to_port_name, connect=True):
+    """Create (or remove) an ALSA sequencer subscription between two ports.
+
+    Uses alsa-midi when it is installed and falls back to the aconnect tool.
+    Returns False if the route cannot be handled by the kernel.
+
+    Subscriptions belong to the kernel and outlive the process, so one left
+    behind by a previous run counts as created here and a missing one as
+    removed; failing would send the route through userspace as well and
+    deliver every event twice.
+    """
+    global alsa_seq_client
+    sender = alsa_address(from_port_name)
+    dest = alsa_address(to_port_name)
+    if sender is None or dest is None:
+        return False
+    try:
+        try:
+            from alsa_midi import SequencerClient, ALSAError
+        except ImportError:
+            args = ['aconnect', f'{sender[0]}:{sender[1]}', f'{dest[0]}:{dest[1]}']
+            if not connect:
+                args.insert(1, '-d')
+            result = subprocess.run(args, capture_output=True, text=True, timeout=5)
+            if result.returncode != 0:
+                error = result.stderr.strip()
+                if ('already subscribed' if connect else 'no subscription') in error.lower():
+                    log.debug(f"ALSA subscription already in place: {from_port_name} -> {to_port_name} ({error})")
+                    return True
+                raise RuntimeError(error or f"aconnect exited with {result.returncode}")
+            return True
+        if alsa_seq_client is None:
+            alsa_seq_client = SequencerClient('midi-router')
+        try:
+            if connect:
+                alsa_seq_client.subscribe_port(sender, dest)
+            else:
+                alsa_seq_client.unsubscribe_port(sender, dest)
+        except ALSAError as e:
+            if e.errnum != -(errno.EBUSY if connect else errno.ENOENT):
+                raise
+            log.debug(f"ALSA subscription already in place: {from_port_name} -> {to_port_name} ({e})")
+        return True
+    except Exception as e:
+        action = 'subscribe' if connect else 'unsubscribe'
+        log.error(f"Error trying to {action} {from_port_name} -> {to_port_name} in the ALSA sequencer: {e}")
+        return False
+
+def send_forced_channel_program_change(output_port, compiled):
+    """Select program 0 on the channel a route forces everything onto"""
+    if compiled is not None and compiled.forced_channel is not None:
+        output_port.send(mido.Message('program_change', program=0, channel=compiled.forced_channel))
+
+def create_midi_connection(from_port_name, to_port_name, transform=None, snapshot=None):
+    try:
+        transform = DEFAULT_TRANSFORM if transform is None else parse_transform(transform)
+        compiled = compile_transform(transform)
+        if snapshot is None:
+            snapshot = take_port_snapshot()
+        input_ports = snapshot.all_inputs
+        output_ports = snapshot.all_outputs
+        if from_port_name not in input_ports:
+            log.info(f"Input port '{from_port_name}' not found")
+            return False
+        if to_port_name not in output_ports:
+            log.info(f"Output port '{to_port_name}' not found")
+            return False
+        connection_key = (from_port_name, to_port_name)
+        # Routes that do not rewrite anything can be patched in the kernel
+        in_kernel = compiled is None and KERNEL_ROUTING and get_midi_backend().system_devices
+
+        # A userspace route that stays in userspace only needs its transform
+        # swapped, the ports stay open and no messages are lost
+        connection = active_midi_connections.get(connection_key)
+        if connection is not None and connection.get('input') is not None and not in_kernel:
+            connection['input'].add_route(connection_key, connection['output'], compiled, route_metrics.get(connection_key))
+            connection['transform'] = transform
+            send_forced_channel_program_change(connection['output'], compiled)
+            mark_status_changed()
+            log.info(f"MIDI connection transform changed: {from_port_name} -> {to_port_name}")
+            return True
+        
+        # If connection already exists, close it first to ensure clean state
+        if connection_key in active_midi_connections:
+            close_midi_connection(from_port_name, to_port_name)
+            log.info(f"Closed existing connection before recreating: {from_port_name} -> {to_port_name}")
+        
+        if in_kernel and kernel_subscribe(from_port_name, to_port_name):
+            active_midi_connections[connection_key] = {'kernel': True, 'transform': transform}
+            mark_status_changed()
+            log.info(f"MIDI connection created in the ALSA sequencer: {from_port_name} -> {to_port_name}")
+            return True
+
+        hub = get_input_hub(from_port_name)
+        output_port = acquire_output(to_port_name)
+
+        send_forced_channel_program_change(output_port, compiled)
+
+        metrics = route_metrics[connection_key] = RouteMetrics()
+        active_midi_connections[connection_key] = {'input': hub, 'output': output_port, 'transform': transform}
+        hub.add_route(connection_key, output_port, compiled, metrics)
+        mark_status_changed()
+        log.info(f"MIDI connection created: {from_port_name} -> {to_port_name}")
+        return True
+    except Exception as e:
+        log.error(f"Error creating MIDI connection: {e}")
+        return False
+
+def midi_forwarder(hub):
+    """Blocking reader used by the 'thread' engine"""
+    hub.tuned = True
+    tune_current_thread('forwarding')
+    try:
+        log.info(f"Starting MIDI forwarding for {hub.port_name}")
+        for message in hub.port:
+            hub.dispatch(message)
+    except Exception as e:
+        log.error(f"Error in MIDI forwarding for {hub.port_name}: {e}")
+    finally:
+        log.info(f"MIDI forwarding stopped for {hub.port_name}")
+
+def start_poll_dispatcher():
+    global poll_dispatcher_thread
+    if poll_dispatcher_thread is None or not poll_dispatcher_thread.is_alive():
+        poll_dispatcher_thread = threading.Thread(target=poll_dispatcher, daemon=True)
+        poll_dispatcher_thread.start()
+
+def poll_dispatcher():
+    """Single thread that serves every input for the 'poll' engine"""
+    log.info("Starting MIDI poll dispatcher")
+    tune_current_thread('forwarding')
+    while monitor_running:
+        busy = False
+        for hub in list(input_hubs.values()):
+            try:
+                for message in hub.port.iter_pending():
+                    hub.dispatch(message)
+                    busy = True
+            except Exception as e:
+                # The port may have been closed while we were reading it
+                if not hub.port.closed:
+                    log.error(f"Error in MIDI forwarding for {hub.port_name}: {e}")
+        if not busy:
+            time.sleep(ENGINE_POLL_INTERVAL)
+    log.info("MIDI poll dispatcher stopped")
+
+def get_route_paths():
+    """Describe where each active route is forwarded, for /status"""
+    return [
+        {
+            'from': from_port,
+            'to': to_port,
+            'transform': connection.get('transform'),
+            'path': 'kernel' if connection.get('kernel') else 'userspace',
+        }
+        for (from_port, to_port), connection in list(active_midi_connections.items())
+    ]
+
+def get_thread_tuning():
+    """Configured and effective thread pinning and scheduling, for /status"""
+    with thread_tuning_lock:
+        effective = {role: dict(settings) for role, settings in thread_tuning.items()}
+    return {
+        'configured': {
+            'forwarding': {'cpus': RT_CPUS or None, 'policy': RT_POLICY, 'priority': RT_PRIORITY},
+            'background': {'cpus': BACKGROUND_CPUS or None, 'nice': BACKGROUND_NICE},
+        },
+        'effective': effective,
+    }
+
+def get_engine_stats():
+    messages = engine_stats['messages']
+    return {
+        'mode': FORWARDING_ENGINE,
+        'raw_inputs': sum(1 for hub in list(input_hubs.values()) if hub.raw),
+        'threads': threading.active_count(),
+        'messages': messages,
+        'mean_dispatch_us': round(engine_stats['dispatch_ns'] / messages / 1000, 2) if messages else None,
+        'max_dispatch_us': round(engine_stats['max_dispatch_ns'] / 1000, 2),
+    }
+
+def close_midi_connection(from_port_name, to_port_name):
     connection_key = (from_port_name, to_port_name)
     try:
         if connection_key in active_midi_connections:
             connection = active_midi_connections[connection_key]
             del active_midi_connections[connection_key]
+            # Only the route is removed, the input stays open for its other routes
             if 'input' in connection and connection['input']:
-                try:
-                    connection['input'].close()
-                    print(f"Closed input port: {from_port_name}")
-                except Exception as e:
-                    print(f"Error closing input port: {e}")
+                connection['input'].remove_route(connection_key)
             if 'output' in connection and connection['output']:
-                try:
-                    connection['output'].close()
-                    print(f"Closed output port: {to_port_name}")
-                except Exception as e:
-                    print(f"Error closing output port: {e}")
-            if connection_key in midi_threads:
-                del midi_threads[connection_key]
-            print(f"MIDI connection fully closed: {from_port_name} -> {to_port_name}")
+                release_output(to_port_name)
+            if connection.get('kernel'):
+                kernel_subscribe(from_port_name, to_port_name, connect=False)
+            route_metrics.pop(connection_key, None)
+            mark_status_changed()
+            log.info(f"MIDI connection fully closed: {from_port_name} -> {to_port_name}")
             return True
         else:
-            print(f"Connection not found in active_midi_connections: {from_port_name} -> {to_port_name}")
+            log.debug(f"Connection not found in active_midi_connections: {from_port_name} -> {to_port_name}")
             return False
     except Exception as e:
-        print(f"Error in close_midi_connection: {e}")
+        log.error(f"Error in close_midi_connection: {e}")
         return False
 
 def close_all_midi_connections():
     connections_to_close = list(active_midi_connections.keys())
     for from_port, to_port in connections_to_close:
         close_midi_connection(from_port, to_port)
-    print("All MIDI connections closed")
+    for port_name in list(input_hubs):
+        close_input_hub(port_name)
+    log.info("All MIDI connections closed")
+
+def select_auto_route(snapshot):
+    """Return the (input, output) route auto mode wants for these ports, or None"""
+    current_inputs = snapshot.input_set
+    current_outputs = snapshot.output_set
+
+    # Use the connected_usb_devices list to determine connection order
+    usb_devices = [device for device in connected_usb_devices if is_usb_midi_device(device)]
+    
+    # Filter to ensure devices are actually available
+    available_usb_devices = [device for device in usb_devices 
+                           if device in current_inputs or device in current_outputs]
+    
+    log.debug(f"Available USB devices in order of connection: {available_usb_devices}")
+    
+    if len(available_usb_devices) < 2:
+        log.debug(f"Not enough USB devices for auto-connection: {len(available_usb_devices)} found")
+        return None
 
-def perform_auto_connections():
-    global manual_mode, connected_usb_devices
+    # The first device in the list becomes the input, the second becomes the output
+    input_port = available_usb_devices[0]
+    output_port = available_usb_devices[1]
+    
+    # Verify these ports are actually available as input/output
+    if input_port not in current_inputs:
+        log.info(f"Selected input port {input_port} is not available as an input")
+        return None
+        
+    if output_port not in current_outputs:
+        log.info(f"Selected output port {output_port} is not available as an output")
+        return None
+
+    return (input_port, output_port)
+
+def perform_auto_connections(snapshot=None):
     if manual_mode:
         # Manual mode disables auto-connect
-        print("Manual mode is ON - skipping auto-connections")
+        log.debug("Manual mode is ON - skipping auto-connections")
         return
     try:
-        current_inputs = filter_ports(mido.get_input_names())
-        current_outputs = filter_ports(mido.get_output_names())
-
-        # Use the connected_usb_devices list to determine connection order
-        usb_devices = [device for device in connected_usb_devices if is_usb_midi_device(device)]
-        
-        # Filter to ensure devices are actually available
-        available_usb_devices = [device for device in usb_devices 
-                               if device in current_inputs or device in current_outputs]
-        
-        print(f"Available USB devices in order of connection: {available_usb_devices}")
-        
-        if len(available_usb_devices) < 2:
-            print(f"Not enough USB devices for auto-connection: {len(available_usb_devices)} found")
+        if snapshot is None:
+            snapshot = take_port_snapshot()
+        auto_connection_key = select_auto_route(snapshot)
+        if auto_connection_key is None:
             return
+        input_port, output_port = auto_connection_key
 
-        # The first device in the list becomes the input, the second becomes the output
-        input_port = available_usb_devices[0]
-        output_port = available_usb_devices[1]
-        
-        # Verify these ports are actually available as input/output
-        if input_port not in current_inputs:
-            print(f"Selected input port {input_port} is not available as an input")
-            return
-            
-        if output_port not in current_outputs:
-            print(f"Selected output port {output_port} is not available as an output")
-            return
-
-        auto_connection_key = (input_port, output_port)
         if auto_connection_key in connection_log:
-            print(f"Connection already exists: {input_port} -> {output_port}")
+            log.debug(f"Connection already exists: {input_port} -> {output_port}")
             return
 
         # Disconnect any existing auto-connections that conflict
@@ -951,87 +2868,369 @@ def perform_auto_connections():
             auto_connections.discard(conn)
             connection_log.discard(conn)
             close_midi_connection(conn[0], conn[1])
-            print(f"Disconnected conflicting auto-connection: {conn[0]} -> {conn[1]}")
+            log.info(f"Disconnected conflicting auto-connection: {conn[0]} -> {conn[1]}")
 
-        success = create_midi_connection(input_port, output_port)
+        success = create_midi_connection(input_port, output_port, snapshot=snapshot)
         if success:
             auto_connections.add(auto_connection_key)
             connection_log.add(auto_connection_key)
-            print(f"Auto-connected USB device: {input_port} -> {output_port}")
+            mark_status_changed()
+            log.info(f"Auto-connected USB device: {input_port} -> {output_port}")
         else:
-            print(f"Failed to auto-connect: {input_port} -> {output_port}")
+            log.error(f"Failed to auto-connect: {input_port} -> {output_port}")
 
     except Exception as e:
-        print(f"Error during auto-connection: {e}")
+        log.error(f"Error during auto-connection: {e}")
+
+def reconcile_routes(desired, snapshot=None):
+    """Make the live routes match `desired`, a {connection_key: transform} dict.
+
+    Only routes that are missing, unwanted or have a different transform are
+    touched; everything else keeps forwarding, and a changed transform is
+    swapped in place where possible.  Returns (opened, closed).
+    """
+    live = {key: connection.get('transform') for key, connection in list(active_midi_connections.items())}
+    closed = [key for key in live if key not in desired]
+    for from_port, to_port in closed:
+        close_midi_connection(from_port, to_port)
+    opened = []
+    for key, transform in desired.items():
+        if live.get(key) == transform:
+            continue
+        if snapshot is None:
+            snapshot = take_port_snapshot()
+        if create_midi_connection(key[0], key[1], transform, snapshot=snapshot):
+            opened.append(key)
+        else:
+            log.error(f"Failed to restore route: {key[0]} -> {key[1]}")
+    if opened or closed:
+        log.info(f"Reconciled routes: {len(opened)} opened, {len(closed)} closed, {len(live) - len(closed)} kept")
+    return opened, closed
 
 def verify_connections_closed():
     """Verify that all MIDI connections are properly closed"""
     if active_midi_connections:
-        print(f"WARNING: {len(active_midi_connections)} connections still active after attempted closure")
+        log.warning(f"{len(active_midi_connections)} connections still active after attempted closure")
         return False
     return True
 
-def switch_to_auto_mode():
-    """Switch from manual mode to auto mode"""
-    global manual_mode, connected_usb_devices
+def record_mode_switch(started, mode):
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    mode_switch_stats['count'] += 1
+    mode_switch_stats['last_ms'] = round(elapsed_ms, 2)
+    if mode_switch_stats['max_ms'] is None or elapsed_ms > mode_switch_stats['max_ms']:
+        mode_switch_stats['max_ms'] = round(elapsed_ms, 2)
+    log.info(f"Switched to {mode} mode in {elapsed_ms:.1f} ms")
+
+def switch_to_auto_mode(snapshot=None):
+    """Switch from manual mode to auto mode, using `snapshot` of the ports if given"""
+    global manual_mode
     
     if not manual_mode:
         return
     
-    print("SWITCHING TO AUTO MODE")
-    
-    # First explicitly close all active connections
-    connections_to_close = list(active_midi_connections.keys())
-    for from_port, to_port in connections_to_close:
-        close_midi_connection(from_port, to_port)
-    
-    # Small delay to ensure connections are fully terminated
-    time.sleep(0.5)
-    
-    # Perform system-level MIDI reset
-    system_level_midi_reset()
+    log.info("SWITCHING TO AUTO MODE")
+    started = time.perf_counter()
+
+    # Keep the auto route if it is already live and close the manual ones
+    if snapshot is None:
+        snapshot = take_port_snapshot()
+    auto_connection_key = select_auto_route(snapshot)
+    desired = {auto_connection_key: DEFAULT_TRANSFORM} if auto_connection_key else {}
+    reconcile_routes(desired, snapshot)
     
-    # Clear all connection tracking
+    # Rebuild connection tracking from the routes that are now live
     connection_log.clear()
     manual_connection_log.clear()
     auto_connections.clear()
+    if auto_connection_key in active_midi_connections:
+        connection_log.add(auto_connection_key)
+        auto_connections.add(auto_connection_key)
     
     # Set manual mode flag
     manual_mode = False
+    record_mode_switch(started, 'auto')
+    mark_status_changed()
+    
+    log.info("Switched to auto mode - all manual connections removed")
+
+def switch_to_manual_mode():
+    """Switch from auto mode to manual mode, which starts without any routes"""
+    global manual_mode
+
+    if manual_mode:
+        return
+
+    log.info("SWITCHING TO MANUAL MODE - DISCONNECTING ALL CONNECTIONS")
+    started = time.perf_counter()
+    reconcile_routes({})
+
+    # Clear all connection tracking
+    connection_log.clear()
+    auto_connections.clear()
+    manual_connection_log.clear()  # Also clear manual connections
     
     # Verify connections are closed
     if not verify_connections_closed():
-        print("WARNING: Some connections may still be active after switching to auto mode")
-    
-    # Re-establish auto connections
-    perform_auto_connections()
+        log.warning("Some connections may still be active after switching to manual mode")
+        
+        # Force close any remaining connections
+        for key in list(active_midi_connections.keys()):
+            try:
+                connection = active_midi_connections[key]
+                if 'input' in connection and connection['input']:
+                    connection['input'].remove_route(key)
+                if 'output' in connection and connection['output']:
+                    release_output(key[1])
+                if connection.get('kernel'):
+                    kernel_subscribe(key[0], key[1], connect=False)
+                del active_midi_connections[key]
+                log.info(f"Force closed connection: {key}")
+            except Exception as e:
+                log.error(f"Error force closing connection {key}: {e}")
     
-    print("Switched to auto mode - all manual connections removed")
+    # Set manual mode flag
+    manual_mode = True
+    record_mode_switch(started, 'manual')
+    mark_status_changed()
+    log.info("Switched to manual mode - all connections disconnected")
+
+def reset_midi_system():
+    """Recovery action: reset the MIDI subsystem, then restore the routes we had"""
+    desired = {key: connection.get('transform') for key, connection in list(active_midi_connections.items())}
+    system_level_midi_reset()
+    reconcile_routes(desired)
+    # Drop tracking for routes whose devices did not come back
+    for connection in list(connection_log):
+        if connection not in active_midi_connections:
+            connection_log.discard(connection)
+            manual_connection_log.discard(connection)
+            auto_connections.discard(connection)
+    mark_status_changed()
+
+def minify_css(text):
+    text = re.sub(r'/\*.*?\*/', '', text, flags=re.S)
+    text = re.sub(r'\s+', ' ', text)
+    text = re.sub(r'\s*([{};,>~])\s*', r'\1', text)
+    return text.replace(': ', ':').replace(';}', '}').strip()
+
+def minify_lines(text, comment=None):
+    """Drop indentation, blank lines and whole-line comments"""
+    lines = (line.strip() for line in text.splitlines())
+    return '\n'.join(line for line in lines if line and not (comment and line.startswith(comment)))
+
+def compress_web_asset(body, mimetype, cache_control):
+    """Precompress one asset with gzip and, if the brotli module is installed, brotli"""
+    bodies = {'identity': body, 'gzip': gzip.compress(body, 9, mtime=0)}
+    try:
+        import brotli
+    except ImportError:
+        pass
+    else:
+        bodies['br'] = brotli.compress(body, quality=11)
+    return WebAsset(mimetype, cache_control, hashlib.sha256(body).hexdigest()[:16], bodies)
+
+def build_web_assets():
+    """Split HTML_TEMPLATE into a page, a stylesheet and a script, minified and compressed"""
+    style = re.search(r'<style>(.*?)</style>', HTML_TEMPLATE, re.S)
+    script = re.search(r'<script>(.*?)</script>', HTML_TEMPLATE, re.S)
+    css = compress_web_asset(minify_css(style.group(1)).encode(), 'text/css', WEB_ASSET_CACHE_CONTROL)
+    js = compress_web_asset(minify_lines(script.group(1), '//').encode(), 'text/javascript', WEB_ASSET_CACHE_CONTROL)
+    css_path = f"/assets/router.{css.etag}.css"
+    js_path = f"/assets/router.{js.etag}.js"
+    page = HTML_TEMPLATE.replace(style.group(0), f'<link rel="stylesheet" href="{css_path}">')
+    page = page.replace(script.group(0), f'<script src="{js_path}"></script>')
+    page = re.sub(r'<!--.*?-->', '', page, flags=re.S)
+    return {
+        '/': compress_web_asset(minify_lines(page).encode(), 'text/html', 'no-cache'),
+        css_path: css,
+        js_path: js,
+    }
+
+def get_web_assets():
+    global web_assets
+    with web_assets_lock:
+        if web_assets is None:
+            started = time.perf_counter()
+            web_assets = build_web_assets()
+            web_stats['build_ms'] = round((time.perf_counter() - started) * 1000, 2)
+        return web_assets
+
+def send_web_asset(asset):
+    """Serve the best precompressed variant the client accepts, or a 304"""
+    encoding = 'identity'
+    for candidate in ('br', 'gzip'):
+        if candidate in asset.bodies and request.accept_encodings[candidate]:
+            encoding = candidate
+            break
+    etag = asset.etag if encoding == 'identity' else f"{asset.etag}-{encoding}"
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = Response(asset.bodies[encoding], mimetype=asset.mimetype)
+        if encoding != 'identity':
+            response.headers['Content-Encoding'] = encoding
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = asset.cache_control
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
 
 @app.route('/')
 def index():
-    return render_template_string(HTML_TEMPLATE)
+    return send_web_asset(get_web_assets()['/'])
+
+@app.route('/assets/<name>')
+def web_asset(name):
+    asset = get_web_assets().get(f'/assets/{name}')
+    if asset is None:
+        return jsonify({"success": False, "message": "Asset not found"}), 404
+    return send_web_asset(asset)
+
+@app.route('/paint_timing', methods=['POST'])
+def paint_timing():
+    """Paint timings reported by the GUI, so first paint can be read off /status"""
+    try:
+        report = json.loads(request.get_data())
+        name, value = report['name'], float(report['ms'])
+    except (ValueError, KeyError, TypeError):
+        return jsonify({"success": False, "message": "Invalid paint timing"}), 400
+    if name not in PAINT_TIMINGS:
+        return jsonify({"success": False, "message": "Unknown paint timing"}), 400
+    web_stats[name.replace('-', '_') + '_ms'] = round(value, 1)
+    web_stats['paint_reports'] += 1
+    mark_status_changed()
+    return '', 204
+
+def mark_status_changed():
+    """Invalidate the cached /status snapshot; call after changing routing state"""
+    global status_version
+    with status_lock:
+        status_version += 1
+    if state_saver_running:
+        state_dirty.set()
+    publish_state_changes()
+
+def publish_event(event_type, data):
+    global event_sequence
+    with event_condition:
+        event_sequence += 1
+        event_history.append((event_sequence, event_type, data))
+        event_condition.notify_all()
+
+def publish_state_changes():
+    """Diff the GUI-visible state against what was last published and push the deltas"""
+    global published_state
+    inputs = set(known_inputs)
+    outputs = set(known_outputs)
+    ports = {port: {'input': port in inputs, 'output': port in outputs} for port in inputs | outputs}
+    displayed_connections = list(connection_log) if manual_mode else list(auto_connections)
+    routes = {connection: connection in auto_connections for connection in displayed_connections}
+    with event_condition:
+        previous = published_state
+        for port, directions in ports.items():
+            if previous['ports'].get(port) != directions:
+                publish_event('port_added', dict(port=port, **directions))
+        for port in previous['ports'].keys() - ports.keys():
+            publish_event('port_removed', {'port': port})
+        for (from_port, to_port), auto in routes.items():
+            if previous['routes'].get((from_port, to_port)) != auto:
+                publish_event('route_created', {'from': from_port, 'to': to_port, 'auto': auto})
+        for from_port, to_port in previous['routes'].keys() - routes.keys():
+            publish_event('route_closed', {'from': from_port, 'to': to_port})
+        if previous['manual_mode'] != manual_mode:
+            publish_event('mode_changed', {'manual_mode': manual_mode})
+        published_state = {'ports': ports, 'routes': routes, 'manual_mode': manual_mode}
+
+def format_event(sequence, event_type, data):
+    return f"id: {EVENT_EPOCH}-{sequence}\nevent: {event_type}\ndata: {json.dumps(data)}\n\n"
+
+def parse_event_id(event_id):
+    """Return the sequence number of an event id from this process, or None"""
+    epoch, _, sequence = (event_id or '').rpartition('-')
+    if epoch != EVENT_EPOCH:
+        return None
+    try:
+        return int(sequence)
+    except ValueError:
+        return None
+
+def event_stream(last_sequence):
+    """Yield SSE deltas after last_sequence, or a full snapshot if we cannot resume"""
+    with event_condition:
+        oldest = event_history[0][0] if event_history else event_sequence + 1
+        can_resume = last_sequence is not None and oldest - 1 <= last_sequence <= event_sequence
+        if not can_resume:
+            last_sequence = event_sequence
+            snapshot = build_status()
+    if not can_resume:
+        yield format_event(last_sequence, 'snapshot', snapshot)
+    while not event_streams_closed.is_set():
+        with event_condition:
+            event_condition.wait_for(lambda: event_sequence > last_sequence or event_streams_closed.is_set(),
+                                     timeout=EVENT_KEEPALIVE_INTERVAL)
+            pending = [event for event in event_history if event[0] > last_sequence]
+        if not pending:
+            yield ": keepalive\n\n"
+            continue
+        for sequence, event_type, data in pending:
+            yield format_event(sequence, event_type, data)
+            last_sequence = sequence
+
+def close_event_streams():
+    """End every /events stream, for a server that is shutting down"""
+    with event_condition:
+        event_streams_closed.set()
+        event_condition.notify_all()
+
+@app.route('/events')
+def events():
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('since')
+    return Response(event_stream(parse_event_id(last_event_id)), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+    })
+
+def build_status():
+    # In manual mode, show all connections
+    # In auto mode, only show auto connections
+    displayed_connections = list(connection_log) if manual_mode else list(auto_connections)
+    return {
+        'input_ports': known_inputs,
+        'output_ports': known_outputs,
+        'connections': displayed_connections,
+        'auto_connections': list(auto_connections),
+        'manual_connections': list(manual_connection_log),
+        'manual_mode': manual_mode,
+        'hotplug': dict(hotplug_stats),
+        'mode_switch': dict(mode_switch_stats),
+        'routes': get_route_paths(),
+        'threads': get_thread_tuning(),
+        'boot': dict(boot_stats),
+        'web': dict(web_stats),
+    }
+
+def get_status_snapshot():
+    """Return (etag, body) for /status, rebuilding it only if the state changed"""
+    global status_cache
+    with status_lock:
+        version = status_version
+        if status_cache is not None and status_cache[0] == version:
+            return status_cache[1], status_cache[2]
+    # Read the version first: a change while building bumps it again, so a
+    # stale body is never cached under the newer version
+    body = json.dumps(build_status())
+    etag = f"{STATUS_ETAG_PREFIX}-{version}"
+    with status_lock:
+        if status_cache is None or status_cache[0] < version:
+            status_cache = (version, etag, body)
+    return etag, body
 
 @app.route('/status')
 def status():
     try:
-        filtered_inputs = filter_ports(mido.get_input_names())
-        filtered_outputs = filter_ports(mido.get_output_names())
-        
-        # In manual mode, show all connections
-        # In auto mode, only show auto connections
-        displayed_connections = list(connection_log) if manual_mode else list(auto_connections)
-        
-        return jsonify({
-            'input_ports': filtered_inputs,
-            'output_ports': filtered_outputs,
-            'connections': displayed_connections,
-            'auto_connections': list(auto_connections),
-            'manual_connections': list(manual_connection_log),
-            'manual_mode': manual_mode
-        })
+        etag, body = get_status_snapshot()
     except Exception as e:
-        print(f"Error in status route: {e}")
+        log.error(f"Error in status route: {e}")
         return jsonify({
             'input_ports': [],
             'output_ports': [],
@@ -1040,15 +3239,145 @@ def status():
             'manual_connections': [],
             'manual_mode': manual_mode
         })
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    # Browsers must revalidate every poll, which is answered with a 304
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+def prometheus_labels(**labels):
+    escaped = (
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in labels.items()
+    )
+    return '{' + ','.join(escaped) + '}'
+
+def render_metrics():
+    """Render router and per-route metrics in the Prometheus text format"""
+    lines = []
+
+    def metric(name, kind, help_text, samples):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            lines.append(f"{name}{labels} {value}")
+
+    routes = [(prometheus_labels(**{'from': key[0], 'to': key[1]}), stats)
+              for key, stats in list(route_metrics.items())]
+    metric('midi_router_route_messages_total', 'counter', 'Messages sent per route',
+           [(labels, stats.messages + (stats.realtime.messages if stats.realtime else 0))
+            for labels, stats in routes])
+    metric('midi_router_route_bytes_total', 'counter', 'MIDI bytes sent per route',
+           [(labels, stats.bytes + (stats.realtime.bytes if stats.realtime else 0))
+            for labels, stats in routes])
+    metric('midi_router_route_errors_total', 'counter', 'Failed sends per route',
+           [(labels, stats.errors) for labels, stats in routes])
+    metric('midi_router_route_dropped_total', 'counter', 'Messages dropped by a full output queue per route',
+           [(labels, stats.dropped) for labels, stats in routes])
+
+    lines.append('# HELP midi_router_route_latency_seconds Time from receiving an event to sending it')
+    lines.append('# TYPE midi_router_route_latency_seconds histogram')
+    for key, stats in list(route_metrics.items()):
+        cumulative = 0
+        bounds = [f"{bound / 1e9:g}" for bound in LATENCY_BUCKETS_NS] + ['+Inf']
+        for bound, count in zip(bounds, stats.buckets):
+            cumulative += count
+            labels = prometheus_labels(**{'from': key[0], 'to': key[1], 'le': bound})
+            lines.append(f"midi_router_route_latency_seconds_bucket{labels} {cumulative}")
+        labels = prometheus_labels(**{'from': key[0], 'to': key[1]})
+        lines.append(f"midi_router_route_latency_seconds_sum{labels} {stats.latency_sum_ns / 1e9:g}")
+        lines.append(f"midi_router_route_latency_seconds_count{labels} {cumulative}")
+
+    clocks = [(key, stats.realtime.summary()) for key, stats in list(route_metrics.items())
+              if stats.realtime is not None and stats.realtime.clocks]
+    metric('midi_router_route_clocks_total', 'counter', 'MIDI clock messages sent per route',
+           [(prometheus_labels(**{'from': key[0], 'to': key[1]}), clock['clocks']) for key, clock in clocks])
+    for name, field, help_text in (
+        ('midi_router_route_clock_input_bpm', 'input_bpm', 'Tempo of the MIDI clock received for a route'),
+        ('midi_router_route_clock_output_bpm', 'output_bpm', 'Tempo of the MIDI clock sent by a route'),
+    ):
+        metric(name, 'gauge', help_text,
+               [(prometheus_labels(**{'from': key[0], 'to': key[1]}), f"{clock[field]:.3f}")
+                for key, clock in clocks if clock[field] is not None])
+    lines.append('# HELP midi_router_route_clock_jitter_seconds Difference between sent and received clock intervals')
+    lines.append('# TYPE midi_router_route_clock_jitter_seconds summary')
+    for key, clock in clocks:
+        for quantile, field in (('0.5', 'jitter_p50_ns'), ('0.99', 'jitter_p99_ns'), ('1', 'jitter_max_ns')):
+            if clock[field] is not None:
+                labels = prometheus_labels(**{'from': key[0], 'to': key[1], 'quantile': quantile})
+                lines.append(f"midi_router_route_clock_jitter_seconds{labels} {clock[field] / 1e9:g}")
+
+    outputs = [(prometheus_labels(output=name), output) for name, output in list(output_pool.items())]
+    metric('midi_router_output_queue_depth', 'gauge', 'Messages waiting to be sent per output',
+           [(labels, output.queue_depth()) for labels, output in outputs])
+    metric('midi_router_output_queue_depth_max', 'gauge', 'Most messages seen waiting per output',
+           [(labels, output.max_depth) for labels, output in outputs])
+    metric('midi_router_output_coalesced_total', 'counter',
+           'Controller and pitch bend values replaced by a newer value before being sent',
+           [(labels, output.coalesced) for labels, output in outputs])
+    metric('midi_router_output_paced_bytes_per_second', 'gauge', 'Wire speed an output is paced to, 0 when unpaced',
+           [(labels, f"{output.bytes_per_second:g}") for labels, output in outputs])
+    metric('midi_router_output_wire_bytes_total', 'counter', 'Bytes sent per output, counting running status',
+           [(labels, output.wire_bytes) for labels, output in outputs])
+    metric('midi_router_output_sysex_bytes', 'gauge', 'SysEx bytes waiting to be sent per output',
+           [(labels, output.sysex_bytes) for labels, output in outputs])
+    metric('midi_router_output_sysex_waits_total', 'counter', 'Times a SysEx sender waited for the output to catch up',
+           [(labels, output.sysex_waits) for labels, output in outputs])
+    metric('midi_router_output_sysex_stalled', 'gauge', '1 while SysEx to an output is dropped because it stopped draining',
+           [(labels, int(output.sysex_stalled)) for labels, output in outputs])
+    metric('midi_router_output_realtime_queued_total', 'counter',
+           'Realtime messages queued instead of sent at once because the output was busy or had realtime waiting',
+           [(labels, output.realtime_queued) for labels, output in outputs])
+    metric('midi_router_output_dropped_total', 'counter', 'Messages dropped by a full output queue per priority class',
+           [(prometheus_labels(output=name, priority=priority), output.dropped[index])
+            for name, output in list(output_pool.items()) for index, priority in enumerate(PRIORITY_CLASSES)])
+
+    engine = get_engine_stats()
+    metric('midi_router_dispatched_messages_total', 'counter', 'Incoming messages dispatched by the engine',
+           [('', engine['messages'])])
+    metric('midi_router_dispatch_seconds_total', 'counter', 'Time spent dispatching incoming messages',
+           [('', f"{engine_stats['dispatch_ns'] / 1e9:g}")])
+    metric('midi_router_dispatch_max_seconds', 'gauge', 'Slowest dispatch of a single message',
+           [('', f"{engine_stats['max_dispatch_ns'] / 1e9:g}")])
+    metric('midi_router_raw_inputs', 'gauge', 'Inputs forwarded as raw bytes',
+           [('', engine['raw_inputs'])])
+    metric('midi_router_threads', 'gauge', 'Threads in the router process',
+           [('', engine['threads'])])
+    metric('midi_router_port_enumerations_total', 'counter', 'ALSA port enumerations',
+           [('', port_enumeration_stats['total'])])
+    metric('midi_router_port_enumerations_per_tick', 'gauge', 'Port enumerations during the last monitor tick',
+           [('', port_enumeration_stats['last_tick'])])
+    metric('midi_router_port_enumerations_per_tick_max', 'gauge', 'Most port enumerations seen in one monitor tick',
+           [('', port_enumeration_stats['max_per_tick'])])
+    if mode_switch_stats['last_ms'] is not None:
+        metric('midi_router_mode_switch_seconds', 'gauge', 'Duration of the last manual/auto mode switch',
+               [('', f"{mode_switch_stats['last_ms'] / 1000:g}")])
+    metric('midi_router_kernel_routes', 'gauge', 'Routes patched in the ALSA sequencer',
+           [('', sum(1 for connection in list(active_midi_connections.values()) if connection.get('kernel')))])
+    if hotplug_stats['last_latency_ms'] is not None:
+        metric('midi_router_hotplug_latency_seconds', 'gauge', 'Latency of the last handled port change',
+               [('', f"{hotplug_stats['last_latency_ms'] / 1000:g}")])
+    return '\n'.join(lines) + '\n'
+
+@app.route('/metrics')
+def metrics():
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
 
 @app.route('/connect', methods=['POST'])
 def connect():
-    global manual_mode
     from_port = request.form.get('from')
     to_port = request.form.get('to')
+    transform = request.form.get('transform') or DEFAULT_TRANSFORM
     
     if not from_port or not to_port:
         return redirect(url_for('index', error='Please select both input and output ports'))
+    try:
+        transform = parse_transform(transform)
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
     if from_port == to_port:
         return redirect(url_for('index', error='Input and output ports cannot be the same'))
     
@@ -1060,10 +3389,14 @@ def connect():
     if connection_tuple in connection_log:
         return redirect(url_for('index', error='Connection already exists'))
     
-    if create_midi_connection(from_port, to_port):
-        connection_log.add(connection_tuple)
-        manual_connection_log.add(connection_tuple)
-        print(f"Manual connection created: {from_port} -> {to_port}")
+    with routing_lock:
+        created = create_midi_connection(from_port, to_port, transform)
+        if created:
+            connection_log.add(connection_tuple)
+            manual_connection_log.add(connection_tuple)
+            mark_status_changed()
+    if created:
+        log.info(f"Manual connection created: {from_port} -> {to_port}")
         return redirect(url_for('index', connected='true'))
     else:
         return redirect(url_for('index', error='Failed to create MIDI connection - check that ports exist'))
@@ -1085,88 +3418,1389 @@ def disconnect():
         if not manual_mode and connection_tuple in auto_connections:
             return jsonify({"success": False, "message": "Cannot disconnect auto-connections in auto mode"}), 400
         
-        success = close_midi_connection(from_port, to_port)
-        connection_log.discard(connection_tuple)
-        manual_connection_log.discard(connection_tuple)
-        auto_connections.discard(connection_tuple)
+        with routing_lock:
+            success = close_midi_connection(from_port, to_port)
+            connection_log.discard(connection_tuple)
+            manual_connection_log.discard(connection_tuple)
+            auto_connections.discard(connection_tuple)
+            mark_status_changed()
         
         if success:
-            print(f"Successfully disconnected: {from_port} -> {to_port}")
+            log.info(f"Successfully disconnected: {from_port} -> {to_port}")
             return jsonify({"success": True, "message": "Connection disconnected successfully"})
         else:
             return jsonify({"success": True, "message": "Connection removed from tracking"})
     except Exception as e:
-        print(f"Error in disconnect route: {e}")
+        log.error(f"Error in disconnect route: {e}")
         return jsonify({"success": False, "message": f"Error: {str(e)}"}), 500
 
-@app.route('/toggle_manual_mode', methods=['POST'])
-def toggle_manual_mode():
-    global manual_mode
-    new_mode = request.json.get('manual_mode', False)
-    
+@app.route('/transform', methods=['POST'])
+def set_transform():
+    """Change the transform of an existing route without reopening its ports"""
+    from_port = request.form.get('from')
+    to_port = request.form.get('to')
+    if not from_port or not to_port:
+        return jsonify({"success": False, "message": "Missing port information"}), 400
+    try:
+        transform = parse_transform(request.form.get('transform') or DEFAULT_TRANSFORM)
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+    with routing_lock:
+        if (from_port, to_port) not in active_midi_connections:
+            return jsonify({"success": False, "message": "Connection not found"}), 404
+        changed = create_midi_connection(from_port, to_port, transform)
+        if not changed and (from_port, to_port) not in active_midi_connections:
+            # The old route was closed before the new one failed to open
+            connection_log.discard((from_port, to_port))
+            manual_connection_log.discard((from_port, to_port))
+            auto_connections.discard((from_port, to_port))
+            mark_status_changed()
+    if not changed:
+        return jsonify({"success": False, "message": "Failed to change the transform"}), 500
+    return jsonify({"success": True, "transform": transform})
+
+def public_job(job):
+    return {key: value for key, value in job.items() if key != 'func'}
+
+def submit_control_job(kind, func, *args):
+    """Queue func(*args) on the control worker, returning (job, created).
+
+    If an identical job is already queued or running, that job is returned
+    instead of starting a second one.
+    """
+    global control_worker_thread, next_job_id
+    with control_jobs_lock:
+        for job in control_jobs.values():
+            if job['kind'] == kind and job['args'] == list(args) and job['state'] in ('queued', 'running'):
+                return job, False
+        job = {
+            'id': str(next_job_id),
+            'kind': kind,
+            'args': list(args),
+            'state': 'queued',
+            'result': None,
+            'error': None,
+            'created': time.time(),
+            'started': None,
+            'finished': None,
+            'func': func,
+        }
+        next_job_id += 1
+        control_jobs[job['id']] = job
+        while len(control_jobs) > CONTROL_JOB_HISTORY:
+            oldest = next(iter(control_jobs.values()))
+            if oldest['state'] in ('queued', 'running'):
+                break
+            control_jobs.popitem(last=False)
+        if control_worker_thread is None or not control_worker_thread.is_alive():
+            control_worker_thread = threading.Thread(target=control_worker, name='control-worker', daemon=True)
+            control_worker_thread.start()
+    control_queue.put(job)
+    publish_event('job', public_job(job))
+    return job, True
+
+def control_worker():
+    """Runs queued control jobs one at a time"""
+    tune_current_thread('background')
+    while True:
+        job = control_queue.get()
+        job['state'] = 'running'
+        job['started'] = time.time()
+        publish_event('job', public_job(job))
+        try:
+            with routing_lock:
+                job['result'] = job['func'](*job['args'])
+            job['state'] = 'done'
+        except Exception as e:
+            log.error(f"Control job {job['id']} ({job['kind']}) failed: {e}")
+            job['error'] = str(e)
+            job['state'] = 'failed'
+        job['finished'] = time.time()
+        publish_event('job', public_job(job))
+
+def set_manual_mode(new_mode):
     # If toggling from auto to manual
     if new_mode and not manual_mode:
-        print("TOGGLING TO MANUAL MODE - DISCONNECTING ALL CONNECTIONS")
-        
-        # First explicitly close all active connections
-        connections_to_close = list(active_midi_connections.keys())
-        for from_port, to_port in connections_to_close:
-            close_midi_connection(from_port, to_port)
-        
-        # Small delay to ensure connections are fully terminated
-        time.sleep(0.5)
-        
-        # Perform system-level MIDI reset
-        system_level_midi_reset()
-        
-        # Additional delay after reset
-        time.sleep(0.5)
-        
-        # Clear all connection tracking
-        connection_log.clear()
-        auto_connections.clear()
-        manual_connection_log.clear()  # Also clear manual connections
-        
-        # Verify connections are closed
-        if not verify_connections_closed():
-            print("WARNING: Some connections may still be active after switching to manual mode")
-            
-            # Force close any remaining connections
-            for key in list(active_midi_connections.keys()):
-                try:
-                    connection = active_midi_connections[key]
-                    if 'input' in connection and connection['input']:
-                        connection['input'].close()
-                    if 'output' in connection and connection['output']:
-                        connection['output'].close()
-                    del active_midi_connections[key]
-                    print(f"Force closed connection: {key}")
-                except Exception as e:
-                    print(f"Error force closing connection {key}: {e}")
-        
-        # Set manual mode flag
-        manual_mode = True
-        print("Switched to manual mode - all connections physically disconnected")
+        switch_to_manual_mode()
     
     # If toggling from manual to auto
     elif not new_mode and manual_mode:
         switch_to_auto_mode()
-    
-    return jsonify({"manual_mode": manual_mode})
+    return {"manual_mode": manual_mode}
+
+def job_response(job, created):
+    response = jsonify(dict(public_job(job), merged=not created, status_url=url_for('job_status', job_id=job['id'])))
+    response.status_code = 202
+    response.headers['Location'] = url_for('job_status', job_id=job['id'])
+    return response
+
+@app.route('/toggle_manual_mode', methods=['POST'])
+def toggle_manual_mode():
+    new_mode = bool(request.json.get('manual_mode', False))
+    return job_response(*submit_control_job('set_manual_mode', set_manual_mode, new_mode))
+
+@app.route('/reset_midi', methods=['POST'])
+def reset_midi():
+    """Full MIDI subsystem reset; only needed to recover a misbehaving driver"""
+    return job_response(*submit_control_job('reset_midi', reset_midi_system))
+
+@app.route('/jobs')
+def list_jobs():
+    with control_jobs_lock:
+        return jsonify([public_job(job) for job in control_jobs.values()])
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    job = control_jobs.get(job_id)
+    if job is None:
+        return jsonify({"success": False, "message": "Job not found"}), 404
+    return jsonify(public_job(job))
+
+class HotplugBackend:
+    """Source of port change notifications for the monitor thread.
+
+    The monitor blocks in wait_for_change() and rescans the ports whenever it
+    returns.  Event-driven subclasses only need to call notify() when they see
+    something change, which also lets a fake event source drive the monitor.
+    """
+    name = 'manual'
+    settle_time = 0.02  # Devices usually announce several ports in a burst
+
+    def __init__(self):
+        self._events = queue.Queue()
+
+    def start(self):
+        pass
+
+    def stop(self):
+        self.notify('stop')
+
+    def notify(self, reason='event'):
+        self._events.put((time.monotonic(), reason))
+
+    def wait_for_change(self):
+        """Block until a change is reported and return (timestamp, reason).
+
+        Pending events are coalesced into one rescan and the timestamp of the
+        earliest one is returned so the measured latency covers all of them.
+        """
+        try:
+            first = self._events.get(timeout=HOTPLUG_RESCAN_INTERVAL)
+        except queue.Empty:
+            return time.monotonic(), 'rescan'
+        time.sleep(self.settle_time)
+        while True:
+            try:
+                self._events.get_nowait()
+            except queue.Empty:
+                break
+        return first
+
+
+class PollingHotplugBackend(HotplugBackend):
+    """Fallback that simply rescans on a fixed interval"""
+    name = 'polling'
+
+    def stop(self):
+        pass
+
+    def wait_for_change(self):
+        time.sleep(HOTPLUG_POLL_INTERVAL)
+        return time.monotonic(), 'poll'
+
+
+class AlsaSeqHotplugBackend(HotplugBackend):
+    """Subscribes to the ALSA sequencer System:Announce port (needs alsa-midi)"""
+    name = 'alsa'
+
+    def __init__(self):
+        super().__init__()
+        from alsa_midi import SequencerClient, PortCaps, PortType, EventType
+        self._watched = {
+            EventType.CLIENT_START, EventType.CLIENT_EXIT,
+            EventType.PORT_START, EventType.PORT_EXIT, EventType.PORT_CHANGE,
+        }
+        self._client = SequencerClient('midi-router-hotplug')
+        port = self._client.create_port(
+            'announce',
+            caps=PortCaps.WRITE | PortCaps.SUBS_WRITE,
+            type=PortType.APPLICATION,
+        )
+        port.connect_from((0, 1))  # System:Announce
+        self._running = False
+
+    def start(self):
+        self._running = True
+        threading.Thread(target=self._reader, daemon=True).start()
+
+    def stop(self):
+        self._running = False
+        super().stop()
+
+    def _reader(self):
+        tune_current_thread('background')
+        while self._running:
+            try:
+                event = self._client.event_input(timeout=1)
+            except Exception as e:
+                log.error(f"Error reading ALSA announce events: {e}")
+                time.sleep(1)
+                continue
+            if event is not None and event.type in self._watched:
+                self.notify(f"alsa {event.type.name.lower()}")
+
+
+class UdevHotplugBackend(HotplugBackend):
+    """Watches udev sound subsystem events (needs pyudev)"""
+    name = 'udev'
+    # udev reports the card before the ALSA sequencer ports exist
+    settle_time = 0.3
+    retry_delay = 1.0
+
+    def __init__(self):
+        super().__init__()
+        import pyudev
+        self._monitor = pyudev.Monitor.from_netlink(pyudev.Context())
+        self._monitor.filter_by(subsystem='sound')
+        self._running = False
+
+    def start(self):
+        self._running = True
+        self._monitor.start()
+        threading.Thread(target=self._reader, daemon=True).start()
+
+    def stop(self):
+        self._running = False
+        super().stop()
+
+    def _reader(self):
+        tune_current_thread('background')
+        while self._running:
+            try:
+                device = self._monitor.poll(timeout=1)
+            except Exception as e:
+                log.error(f"Error reading udev events: {e}")
+                time.sleep(1)
+                continue
+            if device is not None:
+                reason = f"udev {device.action}"
+                self.notify(reason)
+                # Rescan once more in case the sequencer ports were slow to appear
+                threading.Timer(self.retry_delay, self.notify, args=(reason,)).start()
+
+
+def create_hotplug_backend(name=HOTPLUG_BACKEND):
+    """Create the requested hotplug backend, falling back to polling"""
+    # A fake MIDI backend reports its own device changes
+    backend_hotplug = get_midi_backend().create_hotplug_backend()
+    if backend_hotplug is not None:
+        return backend_hotplug
+    candidates = {
+        'auto': [AlsaSeqHotplugBackend, UdevHotplugBackend],
+        'alsa': [AlsaSeqHotplugBackend],
+        'udev': [UdevHotplugBackend],
+    }.get(name, [])
+    for backend_class in candidates:
+        try:
+            return backend_class()
+        except Exception as e:
+            log.warning(f"Hotplug backend '{backend_class.name}' unavailable: {e}")
+    if name not in ('auto', 'polling'):
+        log.warning("Falling back to polling for port changes")
+    return PollingHotplugBackend()
+
+
+def record_hotplug_latency(event_time, reason):
+    latency_ms = (time.monotonic() - event_time) * 1000
+    hotplug_stats['changes'] += 1
+    hotplug_stats['last_reason'] = reason
+    hotplug_stats['last_latency_ms'] = round(latency_ms, 2)
+    if hotplug_stats['max_latency_ms'] is None or latency_ms > hotplug_stats['max_latency_ms']:
+        hotplug_stats['max_latency_ms'] = round(latency_ms, 2)
+    mark_status_changed()
+    log.info(f"Port change ({reason}) handled in {latency_ms:.1f} ms")
+
 
 def monitor_ports():
-    global monitor_running
+    global hotplug_backend
+    tune_current_thread('background')
+    if hotplug_backend is None:
+        hotplug_backend = create_hotplug_backend()
+        hotplug_backend.start()
+    hotplug_stats['backend'] = hotplug_backend.name
+    mark_status_changed()
+    log.info(f"Monitoring ports using the '{hotplug_backend.name}' backend")
+
+    # Initial scan picks up everything that was plugged in before startup
+    try:
+        update_port_list()
+    except Exception as e:
+        log.error(f"Error monitoring ports: {e}")
+
     while monitor_running:
+        event_time, reason = hotplug_backend.wait_for_change()
+        if not monitor_running:
+            break
         try:
-            update_port_list()
+            if update_port_list():
+                record_hotplug_latency(event_time, reason)
         except Exception as e:
-            print(f"Error monitoring ports: {e}")
-        time.sleep(0.5)
+            log.error(f"Error monitoring ports: {e}")
 
-if __name__ == '__main__':
+def process_age():
+    """Seconds since this process started, from /proc; None where that is unavailable"""
+    try:
+        with open('/proc/self/stat') as f:
+            # Fields after the command name start at field 3; starttime is field 22
+            start_ticks = int(f.read().rsplit(')', 1)[1].split()[19])
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+        return uptime - start_ticks / os.sysconf('SC_CLK_TCK')
+    except (OSError, ValueError, IndexError):
+        return None
+
+def record_first_routed_message():
+    """Note how long after process start the first message was routed"""
+    global first_route_pending
+    first_route_pending = False
+    age = process_age()
+    boot_stats['first_routed_ms'] = None if age is None else round(age * 1000)
+    log.info(f"First message routed {boot_stats['first_routed_ms']} ms after start")
+    mark_status_changed()
+
+def build_routing_state():
+    """The routing state that is persisted: mode, device order and every route"""
+    routes = []
+    for key, connection in list(active_midi_connections.items()):
+        routes.append({
+            'from': key[0],
+            'to': key[1],
+            'transform': connection.get('transform'),
+            'auto': key in auto_connections,
+            'manual': key in manual_connection_log,
+        })
+    routes.sort(key=lambda route: (route['from'], route['to']))
+    return {
+        'version': STATE_VERSION,
+        'manual_mode': manual_mode,
+        'connected_usb_devices': list(connected_usb_devices),
+        'routes': routes,
+    }
+
+def save_routing_state():
+    """Write the routing state to STATE_FILE atomically; returns True if it was written.
+
+    The state goes to a temporary file that is fsynced and then renamed
+    over the old one, so a power cut leaves either the old or the new
+    state on disk and never a partial file.
+    """
+    global saved_state_text
+    if not STATE_FILE:
+        return False
+    with routing_lock:
+        text = json.dumps(build_routing_state(), separators=(',', ':'), sort_keys=True)
+    if text == saved_state_text:
+        return False
+    temporary = STATE_FILE + '.tmp'
+    try:
+        with open(temporary, 'w') as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, STATE_FILE)
+        directory = os.open(os.path.dirname(os.path.abspath(STATE_FILE)), os.O_RDONLY)
+        try:
+            os.fsync(directory)
+        finally:
+            os.close(directory)
+    except OSError as e:
+        log.error(f"Could not save the routing state to {STATE_FILE}: {e}")
+        return False
+    saved_state_text = text
+    log.debug(f"Routing state saved to {STATE_FILE}")
+    return True
+
+def load_routing_state():
+    """Read the saved routing state, or None if there is none or it is unusable"""
+    if not STATE_FILE:
+        return None
+    try:
+        with open(STATE_FILE) as f:
+            text = f.read()
+        state = json.loads(text)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        log.error(f"Ignoring unreadable routing state {STATE_FILE}: {e}")
+        return None
+    if not isinstance(state, dict) or state.get('version') != STATE_VERSION:
+        log.error(f"Ignoring routing state {STATE_FILE} with an unknown format")
+        return None
+    return state
+
+def restore_routing_state():
+    """Restore the saved mode and routes; called on boot before the web server starts.
+
+    The snapshot is read before anything touches the MIDI hardware, then the
+    ports are enumerated once and every saved route whose devices are present
+    is opened with its transform.  Manual routes survive a restart this way,
+    where auto mode on its own would only rebuild its single route.
+    """
+    global manual_mode, saved_state_text
+    started = time.perf_counter()
+    state = load_routing_state()
+    if state is None:
+        return False
+    routes = [route for route in state.get('routes', []) if isinstance(route, dict)]
+    restored = 0
+    with routing_lock:
+        manual_mode = bool(state.get('manual_mode'))
+        snapshot = take_port_snapshot()
+        present = snapshot.input_set | snapshot.output_set
+        connected_usb_devices[:] = [device for device in state.get('connected_usb_devices', []) if device in present]
+        for route in routes:
+            key = (route.get('from'), route.get('to'))
+            if not create_midi_connection(key[0], key[1], route.get('transform'), snapshot=snapshot):
+                log.info(f"Saved route {key[0]} -> {key[1]} not restored")
+                continue
+            connection_log.add(key)
+            if route.get('auto'):
+                auto_connections.add(key)
+            if route.get('manual'):
+                manual_connection_log.add(key)
+            restored += 1
+        # Bring the device lists up to date; auto mode only adds its route if the saved one is gone
+        apply_port_snapshot(snapshot)
+        saved_state_text = json.dumps(build_routing_state(), separators=(',', ':'), sort_keys=True)
+    boot_stats.update(
+        restore_ms=round((time.perf_counter() - started) * 1000, 2),
+        saved_routes=len(routes),
+        restored_routes=restored,
+    )
+    log.info(f"Restored {restored} of {len(routes)} saved routes "
+             f"({'manual' if manual_mode else 'auto'} mode) in {boot_stats['restore_ms']} ms")
+    mark_status_changed()
+    return True
+
+def state_saver():
+    """Write the routing state shortly after it changes, batching bursts of changes"""
+    tune_current_thread('background')
+    while state_saver_running:
+        state_dirty.wait()
+        time.sleep(STATE_SAVE_DELAY)
+        state_dirty.clear()
+        if state_saver_running:
+            save_routing_state()
+
+def start_state_saver():
+    global state_saver_thread, state_saver_running
+    if not STATE_FILE or state_saver_running:
+        return
+    state_saver_running = True
+    state_saver_thread = threading.Thread(target=state_saver, daemon=True)
+    state_saver_thread.start()
+
+def stop_state_saver():
+    """Stop saving and write the final state; call before closing the routes on exit"""
+    global state_saver_running
+    if not state_saver_running:
+        return
+    state_saver_running = False
+    state_dirty.set()
+    state_saver_thread.join(timeout=1)
+    save_routing_state()
+
+def start_engine():
+    """Start the MIDI side of the router; safe to call more than once"""
+    global engine_started, monitor_thread
+    with engine_start_lock:
+        if engine_started:
+            return
+        engine_started = True
+    # Routes come back from the saved state before the monitor's first scan
+    restore_routing_state()
+    start_state_saver()
     # Start the port monitor thread
     monitor_thread = threading.Thread(target=monitor_ports, daemon=True)
     monitor_thread.start()
+
+def make_production_server(host=HTTP_HOST, port=HTTP_PORT, threads=HTTP_THREADS, idle_timeout=HTTP_IDLE_TIMEOUT):
+    """Werkzeug WSGI server that handles requests on a fixed pool of worker threads.
+
+    A worker only picks up a connection once a request has arrived on it.
+    Until then accepted connections wait in a selector on a watcher thread,
+    which closes them after `idle_timeout` seconds, so browser preconnects
+    never hold a worker.  Werkzeug closes every connection after its
+    response, so each connection serves one request.  /events streams never
+    end, so each one gets its own thread instead of a worker.  Every thread
+    is a daemon, and the streams return when the server is closed.
+    """
+    import selectors
+    import socket
+    from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+    class QuietRequestHandler(WSGIRequestHandler):
+        timeout = idle_timeout  # For reading a request that has started to arrive
+
+        def log_request(self, code='-', size='-'):
+            # The dashboard polls constantly, keep access logs out of the journal
+            pass
+
+    class PooledWSGIServer(BaseWSGIServer):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.closing = False
+            self.requests = queue.SimpleQueue()  # Connections with a request to serve; None stops a worker
+            self.parked = queue.SimpleQueue()  # Connections to hand to the idle watcher
+            self.idle = selectors.DefaultSelector()
+            self.wakeup, self.wakeup_sender = socket.socketpair()
+            self.idle.register(self.wakeup, selectors.EVENT_READ)
+            self.workers = [threading.Thread(target=self.worker, name=f'http-{index}', daemon=True)
+                            for index in range(threads)]
+            for worker in self.workers:
+                worker.start()
+            threading.Thread(target=self.watch_idle, name='http-idle', daemon=True).start()
+
+        def process_request(self, request, client_address):
+            # The handler is set up now and run once a request has arrived
+            handler = self.RequestHandlerClass.__new__(self.RequestHandlerClass)
+            handler.request, handler.client_address, handler.server = request, client_address, self
+            handler.setup()
+            self.park(handler)
+
+        def park(self, handler):
+            self.parked.put(handler)
+            self.wakeup_sender.send(b'\0')
+
+        def watch_idle(self):
+            tune_current_thread('background')
+            while not self.closing:
+                now = time.monotonic()
+                for key, events in self.idle.select(timeout=min(1.0, idle_timeout)):
+                    if key.fileobj is self.wakeup:
+                        self.wakeup.recv(4096)
+                    else:
+                        self.idle.unregister(key.fileobj)
+                        self.requests.put(key.data)
+                while True:
+                    try:
+                        handler = self.parked.get_nowait()
+                    except queue.Empty:
+                        break
+                    handler.idle_since = now
+                    self.idle.register(handler.connection, selectors.EVENT_READ, handler)
+                for key in list(self.idle.get_map().values()):
+                    if key.data is not None and now - key.data.idle_since > idle_timeout:
+                        self.idle.unregister(key.fileobj)
+                        self.close_connection(key.data)
+            for key in list(self.idle.get_map().values()):
+                if key.data is not None:
+                    self.close_connection(key.data)
+
+        def worker(self):
+            tune_current_thread('background')
+            while True:
+                handler = self.requests.get()
+                if handler is None:
+                    return
+                self.serve_request(handler)
+
+        def serve_request(self, handler):
+            try:
+                head = handler.rfile.peek(len(b'GET /events'))
+                if not head:
+                    self.close_connection(handler)  # Closed by the client
+                    return
+                if head.startswith(b'GET /events'):
+                    threading.Thread(target=self.serve_stream, args=(handler,), name='http-events', daemon=True).start()
+                    return
+                handler.handle_one_request()
+            except (ConnectionError, socket.timeout):
+                pass
+            except Exception:
+                self.handle_error(handler.request, handler.client_address)
+            self.close_connection(handler)
+
+        def serve_stream(self, handler):
+            tune_current_thread('background')
+            try:
+                handler.handle_one_request()
+            except (ConnectionError, socket.timeout):
+                pass
+            except Exception:
+                self.handle_error(handler.request, handler.client_address)
+            finally:
+                self.close_connection(handler)
+
+        def close_connection(self, handler):
+            try:
+                handler.finish()
+            except OSError:
+                pass
+            self.shutdown_request(handler.request)
+
+        def server_close(self):
+            self.closing = True
+            close_event_streams()
+            for _ in self.workers:
+                self.requests.put(None)
+            self.wakeup_sender.send(b'\0')
+            super().server_close()
+
+    return PooledWSGIServer(host, port, app, handler=QuietRequestHandler)
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+def benchmark_forwarding(count=100000):
+    """Compare the mido Message forwarding path against the raw bytes path.
+
+    Each path feeds an input hub whose only route forces channel 10 onto an
+    unpaced pooled output, so the timing covers dispatch, the transform, the
+    queue and the writer.  For the allocation figures the writer is held on
+    its first message, so everything queued after it is still alive when
+    memory is compared: they count the objects a message keeps until it is
+    sent (the transformed copy, the queue entry and, on the Message path,
+    the mido Message).
+    """
+    import tracemalloc
+
+    transform = compile_transform(parse_transform('channel10'))
+    templates = [
+        mido.Message('note_on', channel=0, note=60, velocity=100),
+        mido.Message('note_off', channel=0, note=60, velocity=0),
+        mido.Message('control_change', channel=3, control=1, value=64),
+        mido.Message('clock'),
+    ]
+    messages = [templates[i % len(templates)] for i in range(count)]
+
+    def message_path(hub, events):
+        for message in events:
+            hub.dispatch(message)
+
+    def raw_path(hub, events):
+        for message_data in events:
+            hub.dispatch_bytes((message_data, 0.0))
+
+    def make_route(hold=None):
+        port = BenchmarkPort(record=False, hold=hold)
+        output = PooledOutput('benchmark-output', port=port, bytes_per_second=0, max_queue=count + 1)
+        output.coalesce = False  # Every message is sent, as on an output that keeps up
+        hub = InputHub('benchmark-input', port=BenchmarkPort(record=False))
+        hub.add_route(('benchmark-input', 'benchmark-output'), output, transform, RouteMetrics())
+        return hub, output, port
+
+    results = {}
+    for name, path, make_input in (
+        ('message', message_path, lambda: messages),
+        ('raw_bytes', raw_path, lambda: [message.bytes() for message in messages]),
+    ):
+        events = make_input()
+        hub, output, port = make_route()
+        expected = sum(len(message.bytes()) for message in messages)
+        started = time.perf_counter()
+        path(hub, events)
+        while port.sent_bytes < expected and time.perf_counter() - started < 30:
+            time.sleep(0.0005)
+        elapsed = time.perf_counter() - started
+        output.close()
+
+        events = make_input()
+        hold = threading.Event()
+        hub, output, port = make_route(hold)
+        hub.dispatch_bytes(([0x90, 60, 100], 0.0))
+        while output.queue_depth():
+            time.sleep(0.001)  # The writer took it and is waiting in the send
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        path(hub, events)
+        after = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        hold.set()
+        output.close()
+        blocks = sum(stat.count_diff for stat in after.compare_to(before, 'filename'))
+        results[name] = {
+            'messages_per_second': round(count / elapsed),
+            'us_per_message': round(elapsed / count * 1e6, 3),
+            'allocations_per_message': round(blocks / count, 2),
+        }
+    return results
+
+def benchmark_metrics(count=200000):
+    """Measure the per-message cost of recording route metrics"""
+    stats = RouteMetrics()
+    latencies = [(i * 7919) % 20000000 for i in range(1000)]
+    started = time.perf_counter_ns()
+    for i in range(count):
+        stats.observe(3, latencies[i % 1000])
+    elapsed = time.perf_counter_ns() - started
+    # The writer also reads the clock once per message
+    clock_started = time.perf_counter_ns()
+    for _ in range(count):
+        time.perf_counter_ns()
+    clock_elapsed = time.perf_counter_ns() - clock_started
+    return {
+        'messages': count,
+        'observe_us_per_message': round(elapsed / count / 1000, 3),
+        'clock_us_per_message': round(clock_elapsed / count / 1000, 3),
+        'total_us_per_message': round((elapsed + clock_elapsed) / count / 1000, 3),
+    }
+
+def benchmark_classifier(port_count=300, rounds=20):
+    """Compare the old per-call list scans with the compiled, cached classifier"""
+    rules = DEFAULT_CLASSIFIER_RULES
+
+    def legacy_classify(port_name):
+        port_lower = port_name.lower()
+        through = any(pattern in port_lower for pattern in rules['through_patterns'])
+        usb = not through and (
+            any(pattern.lower() in port_lower for pattern in rules['usb_patterns'])
+            or any(manufacturer in port_lower for manufacturer in rules['manufacturers'])
+        )
+        return DeviceClass(usb, through, 'rtmidi' not in port_lower and (usb or through))
+
+    vendors = ['Arturia KeyStep', 'Roland A-49', 'Korg nanoKONTROL2', 'Focusrite Scarlett', 'Generic Device',
+               'Midi Through', 'RtMidiIn Client', 'Elektron Digitakt', 'Behringer TD-3', 'Some Audio Card']
+    port_names = [f"{vendors[i % len(vendors)]} {i}:MIDI {i % 4} {20 + i}:{i % 4}" for i in range(port_count)]
+    lookups = port_names * rounds
+    compiled = DeviceClassifier(rules)
+    assert [compiled.classify(name) for name in port_names] == [legacy_classify(name) for name in port_names]
+
+    results = {'port_names': port_count, 'lookups': len(lookups)}
+    for name, classify in (
+        ('legacy_lists', legacy_classify),
+        ('compiled_uncached', compiled._classify),
+        ('compiled_cached', DeviceClassifier(rules).classify),
+    ):
+        started = time.perf_counter()
+        for port_name in lookups:
+            classify(port_name)
+        elapsed = time.perf_counter() - started
+        results[name] = {'us_per_lookup': round(elapsed / len(lookups) * 1e6, 3)}
+    return results
+
+def benchmark_http(clients=20, requests_per_client=100):
+    """Startup time and /status latency with concurrent clients for both server modes.
+
+    'development' is the threaded werkzeug server that app.run() uses (without
+    the reloader), 'production' the pooled server.  Both close the connection
+    after every response, so each request opens a new one.
+    """
+    import http.client
+    from werkzeug.serving import make_server
+
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)  # No access log lines
+    results = {'clients': clients, 'requests_per_client': requests_per_client}
+    for mode in ('development', 'production'):
+        started = time.perf_counter()
+        if mode == 'development':
+            server = make_server('127.0.0.1', 0, app, threaded=True)
+        else:
+            server = make_production_server('127.0.0.1', 0)
+        port = server.server_port
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+        connection.request('GET', '/status')
+        connection.getresponse().read()
+        connection.close()
+        startup_ms = (time.perf_counter() - started) * 1000
+
+        latencies = []
+        barrier = threading.Barrier(clients)
+
+        def client():
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+            timings = []
+            barrier.wait()
+            for _ in range(requests_per_client):
+                request_started = time.perf_counter()
+                connection.request('GET', '/status')
+                connection.getresponse().read()
+                timings.append(time.perf_counter() - request_started)
+            connection.close()
+            latencies.extend(timings)
+
+        run_started = time.perf_counter()
+        workers = [threading.Thread(target=client) for _ in range(clients)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - run_started
+        server.shutdown()
+        server.server_close()
+        results[mode] = {
+            'startup_ms': round(startup_ms, 2),
+            'requests_per_second': round(len(latencies) / elapsed),
+            'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+            'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+        }
+    return results
+
+def benchmark_transforms(count=200000, rounds=5):
+    """Cost per raw message of a compiled transform as stages are added (best of `rounds`)"""
+    events = []
+    for i in range(count):
+        kind = i % 4
+        if kind == 0:
+            events.append([0x90 | i % 16, 30 + i % 80, 1 + i % 127])
+        elif kind == 1:
+            events.append([0x80 | i % 16, 30 + i % 80, 0])
+        elif kind == 2:
+            events.append([0xB0 | i % 16, 1, i % 128])
+        else:
+            events.append([0xF8])
+    stages = (
+        ('channel_map', {'channel_map': {'1': 10, '2': 10, '3': 11}}),
+        ('transpose', {'transpose': 12}),
+        ('split', {'split': [36, 96]}),
+        ('velocity_curve', {'velocity_curve': 'soft'}),
+    )
+    results = {}
+    spec = {}
+    names = []
+    for name, stage in (('none', {}),) + stages:
+        spec = dict(spec, **stage)
+        if stage:
+            names.append(name)
+        transform = compile_transform(parse_transform(spec))
+        apply = transform.apply_bytes if transform is not None else None
+        elapsed = None
+        for _ in range(rounds):
+            sink = []
+            started = time.perf_counter_ns()
+            if apply is None:
+                for data in events:
+                    sink.append(data)
+            else:
+                for data in events:
+                    sink.append(apply(data))
+            elapsed = min(elapsed or math.inf, time.perf_counter_ns() - started)
+        results['+'.join(names) or name] = {
+            'us_per_message': round(elapsed / count / 1000, 3),
+            'dropped': sink.count(None),
+        }
+    return results
+
+class BenchmarkPort:
+    """Stand-in output port that records when each message list was sent"""
+
+    def __init__(self, record=True, hold=None):
+        self._rt = self  # Looks like an rtmidi port to PooledOutput
+        self.record = record
+        self.hold = hold  # Event every send waits for, to stand in for a stalled device
+        self.sent = {}
+        self.sent_bytes = 0
+
+    def send_message(self, data):
+        if self.hold is not None:
+            self.hold.wait()
+        self.sent_bytes += len(data)
+        if self.record:
+            self.sent[id(data)] = time.perf_counter_ns()
+
+    def send(self, message):
+        self.send_message(message.bytes())  # What mido's rtmidi ports do
+
+    def close(self):
+        pass
+
+def reset_peak_rss():
+    """Reset the kernel's peak RSS counter for this process, if it lets us"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def benchmark_output_scheduler(duration=1.0, bends_per_ms=2, note_interval=0.05):
+    """Note latency on a DIN-speed output flooded with a pitch bend sweep.
+
+    The sweep alone needs about twice the wire's bandwidth.  It is run with
+    coalescing on and off; notes overtake the sweep either way, but without
+    coalescing the pitch bend backlog keeps growing for as long as the sweep
+    lasts.
+    """
+    results = {}
+    for coalesce in (True, False):
+        port = BenchmarkPort()
+        output = PooledOutput('benchmark', port=port, bytes_per_second=3125)
+        output.coalesce = coalesce
+        notes = []
+        started = time.perf_counter()
+        next_note = started
+        value = 0
+        while time.perf_counter() - started < duration:
+            for _ in range(bends_per_ms):
+                value = (value + 97) % 16384
+                output.send_bytes([0xE0, value & 0x7F, value >> 7], time.perf_counter_ns())
+            if time.perf_counter() >= next_note:
+                note = [0x91, 60, 100]
+                received = time.perf_counter_ns()
+                notes.append((note, received))
+                output.send_bytes(note, received)
+                next_note += note_interval
+            time.sleep(0.001)
+        deadline = time.perf_counter() + 10
+        while output.queue_depth() and time.perf_counter() < deadline:
+            time.sleep(0.01)
+        output.close()
+        latencies = [(port.sent[id(note)] - received) / 1e6 for note, received in notes if id(note) in port.sent]
+        results['coalescing' if coalesce else 'no_coalescing'] = {
+            'notes': len(notes),
+            'note_p50_ms': round(percentile(latencies, 50), 2),
+            'note_p99_ms': round(percentile(latencies, 99), 2),
+            'coalesced': output.coalesced,
+            'max_queue_depth': output.max_depth,
+            'wire_bytes': output.wire_bytes,
+        }
+    return results
+
+def benchmark_clock(duration=2.0, bpm=120):
+    """MIDI clock jitter on a DIN-speed output that is also flooded with notes and CC.
+
+    Clocks are sent at `bpm` through the realtime fast lane and, for
+    comparison, through the output queue like any other message.
+    """
+    interval_ns = int(60e9 / (24 * bpm))
+    results = {}
+    for lane in ('fast_lane', 'queued'):
+        port = BenchmarkPort()
+        output = PooledOutput('benchmark', port=port, bytes_per_second=3125)
+        metrics = RouteMetrics()
+        flooding = True
+
+        def flood():
+            i = 0
+            while flooding:
+                output.send_bytes([0x90, 36 + i % 48, 100], time.perf_counter_ns())
+                output.send_bytes([0xB0, 74, i % 128], time.perf_counter_ns())
+                i += 1
+                time.sleep(0.0005)
+
+        flood_thread = threading.Thread(target=flood, daemon=True)
+        flood_thread.start()
+        clocks = []
+        next_clock = time.perf_counter_ns()
+        end = next_clock + int(duration * 1e9)
+        while next_clock < end:
+            while time.perf_counter_ns() < next_clock:
+                time.sleep(0.0002)
+            clock = [0xF8]
+            received = time.perf_counter_ns()
+            clocks.append((clock, received))
+            if lane == 'fast_lane':
+                output.send_now(clock, received, metrics)
+            else:
+                output.send_bytes(clock, received)
+            next_clock += interval_ns
+        flooding = False
+        flood_thread.join()
+        output.close()
+        stats = ClockStats()
+        for clock, received in clocks:
+            if id(clock) in port.sent:
+                stats.observe(1, received, port.sent[id(clock)], True)
+        summary = stats.summary()
+        results[lane] = {
+            'clocks': summary['clocks'],
+            'input_bpm': round(summary['input_bpm'], 3),
+            'output_bpm': round(summary['output_bpm'], 3),
+            'jitter_p50_us': round(summary['jitter_p50_ns'] / 1000, 1),
+            'jitter_p99_us': round(summary['jitter_p99_ns'] / 1000, 1),
+            'jitter_max_us': round(summary['jitter_max_ns'] / 1000, 1),
+            'mean_latency_us': round(summary['mean_latency_ns'] / 1000, 1),
+        }
+    return results
+
+def benchmark_sysex(sizes_mb=(1, 10), packet_size=256, bytes_per_second=4000000):
+    """Stream SysEx dumps through a pooled output and report MB/s and peak RSS.
+
+    A dump is a run of `packet_size` SysEx messages generated on the fly,
+    sent to an output paced at `bytes_per_second` so the sender outruns it.
+    'streamed' uses the SysEx buffer limit, 'buffered' queues the whole
+    dump the way an unbounded queue would.
+    """
+    payload = [0x42] * (packet_size - 2)
+    results = {}
+    for size_mb in sizes_mb:
+        packets = size_mb * 1024 * 1024 // packet_size
+        for mode in ('streamed', 'buffered'):
+            import gc
+            gc.collect()
+            reset_peak_rss()
+            baseline = peak_rss_mb()
+            port = BenchmarkPort(record=False)
+            if mode == 'streamed':
+                output = PooledOutput('benchmark', port=port, bytes_per_second=bytes_per_second)
+            else:
+                output = PooledOutput('benchmark', port=port, bytes_per_second=bytes_per_second,
+                                      max_queue=packets + 1, sysex_buffer=0)
+            started = time.perf_counter()
+            for _ in range(packets):
+                output.send_bytes([0xF0] + payload + [0xF7], time.perf_counter_ns())
+            while output.queue_depth():
+                time.sleep(0.001)
+            output.close()
+            elapsed = time.perf_counter() - started
+            results[f"{size_mb}mb_{mode}"] = {
+                'mb_per_second': round(port.sent_bytes / elapsed / 1024 / 1024, 2),
+                'peak_rss_growth_mb': round(peak_rss_mb() - baseline, 1),
+                'sender_waits': output.sysex_waits,
+                'dropped': sum(output.dropped),
+            }
+    return results
+
+class SampledRouteMetrics(RouteMetrics):
+    """RouteMetrics that also keeps every latency, for percentiles in benchmarks"""
+    __slots__ = ('samples',)
+
+    def __init__(self):
+        super().__init__()
+        self.samples = []
+
+    def observe(self, size, latency_ns):
+        super().observe(size, latency_ns)
+        self.samples.append(latency_ns)
+
+    def observe_realtime(self, size, received, sent, clock):
+        super().observe_realtime(size, received, sent, clock)
+        self.samples.append(sent - received)
+
+def load_pattern(name):
+    """Return a function that builds message i of a reproducible traffic pattern"""
+    def note_burst(i):
+        # Eight-note chords struck and released on channel 1
+        step = i % 16
+        return [0x90 if step < 8 else 0x80, 48 + (step % 8) * 3, 100 if step < 8 else 0]
+
+    def cc_sweep(i):
+        return [0xB0, 74, i % 128]
+
+    def clock(i):
+        return [0xF8]
+
+    def sysex(i):
+        return [0xF0, 0x7D] + [i % 128] * 28 + [0xF7]
+
+    def mixed(i):
+        # Mostly notes and controllers with clock and the odd SysEx packet
+        if i % 100 == 99:
+            return sysex(i)
+        step = i % 10
+        if step < 6:
+            return note_burst(i)
+        if step < 9:
+            return cc_sweep(i)
+        return clock(i)
+
+    return {'note_burst': note_burst, 'cc_sweep': cc_sweep, 'clock': clock, 'sysex': sysex, 'mixed': mixed}[name]
+
+def run_load_case(rate, route_count, pattern, duration):
+    """Feed one input hub at `rate` messages per second fanned out to `route_count` outputs"""
+    import gc
+    make_message = load_pattern(pattern)
+    hub = InputHub('load-input', port=BenchmarkPort(record=False))
+    transform = compile_transform(DEFAULT_TRANSFORM)
+    outputs = []
+    for index in range(route_count):
+        # Unpaced outputs: this measures the router, not a DIN wire
+        output = PooledOutput(f'load-output-{index}', port=BenchmarkPort(record=False), bytes_per_second=0)
+        metrics = SampledRouteMetrics()
+        hub.add_route(('load-input', output.port_name), output, transform, metrics)
+        outputs.append((output, metrics))
+    gc.collect()
+    reset_peak_rss()
+    cpu_started = time.process_time()
+    started = time.perf_counter()
+    per_tick = max(1, round(rate / 1000))
+    tick = per_tick / rate
+    sent = 0
+    next_tick = started
+    deadline = started + duration
+    while next_tick < deadline:
+        for _ in range(per_tick):
+            hub.dispatch_bytes((make_message(sent), 0.0))
+            sent += 1
+        next_tick += tick
+        delay = next_tick - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+    offered_elapsed = time.perf_counter() - started
+    drain_deadline = time.perf_counter() + 10
+    while any(output.queue_depth() for output, metrics in outputs) and time.perf_counter() < drain_deadline:
+        time.sleep(0.001)
+    elapsed = time.perf_counter() - started
+    cpu = time.process_time() - cpu_started
+    for output, metrics in outputs:
+        output.close()
+    latencies = [sample for output, metrics in outputs for sample in metrics.samples]
+    delivered = len(latencies)
+
+    def latency_ms(pct):
+        value = percentile(latencies, pct)
+        return round(value / 1e6, 3) if value is not None else None
+
+    return {
+        'pattern': pattern,
+        'target_rate': rate,
+        'routes': route_count,
+        'offered_per_second': round(sent / offered_elapsed),
+        'sent_per_second': round(delivered / elapsed),  # Summed over all routes
+        'coalesced': sum(output.coalesced for output, metrics in outputs),
+        'dropped': sum(metrics.dropped for output, metrics in outputs),
+        'p50_ms': latency_ms(50),
+        'p99_ms': latency_ms(99),
+        'p999_ms': latency_ms(99.9),
+        'cpu_percent': round(cpu / elapsed * 100, 1),
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+    }
+
+def benchmark_load(duration=1.0, rates=(1000, 10000, 50000), route_counts=(1, 8, 32),
+                   patterns=('note_burst', 'cc_sweep', 'clock', 'sysex')):
+    """Synthetic load on the forwarding engine.
+
+    Runs the mixed pattern at every rate and route count, then each single
+    pattern at 10k messages/s over 8 routes.  Messages are fed to the input
+    hub the way the rtmidi callback would, so dispatch, transforms, the
+    output queues and the writer threads are all measured; offered rates
+    above what one Python thread can dispatch show up as a lower
+    offered_per_second.
+    """
+    cases = [(rate, routes, 'mixed') for rate in rates for routes in route_counts]
+    cases += [(10000, 8, pattern) for pattern in patterns]
+    return {
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'engine': FORWARDING_ENGINE,
+        'duration_s': duration,
+        'cases': [run_load_case(rate, routes, pattern, duration) for rate, routes, pattern in cases],
+    }
+
+def benchmark_loopback(count=20000, rate=10000):
+    """End to end on the loopback backend: hotplug, auto-connect and forwarding.
+
+    A keyboard and then a synth are plugged in, and auto mode has to route
+    the first device plugged to the second.  Notes are injected into the
+    keyboard at `rate` per second and captured on the synth, whose output
+    is left unpaced, and finally the synth is unplugged again.
+    """
+    global midi_backend, monitor_running
+
+    def wait_until(predicate, timeout=5.0):
+        deadline = time.perf_counter() + timeout
+        while not predicate():
+            if time.perf_counter() > deadline:
+                raise RuntimeError("Timed out waiting for the router")
+            time.sleep(0.0005)
+        return time.perf_counter()
+
+    backend = midi_backend = LoopbackMidiBackend()
+    monitor = threading.Thread(target=monitor_ports, daemon=True)
+    monitor.start()
+    route = ('Loopback Keyboard', 'Loopback Synth')
+    try:
+        backend.plug(route[0])
+        wait_until(lambda: route[0] in connected_usb_devices)
+        plugged = time.perf_counter()
+        synth = backend.plug(route[1])
+        routed = wait_until(lambda: route in active_midi_connections)
+        already_sent = len(synth.sent)
+
+        injected = []
+        next_tick = time.perf_counter()
+        per_tick = max(1, rate // 1000)
+        for i in range(count):
+            if i % per_tick == 0:
+                next_tick += per_tick / rate
+                delay = next_tick - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            injected.append(time.perf_counter_ns())
+            backend.inject(route[0], [0x90 if i % 2 == 0 else 0x80, 36 + i % 48, 100 if i % 2 == 0 else 0])
+        wait_until(lambda: len(synth.sent) >= already_sent + count, timeout=30)
+        sent_times = [sent for sent, data in list(synth.sent)[already_sent:already_sent + count]]
+        latencies = [sent - received for sent, received in zip(sent_times, injected)]
+
+        unplugged = time.perf_counter()
+        backend.unplug(route[1])
+        closed = wait_until(lambda: route not in active_midi_connections)
+        return {
+            'backend': backend.name,
+            'engine': FORWARDING_ENGINE,
+            'route': list(route),
+            'plug_to_route_ms': round((routed - plugged) * 1000, 2),
+            'messages': count,
+            'messages_per_second': round(count / ((sent_times[-1] - injected[0]) / 1e9)),
+            'p50_us': round(percentile(latencies, 50) / 1000, 1),
+            'p99_us': round(percentile(latencies, 99) / 1000, 1),
+            'unplug_to_close_ms': round((closed - unplugged) * 1000, 2),
+        }
+    finally:
+        monitor_running = False
+        if hotplug_backend is not None:
+            hotplug_backend.stop()
+        monitor.join(timeout=1)
+        close_all_midi_connections()
+
+def benchmark_boot():
+    """Boot from a saved routing state to the first routed note, on the loopback backend.
+
+    A state file with two manual routes, one of them transposed, is written
+    and the devices are plugged in as if they were present at power-on.  The
+    engine is then started exactly as on boot and a note is played as soon
+    as start_engine() returns.  Times since process start come from /proc.
+    """
+    global midi_backend, monitor_running, STATE_FILE
+    import tempfile
+    directory = tempfile.mkdtemp()
+    STATE_FILE = os.path.join(directory, 'state.json')
+    routes = [
+        {'from': 'Loopback Keyboard', 'to': 'Loopback Synth', 'transform': 'none', 'auto': False, 'manual': True},
+        {'from': 'Loopback Keyboard', 'to': 'Loopback Drums', 'transform': {'transpose': -12}, 'auto': False, 'manual': True},
+    ]
+    with open(STATE_FILE, 'w') as f:
+        json.dump({'version': STATE_VERSION, 'manual_mode': True,
+                   'connected_usb_devices': ['Loopback Keyboard', 'Loopback Synth', 'Loopback Drums'],
+                   'routes': routes}, f)
+
+    backend = midi_backend = LoopbackMidiBackend()
+    for name in ('Loopback Keyboard', 'Loopback Synth', 'Loopback Drums'):
+        backend.plug(name)
+    synth = backend.device('Loopback Synth')
+    try:
+        started = time.perf_counter()
+        start_engine()
+        engine_ready = time.perf_counter()
+        backend.inject('Loopback Keyboard', [0x90, 60, 100])
+        deadline = engine_ready + 5
+        while not synth.sent:
+            if time.perf_counter() > deadline:
+                raise RuntimeError("Timed out waiting for the first routed note")
+            time.sleep(0.0001)
+        first_note = time.perf_counter()
+
+        # A change is written through the saver; time one atomic write on its own too
+        create_midi_connection('Loopback Keyboard', 'Loopback Synth', {'transpose': 12})
+        save_started = time.perf_counter()
+        save_routing_state()
+        save_ms = (time.perf_counter() - save_started) * 1000
+        return {
+            'backend': backend.name,
+            'saved_routes': boot_stats['saved_routes'],
+            'restored_routes': boot_stats['restored_routes'],
+            'restore_ms': boot_stats['restore_ms'],
+            'start_engine_ms': round((engine_ready - started) * 1000, 2),
+            'engine_start_to_first_note_ms': round((first_note - started) * 1000, 2),
+            'process_start_to_first_note_ms': boot_stats['first_routed_ms'],
+            'save_ms': round(save_ms, 2),
+            'state_bytes': os.path.getsize(STATE_FILE),
+        }
+    finally:
+        monitor_running = False
+        if hotplug_backend is not None:
+            hotplug_backend.stop()
+        stop_state_saver()
+        close_all_midi_connections()
+        for name in os.listdir(directory):
+            os.remove(os.path.join(directory, name))
+        os.rmdir(directory)
+
+def benchmark_web(count=500):
+    """Serving the web GUI: rendering HTML_TEMPLATE per request against the prebuilt assets.
+
+    Reports the server time per page load, the size of the rendered page
+    and the bytes a first visit and a reload transfer with the prebuilt
+    assets.  The old page also loaded the Tailwind compiler and web fonts
+    from CDNs, which are not counted here.  First paint can only be
+    measured in a browser, which reports it under 'web' in /status.
+    """
+    from flask import render_template_string
+    global web_assets
+    web_assets = None
+    started = time.perf_counter()
+    assets = get_web_assets()
+    build_ms = (time.perf_counter() - started) * 1000
+    page = assets['/']
+    headers = {'Accept-Encoding': 'br, gzip'}
+
+    with app.test_request_context('/', headers=headers):
+        old_page = render_template_string(HTML_TEMPLATE).encode()
+        started = time.perf_counter()
+        for _ in range(count):
+            render_template_string(HTML_TEMPLATE)
+        render_us = (time.perf_counter() - started) / count * 1e6
+        encoding = send_web_asset(page).headers.get('Content-Encoding', 'identity')
+        started = time.perf_counter()
+        for _ in range(count):
+            send_web_asset(page)
+        serve_us = (time.perf_counter() - started) / count * 1e6
+    with app.test_request_context('/', headers=dict(headers, **{'If-None-Match': f'"{page.etag}-{encoding}"'})):
+        reload_status = send_web_asset(page).status_code
+
+    return {
+        'build_ms': round(build_ms, 2),
+        'encoding': encoding,
+        'render_template_us': round(render_us, 1),
+        'prebuilt_us': round(serve_us, 1),
+        'rendered_page_bytes': len(old_page),
+        'first_visit_bytes': sum(len(asset.bodies[encoding]) for asset in assets.values()),
+        'reload_status': reload_status,
+        'reload_bytes': 0 if reload_status == 304 else len(page.bodies[encoding]),
+    }
+
+BENCHMARKS = {
+    'forwarding': benchmark_forwarding,
+    'transforms': benchmark_transforms,
+    'output_scheduler': benchmark_output_scheduler,
+    'clock': benchmark_clock,
+    'sysex': benchmark_sysex,
+    'load': benchmark_load,
+    'loopback': benchmark_loopback,
+    'boot': benchmark_boot,
+    'metrics': benchmark_metrics,
+    'classifier': benchmark_classifier,
+    'http': benchmark_http,
+    'web': benchmark_web,
+}
+
+def run_benchmark(name, output=None):
+    """Print a benchmark's results as JSON and, if `output` is given, save them there too"""
+    results = json.dumps({name: BENCHMARKS[name](), 'time': time.strftime('%Y-%m-%dT%H:%M:%S')}, indent=2)
+    print(results)
+    if output:
+        with open(output, 'w') as f:
+            f.write(results + '\n')
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='MIDI Router with web GUI')
+    parser.add_argument('--benchmark', choices=sorted(BENCHMARKS), help='run a benchmark and exit')
+    parser.add_argument('--output', help='also save the benchmark results to this JSON file')
+    args = parser.parse_args()
+    if args.benchmark:
+        run_benchmark(args.benchmark, args.output)
+        sys.exit(0)
+
+    setup_logging()
     
     # Register cleanup function
     import atexit
@@ -1174,10 +4808,40 @@ if __name__ == '__main__':
     def cleanup():
         global monitor_running
         monitor_running = False
+        if hotplug_backend is not None:
+            hotplug_backend.stop()
+        # Save before the routes are closed, or the saved state would be empty
+        stop_state_saver()
         close_all_midi_connections()
+        if log_listener is not None:
+            log_listener.stop()
     
     atexit.register(cleanup)
+
+    def handle_sigterm(signum, frame):
+        # systemd stops the service with SIGTERM; exiting through SystemExit
+        # runs cleanup, which removes the kernel routes
+        sys.exit(0)
+
+    signal.signal(signal.SIGTERM, handle_sigterm)
     
-    print("MIDI Router started with auto-connect and manual mode toggle.")
-    app.run(debug=True, host='0.0.0.0', port=5050)
+    if SERVER_MODE == 'development':
+        # The reloader re-runs this script in a child process that does the
+        # serving; only that process may open MIDI ports
+        if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+            start_engine()
+        log.info("MIDI Router started with auto-connect and manual mode toggle (development server).")
+        app.run(debug=True, host=HTTP_HOST, port=HTTP_PORT)
+    else:
+        start_engine()
+        get_web_assets()  # Build the GUI assets before the first page load
+        server = make_production_server()
+        log.info(f"MIDI Router started with auto-connect and manual mode toggle on {HTTP_HOST}:{HTTP_PORT} "
+                 f"({HTTP_THREADS} HTTP worker threads).")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
 
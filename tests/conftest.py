@@ -0,0 +1,36 @@
+import importlib.util
+import pathlib
+import time
+
+import pytest
+
+ROUTER_PATH = pathlib.Path(__file__).resolve().parent.parent / 'new working most recent midi router with header title middle.py'
+
+
+@pytest.fixture
+def router(monkeypatch):
+    """A freshly loaded router module on the loopback backend, with state saving off"""
+    monkeypatch.setenv('MIDI_ROUTER_BACKEND', 'loopback')
+    monkeypatch.setenv('MIDI_ROUTER_STATE_FILE', '')
+    spec = importlib.util.spec_from_file_location('midi_router', ROUTER_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    yield module
+    module.close_all_midi_connections()
+
+
+@pytest.fixture
+def loopback(router):
+    return router.get_midi_backend()
+
+
+@pytest.fixture
+def wait_until():
+    """Wait for a background thread (usually an output writer) to make a predicate true"""
+    def wait(predicate, timeout=2.0):
+        deadline = time.monotonic() + timeout
+        while not predicate():
+            if time.monotonic() > deadline:
+                raise AssertionError("Timed out waiting for the router")
+            time.sleep(0.001)
+    return wait
@@ -0,0 +1,62 @@
+"""The port monitor driven by a fake hotplug event source"""
+import threading
+
+import pytest
+
+KEYBOARD = 'Loopback Keyboard'
+SYNTH = 'Loopback Synth'
+
+
+@pytest.fixture
+def hotplug(router, wait_until):
+    """A plain HotplugBackend the test notifies by hand, with the monitor thread running on it"""
+    source = router.HotplugBackend()
+    source.name = 'fake'
+    source.settle_time = 0.05
+    router.hotplug_backend = source
+    monitor = threading.Thread(target=router.monitor_ports, daemon=True)
+    monitor.start()
+    wait_until(lambda: router.port_enumeration_stats['total'] >= 1)  # The initial scan
+    yield source
+    router.monitor_running = False
+    source.stop()
+    monitor.join(timeout=2)
+
+
+def test_event_creates_the_auto_route_and_records_the_latency(router, loopback, hotplug, wait_until):
+    assert router.hotplug_stats['backend'] == 'fake'
+    loopback.plug(KEYBOARD)
+    loopback.plug(SYNTH)
+
+    hotplug.notify('keyboard plugged')
+    hotplug.notify('synth plugged')
+
+    wait_until(lambda: (KEYBOARD, SYNTH) in router.active_midi_connections)
+    # Both events were coalesced into one rescan, timed from the first of them
+    assert router.hotplug_stats['changes'] == 1
+    assert router.hotplug_stats['last_reason'] == 'keyboard plugged'
+    assert router.hotplug_stats['last_latency_ms'] >= 50
+
+
+def test_unplug_event_closes_the_route(router, loopback, hotplug, wait_until):
+    loopback.plug(KEYBOARD)
+    loopback.plug(SYNTH)
+    hotplug.notify('plugged')
+    wait_until(lambda: (KEYBOARD, SYNTH) in router.active_midi_connections)
+
+    loopback.unplug(SYNTH)
+    hotplug.notify('synth unplugged')
+
+    wait_until(lambda: not router.active_midi_connections)
+    wait_until(lambda: router.hotplug_stats['changes'] == 2)
+    assert router.hotplug_stats['last_reason'] == 'synth unplugged'
+
+
+def test_devices_found_in_one_scan_keep_the_backend_order(router, loopback):
+    loopback.plug(SYNTH)
+    loopback.plug(KEYBOARD)
+
+    router.update_port_list()
+
+    assert router.connected_usb_devices == [SYNTH, KEYBOARD]
+    assert set(router.active_midi_connections) == {(SYNTH, KEYBOARD)}
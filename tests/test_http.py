@@ -0,0 +1,50 @@
+"""The production web server's worker pool"""
+import http.client
+import socket
+import threading
+
+import pytest
+
+
+@pytest.fixture
+def server(router):
+    server = router.make_production_server('127.0.0.1', 0, threads=1, idle_timeout=0.2)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def get_status(port):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+    connection.request('GET', '/status')
+    response = connection.getresponse()
+    response.read()
+    connection.close()
+    return response
+
+
+def test_idle_connection_does_not_hold_the_only_worker(server):
+    idle = socket.create_connection(('127.0.0.1', server.server_port))
+
+    response = get_status(server.server_port)
+
+    assert response.status == 200
+    assert response.getheader('Connection') == 'close'
+    idle.close()
+
+
+def test_idle_connection_is_closed_after_the_timeout(server):
+    idle = socket.create_connection(('127.0.0.1', server.server_port), timeout=5)
+
+    assert idle.recv(1) == b''  # Closed by the server without a response
+    idle.close()
+
+
+def test_event_stream_does_not_hold_the_only_worker(server):
+    stream = socket.create_connection(('127.0.0.1', server.server_port), timeout=5)
+    stream.sendall(b'GET /events HTTP/1.1\r\nHost: localhost\r\n\r\n')
+    assert stream.recv(15).startswith(b'HTTP/1.')
+
+    assert get_status(server.server_port).status == 200
+    stream.close()
@@ -0,0 +1,187 @@
+"""Coalescing and overflow policies of the pooled output queue"""
+import importlib.util
+import threading
+import time
+
+import pytest
+
+
+class StalledPort:
+    """Output port whose sends wait until released, recording what was sent"""
+
+    def __init__(self):
+        self._rt = self  # Sent through send_message() like an rtmidi port
+        self.released = threading.Event()
+        self.sent = []
+
+    def send_message(self, data):
+        self.released.wait()
+        self.sent.append(list(data))
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def stalled_output(router, wait_until):
+    """Return a function that makes an output whose writer is stuck sending a first note"""
+    outputs = []
+
+    def make(**options):
+        port = StalledPort()
+        output = router.PooledOutput('test', port=port, bytes_per_second=0, **options)
+        output.send_bytes([0x90, 1, 1])
+        wait_until(lambda: output.queue_depth() == 0)  # Taken by the writer, which is now waiting
+        outputs.append(output)
+        return output, port
+
+    yield make
+    for output in outputs:
+        output.port.released.set()
+        output.close()
+
+
+def drain(output, port):
+    port.released.set()
+    output.close()
+    return port.sent[1:]  # Without the note the writer was stuck on
+
+
+def test_newer_controller_and_pitch_bend_values_replace_waiting_ones(stalled_output):
+    output, port = stalled_output()
+
+    output.send_bytes([0xE0, 0, 0x40])
+    output.send_bytes([0xB0, 7, 10])
+    output.send_bytes([0xE0, 0, 0x41])
+    output.send_bytes([0xB0, 7, 20])
+
+    assert output.queue_depth() == 2
+    assert output.coalesced == 2
+    assert drain(output, port) == [[0xE0, 0, 0x41], [0xB0, 7, 20]]
+
+
+def test_values_on_other_channels_and_controllers_are_kept(stalled_output):
+    output, port = stalled_output()
+
+    output.send_bytes([0xB0, 7, 10])
+    output.send_bytes([0xB1, 7, 10])
+    output.send_bytes([0xB0, 10, 10])
+
+    assert output.coalesced == 0
+    assert drain(output, port) == [[0xB0, 7, 10], [0xB1, 7, 10], [0xB0, 10, 10]]
+
+
+def test_switch_controllers_and_notes_are_never_merged(stalled_output):
+    output, port = stalled_output()
+
+    output.send_bytes([0xB0, 64, 127])
+    output.send_bytes([0xB0, 64, 0])
+    output.send_bytes([0x90, 60, 100])
+    output.send_bytes([0x90, 60, 0])
+
+    assert output.coalesced == 0
+    assert drain(output, port) == [[0x90, 60, 100], [0x90, 60, 0], [0xB0, 64, 127], [0xB0, 64, 0]]
+
+
+def test_coalescing_can_be_turned_off(stalled_output):
+    output, port = stalled_output()
+    output.coalesce = False
+
+    output.send_bytes([0xE0, 0, 0x40])
+    output.send_bytes([0xE0, 0, 0x41])
+
+    assert output.coalesced == 0
+    assert drain(output, port) == [[0xE0, 0, 0x40], [0xE0, 0, 0x41]]
+
+
+def test_drop_oldest_drops_the_oldest_message_of_any_class(stalled_output):
+    output, port = stalled_output(max_queue=2, overflow='drop-oldest')
+
+    output.send_bytes([0xB0, 64, 127])
+    output.send_bytes([0x90, 60, 100])
+    output.send_bytes([0x90, 62, 100])
+
+    assert output.dropped == [0, 0, 1, 0]
+    assert drain(output, port) == [[0x90, 60, 100], [0x90, 62, 100]]
+
+
+def test_drop_lowest_priority_drops_waiting_control_for_a_note(stalled_output):
+    output, port = stalled_output(max_queue=2, overflow='drop-lowest-priority')
+
+    output.send_bytes([0x90, 60, 100])
+    output.send_bytes([0xB0, 64, 127])
+    output.send_bytes([0x90, 62, 100])
+
+    assert output.dropped == [0, 0, 1, 0]
+    assert drain(output, port) == [[0x90, 60, 100], [0x90, 62, 100]]
+
+
+def test_drop_lowest_priority_drops_a_new_message_of_a_lower_class(stalled_output):
+    output, port = stalled_output(max_queue=2, overflow='drop-lowest-priority')
+
+    output.send_bytes([0x90, 60, 100])
+    output.send_bytes([0x90, 62, 100])
+    output.send_bytes([0xB0, 64, 127])
+
+    assert output.dropped == [0, 0, 1, 0]
+    assert drain(output, port) == [[0x90, 60, 100], [0x90, 62, 100]]
+
+
+def test_block_drops_the_new_message_after_the_timeout(stalled_output):
+    output, port = stalled_output(max_queue=1, overflow='block')
+    output.block_timeout = 0.05
+
+    output.send_bytes([0x90, 60, 100])
+    started = time.monotonic()
+    output.send_bytes([0x90, 62, 100])
+
+    assert time.monotonic() - started >= 0.05
+    assert output.dropped == [0, 1, 0, 0]
+    assert drain(output, port) == [[0x90, 60, 100]]
+
+
+def test_block_waits_for_the_writer_to_make_room(stalled_output):
+    output, port = stalled_output(max_queue=1, overflow='block')
+    output.block_timeout = 5
+    output.send_bytes([0x90, 60, 100])
+
+    threading.Timer(0.05, port.released.set).start()
+    output.send_bytes([0x90, 62, 100])
+
+    assert output.dropped == [0, 0, 0, 0]
+    assert drain(output, port) == [[0x90, 60, 100], [0x90, 62, 100]]
+
+
+def test_unknown_overflow_policy_is_rejected(router):
+    with pytest.raises(ValueError):
+        router.PooledOutput('test', port=StalledPort(), overflow='drop-newest')
+
+
+def test_queue_size_must_be_at_least_one(router):
+    with pytest.raises(ValueError):
+        router.PooledOutput('test', port=StalledPort(), max_queue=0)
+
+
+def test_queue_size_setting_of_zero_still_queues(router, monkeypatch):
+    monkeypatch.setenv('MIDI_ROUTER_OUTPUT_QUEUE_SIZE', '0')
+    spec = importlib.util.spec_from_file_location('midi_router_queue', router.__file__)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    assert module.OUTPUT_QUEUE_SIZE == 1
+
+
+def test_fast_lane_keeps_realtime_order_behind_a_queued_message(router, wait_until):
+    port = StalledPort()
+    output = router.PooledOutput('test', port=port, bytes_per_second=3125)
+    # Half a second of wire time, so the writer is pacing once it has been sent
+    output.send_bytes([0xF0] + [0x01] * 1600 + [0xF7])
+    wait_until(lambda: output.queue_depth() == 0)
+    output.send_now([0xFA])  # Queued, the writer is busy with the SysEx
+
+    port.released.set()
+    time.sleep(0.05)
+    output.send_now([0xF8])
+    output.close()
+
+    assert [data[0] for data in port.sent] == [0xF0, 0xFA, 0xF8]
@@ -0,0 +1,168 @@
+"""Auto-connect, unplug and route reconciliation on the loopback backend"""
+
+KEYBOARD = 'Loopback Keyboard'
+SYNTH = 'Loopback Synth'
+DRUMS = 'Loopback Drums'
+
+
+def plug(router, loopback, *names):
+    for name in names:
+        loopback.plug(name)
+        router.update_port_list()
+
+
+def test_devices_are_ordered_by_when_they_were_plugged(router, loopback):
+    plug(router, loopback, SYNTH, KEYBOARD, DRUMS)
+
+    assert router.connected_usb_devices == [SYNTH, KEYBOARD, DRUMS]
+    assert set(router.active_midi_connections) == {(SYNTH, KEYBOARD)}
+
+
+def test_one_device_is_not_auto_connected(router, loopback):
+    plug(router, loopback, KEYBOARD)
+
+    assert router.connected_usb_devices == [KEYBOARD]
+    assert not router.active_midi_connections
+
+
+def test_auto_route_forwards_on_channel_10(router, loopback, wait_until):
+    plug(router, loopback, KEYBOARD, SYNTH)
+    synth = loopback.device(SYNTH)
+    # The route selects program 0 on channel 10 when it is created
+    wait_until(lambda: synth.sent)
+    assert synth.sent[0][1] == bytes([0xC9, 0])
+
+    loopback.inject(KEYBOARD, [0x90, 60, 100])
+
+    wait_until(lambda: len(synth.sent) == 2)
+    assert synth.sent[1][1] == bytes([0x99, 60, 100])
+
+
+def test_unplugging_the_output_tears_the_route_down(router, loopback):
+    plug(router, loopback, KEYBOARD, SYNTH)
+    route = (KEYBOARD, SYNTH)
+    assert route in router.auto_connections
+
+    loopback.unplug(SYNTH)
+    router.update_port_list()
+
+    assert route not in router.active_midi_connections
+    assert route not in router.auto_connections
+    assert route not in router.connection_log
+    assert SYNTH not in router.output_pool
+    assert router.connected_usb_devices == [KEYBOARD]
+    loopback.inject(KEYBOARD, [0x90, 60, 100])  # Nothing is left routed to the unplugged synth
+
+
+def test_unplugging_the_input_closes_its_port(router, loopback):
+    plug(router, loopback, KEYBOARD, SYNTH)
+    keyboard = loopback.device(KEYBOARD)
+
+    loopback.unplug(KEYBOARD)
+    router.update_port_list()
+
+    assert not router.active_midi_connections
+    assert KEYBOARD not in router.input_hubs
+    assert not keyboard.inputs
+
+
+def test_the_next_two_devices_are_connected_after_an_unplug(router, loopback):
+    plug(router, loopback, KEYBOARD, SYNTH, DRUMS)
+
+    loopback.unplug(KEYBOARD)
+    router.update_port_list()
+
+    assert set(router.active_midi_connections) == {(SYNTH, DRUMS)}
+
+
+def test_unplug_in_manual_mode_switches_back_to_auto(router, loopback):
+    plug(router, loopback, KEYBOARD, SYNTH, DRUMS)
+    router.switch_to_manual_mode()
+    assert router.create_midi_connection(KEYBOARD, DRUMS)
+
+    loopback.unplug(DRUMS)
+    router.update_port_list()
+
+    assert not router.manual_mode
+    assert set(router.active_midi_connections) == {(KEYBOARD, SYNTH)}
+    assert router.port_enumeration_stats['last_tick'] == 1  # The switch reused the tick's snapshot
+
+
+def test_reconcile_opens_and_closes_only_what_changed(router, loopback):
+    router.manual_mode = True
+    plug(router, loopback, KEYBOARD, SYNTH, DRUMS)
+    to_synth = (KEYBOARD, SYNTH)
+    to_drums = (KEYBOARD, DRUMS)
+
+    assert router.reconcile_routes({to_synth: 'none'}) == ([to_synth], [])
+    connection = router.active_midi_connections[to_synth]
+
+    assert router.reconcile_routes({to_synth: 'none'}) == ([], [])
+    assert router.active_midi_connections[to_synth] is connection
+
+    assert router.reconcile_routes({to_synth: 'none', to_drums: 'channel10'}) == ([to_drums], [])
+    assert router.active_midi_connections[to_synth] is connection
+
+    assert router.reconcile_routes({to_drums: 'channel10'}) == ([], [to_synth])
+    assert set(router.active_midi_connections) == {to_drums}
+    assert SYNTH not in router.output_pool
+
+
+def test_reconcile_swaps_a_changed_transform_in_place(router, loopback, wait_until):
+    router.manual_mode = True
+    plug(router, loopback, KEYBOARD, SYNTH)
+    route = (KEYBOARD, SYNTH)
+    synth = loopback.device(SYNTH)
+    router.reconcile_routes({route: 'channel10'})
+    output = router.output_pool[SYNTH]
+    wait_until(lambda: synth.sent)  # The program change for channel 10
+
+    assert router.reconcile_routes({route: {'transpose': 12}}) == ([route], [])
+
+    assert router.output_pool[SYNTH] is output
+    assert router.active_midi_connections[route]['transform'] == {'transpose': 12}
+    loopback.inject(KEYBOARD, [0x90, 60, 100])
+    wait_until(lambda: len(synth.sent) == 2)
+    assert synth.sent[-1][1] == bytes([0x90, 72, 100])
+
+
+def test_reconcile_skips_routes_whose_ports_are_missing(router, loopback):
+    router.manual_mode = True
+    plug(router, loopback, KEYBOARD)
+
+    assert router.reconcile_routes({(KEYBOARD, SYNTH): 'none'}) == ([], [])
+    assert not router.active_midi_connections
+
+
+def test_changing_a_transform_to_none_keeps_the_route_in_userspace(router, loopback, wait_until):
+    router.manual_mode = True
+    plug(router, loopback, KEYBOARD, SYNTH)
+    route = (KEYBOARD, SYNTH)
+    synth = loopback.device(SYNTH)
+    router.reconcile_routes({route: 'channel10'})
+    connection = router.active_midi_connections[route]
+    wait_until(lambda: synth.sent)  # The program change for channel 10
+
+    assert router.reconcile_routes({route: 'none'}) == ([route], [])
+
+    # The loopback backend cannot patch routes in the kernel, so nothing is reopened
+    assert router.active_midi_connections[route] is connection
+    assert connection['transform'] == 'none'
+    loopback.inject(KEYBOARD, [0x90, 60, 100])
+    wait_until(lambda: len(synth.sent) == 2)
+    assert synth.sent[-1][1] == bytes([0x90, 60, 100])
+
+
+def test_transform_endpoint_changes_a_live_route(router, loopback):
+    router.manual_mode = True
+    plug(router, loopback, KEYBOARD, SYNTH)
+    route = (KEYBOARD, SYNTH)
+    router.reconcile_routes({route: 'channel10'})
+    client = router.app.test_client()
+
+    response = client.post('/transform', data={'from': KEYBOARD, 'to': SYNTH, 'transform': '{"transpose": 5}'})
+
+    assert response.status_code == 200
+    assert router.active_midi_connections[route]['transform'] == {'transpose': 5}
+    response = client.post('/transform', data={'from': KEYBOARD, 'to': DRUMS, 'transform': 'none'})
+    assert response.status_code == 404
@@ -0,0 +1,64 @@
+"""Validation and normalization of route transforms"""
+import pytest
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('channel10', 'channel10'),
+    ('none', 'none'),
+    ({}, 'none'),
+    ({'channel_map': 10}, 'channel10'),
+    ('{"channel_map": 10}', 'channel10'),
+    ({'channel_map': {'1': 1}, 'transpose': 0, 'split': [0, 127], 'velocity_curve': 'linear'}, 'none'),
+    ({'channel_map': {'2': 10, '1': 10}}, {'channel_map': {'1': 10, '2': 10}}),
+    ({'channel_map': {'1': 1, '2': 3}}, {'channel_map': {'2': 3}}),
+    ({'transpose': '-12'}, {'transpose': -12}),
+    ({'split': (36, 60)}, {'split': [36, 60]}),
+    ({'velocity_curve': 'soft'}, {'velocity_curve': 'soft'}),
+    ({'velocity_curve': 1.5}, {'velocity_curve': 1.5}),
+])
+def test_transforms_are_normalized(router, value, expected):
+    assert router.parse_transform(value) == expected
+
+
+@pytest.mark.parametrize('value', [
+    'channel11',
+    42,
+    ['channel10'],
+    {'octave': 1},
+    {'channel_map': 0},
+    {'channel_map': 17},
+    {'channel_map': {'1': 17}},
+    {'channel_map': 'ten'},
+    {'transpose': 128},
+    {'transpose': -128},
+    {'split': [60]},
+    {'split': 60},
+    {'split': [60, 36]},
+    {'split': [0, 128]},
+    {'velocity_curve': 0},
+    {'velocity_curve': 11},
+    {'velocity_curve': 'loud'},
+])
+def test_invalid_transforms_raise_value_error(router, value):
+    with pytest.raises(ValueError):
+        router.parse_transform(value)
+
+
+def test_equal_transforms_compile_to_one_object(router):
+    first = router.compile_transform(router.parse_transform({'transpose': 12, 'channel_map': 3}))
+    second = router.compile_transform(router.parse_transform('{"channel_map": 3, "transpose": 12}'))
+
+    assert first is second
+    assert router.compile_transform('none') is None
+
+
+def test_compiled_transform_rewrites_raw_messages(router):
+    transform = router.compile_transform(router.parse_transform(
+        {'channel_map': {'1': 10}, 'transpose': 12, 'split': [36, 60], 'velocity_curve': 'hard'}))
+    note = [0x90, 60, 64]
+
+    assert transform.apply_bytes(note) == [0x99, 72, 32]
+    assert note == [0x90, 60, 64]  # The input is left untouched for other routes
+    assert transform.apply_bytes([0x90, 61, 64]) is None  # Above the split
+    assert transform.apply_bytes([0x91, 60, 0]) == [0x91, 72, 0]  # Velocity 0 stays a note-off
+    assert transform.apply_bytes([0xF8]) == [0xF8]